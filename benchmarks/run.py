@@ -0,0 +1,357 @@
+"""
+Benchmarks of cloudinary_storage hot paths, run offline against StubCloudinary.
+
+Usage:
+
+    $ python -m benchmarks.run [--latency-ms 10] [--only exists,collectstatic] [--json results.json]
+
+For each benchmark it reports throughput, latency percentiles, peak Python memory (measured with tracemalloc
+in a separate untimed run of the same workload as the timed ones) and the number of remote calls per kind
+made by the last run.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from io import StringIO
+from unittest import mock
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles import finders  # noqa: E402
+from django.core.files.base import ContentFile  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+
+from benchmarks.stub import StubCloudinary  # noqa: E402
+from cloudinary_storage import app_settings  # noqa: E402
+from cloudinary_storage.storage import MediaCloudinaryStorage, StaticHashedCloudinaryStorage  # noqa: E402
+from tests.models import TestModel  # noqa: E402
+
+MEDIA_FILE_NAME = 'media/benchmark/file.txt'
+LARGE_FILE_NAME = 'media/benchmark/large.bin'
+CSS_TEMPLATE = ('body {{ background: url("../img/{image}.png"); }}\n'
+                '.item-{index} {{ background-image: url(\'../img/{image}.png\'); }}\n')
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class Benchmark(object):
+    """
+    Base class of a benchmark.
+    `setup` prepares the stub state and returns number of operations done by one `run` call.
+    """
+    name = None
+    unit = 'ops'
+
+    def __init__(self, options):
+        self.options = options
+
+    def get_repeat(self):
+        return self.options.repeat
+
+    def setup(self, stub):
+        return 1
+
+    def run(self, stub):
+        raise NotImplementedError()
+
+    def warm_up(self, stub):
+        """
+        Does an untimed run, so that first-run work, like the initial upload of collectstatic,
+        is neither traced nor timed and all measured runs do the same work.
+        """
+        self.setup(stub)
+        self.run(stub)
+
+    def measure_peak_memory(self, stub):
+        """
+        Returns peak memory traced during a separate run, which is not timed.
+        """
+        self.setup(stub)
+        tracemalloc.start()
+        try:
+            self.run(stub)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def execute(self):
+        stub = StubCloudinary(latency=self.options.latency_ms / 1000.0)
+        durations = []
+        operations = 0
+        elapsed = 0.0
+        with stub.patches():
+            self.warm_up(stub)
+            peak = self.measure_peak_memory(stub)
+            # tracemalloc slows down allocations, so timed runs are done without it
+            for i in range(self.get_repeat()):
+                operations_per_run = self.setup(stub)
+                stub.reset_calls()
+                start = time.perf_counter()
+                self.run(stub)
+                duration = time.perf_counter() - start
+                durations.append(duration / operations_per_run)
+                operations += operations_per_run
+                elapsed += duration
+        return OrderedDict([
+            ('name', self.name),
+            ('unit', self.unit),
+            ('operations', operations),
+            ('throughput', operations / elapsed if elapsed else 0.0),
+            ('p50_ms', percentile(durations, 50) * 1000),
+            ('p95_ms', percentile(durations, 95) * 1000),
+            ('p99_ms', percentile(durations, 99) * 1000),
+            ('peak_memory_kb', peak / 1024.0),
+            ('remote_calls', OrderedDict(sorted(stub.calls.items()))),
+        ])
+
+
+class PerCallBenchmark(Benchmark):
+    """
+    Benchmark of a single storage method, every call is measured separately.
+    """
+    def get_repeat(self):
+        return self.options.iterations
+
+
+class UrlBenchmark(PerCallBenchmark):
+    name = 'url'
+
+    def setup(self, stub):
+        self.storage = MediaCloudinaryStorage()
+        return 1
+
+    def run(self, stub):
+        self.storage.url(MEDIA_FILE_NAME)
+
+
+class ExistsBenchmark(PerCallBenchmark):
+    name = 'exists'
+
+    def setup(self, stub):
+        self.storage = MediaCloudinaryStorage()
+        stub.add_resource('image', MEDIA_FILE_NAME, b'content', tags=[app_settings.MEDIA_TAG])
+        return 1
+
+    def run(self, stub):
+        self.storage.exists(MEDIA_FILE_NAME)
+
+
+class SizeBenchmark(ExistsBenchmark):
+    name = 'size'
+
+    def run(self, stub):
+        self.storage.size(MEDIA_FILE_NAME)
+
+
+class SaveBenchmark(PerCallBenchmark):
+    name = 'save'
+
+    def setup(self, stub):
+        self.storage = MediaCloudinaryStorage()
+        self.content = ContentFile(os.urandom(self.options.file_size_kb * 1024))
+        return 1
+
+    def run(self, stub):
+        self.content.seek(0)
+        self.storage._save('benchmark/file.bin', self.content)
+
+
+class OpenLargeFileBenchmark(Benchmark):
+    name = 'open-large-file'
+    unit = 'files'
+
+    def get_repeat(self):
+        return max(1, self.options.iterations // 100)
+
+    def setup(self, stub):
+        self.storage = MediaCloudinaryStorage()
+        stub.add_resource('image', LARGE_FILE_NAME, os.urandom(self.options.large_file_mb * 1024 * 1024))
+        return 1
+
+    def run(self, stub):
+        self.storage._open(LARGE_FILE_NAME).read()
+
+
+def generate_static_files(directory, count):
+    """
+    Generates a static tree of count files: 10% of css files referencing images, 60% of images and 30% of js files.
+    Content depends only on count, so repeated runs measure a redeploy without any changes.
+    """
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    images = max(1, count * 6 // 10)
+    stylesheets = max(1, count // 10)
+    scripts = max(0, count - images - stylesheets)
+    for subdirectory in ('img', 'css', 'js'):
+        os.makedirs(os.path.join(directory, 'bench', subdirectory))
+    randomizer = random.Random(count)
+    for i in range(images):
+        with open(os.path.join(directory, 'bench', 'img', 'image-{}.png'.format(i)), 'wb') as f:
+            size = randomizer.randint(1024, 16 * 1024)
+            f.write(randomizer.getrandbits(size * 8).to_bytes(size, 'little'))
+    for i in range(stylesheets):
+        with open(os.path.join(directory, 'bench', 'css', 'style-{}.css'.format(i)), 'w') as f:
+            for j in range(20):
+                f.write(CSS_TEMPLATE.format(image='image-{}'.format(randomizer.randrange(images)), index=j))
+    for i in range(scripts):
+        with open(os.path.join(directory, 'bench', 'js', 'script-{}.js'.format(i)), 'w') as f:
+            f.write('var value{} = {};\n'.format(i, randomizer.random()) * 50)
+    return count
+
+
+class PostProcessBenchmark(Benchmark):
+    name = 'post-process'
+    unit = 'files'
+
+    def setup(self, stub):
+        count = generate_static_files(settings.STATICFILES_DIRS[0], self.options.static_files)
+        finders.get_finder.cache_clear()
+        self.storage = StaticHashedCloudinaryStorage()
+        self.paths = OrderedDict()
+        for finder in finders.get_finders():
+            for path, storage in finder.list([]):
+                self.paths[path] = (storage, path)
+        return count
+
+    def run(self, stub):
+        for response in self.storage.post_process(self.paths):
+            pass
+
+
+class CollectStaticBenchmark(Benchmark):
+    name = 'collectstatic'
+    unit = 'files'
+
+    def setup(self, stub):
+        count = generate_static_files(settings.STATICFILES_DIRS[0], self.options.static_files)
+        finders.get_finder.cache_clear()
+        return count
+
+    def run(self, stub):
+        call_command('collectstatic', '--noinput', *self.options.collectstatic_args.split(), stdout=StringIO())
+
+
+class LoadManifestBenchmark(PerCallBenchmark):
+    """
+    Measures loading of a manifest with a given number of entries and a lookup, like in a starting web worker.
+    """
+    name = 'load-manifest'
+    compiled = False
+
+    def setup(self, stub):
+        self.storage = StaticHashedCloudinaryStorage()
+        if not hasattr(self, 'names'):
+            self.names = ['bench/img/image-{}.png'.format(i) for i in range(self.options.manifest_entries)]
+            self.storage.hashed_files = {name: 'static/{}.{:012x}.png'.format(name[:-4], i)
+                                         for i, name in enumerate(self.names)}
+            with mock.patch.object(app_settings, 'STATICFILES_COMPILED_MANIFEST', True):
+                self.storage.save_manifest()
+        return 1
+
+    def run(self, stub):
+        with mock.patch.object(app_settings, 'STATICFILES_COMPILED_MANIFEST', self.compiled):
+            self.storage.hashed_files = self.storage.load_manifest()
+        self.storage.stored_name(self.names[len(self.names) // 2])
+
+
+class LoadCompiledManifestBenchmark(LoadManifestBenchmark):
+    name = 'load-compiled-manifest'
+    compiled = True
+
+
+class DeleteOrphanedMediaBenchmark(Benchmark):
+    name = 'deleteorphanedmedia'
+    unit = 'resources'
+
+    def setup(self, stub):
+        TestModel.objects.all().delete()
+        count = self.options.resources
+        orphans = int(count * self.options.orphaned_percent / 100.0)
+        names = ['media/tests/file-{}.txt'.format(i) for i in range(count)]
+        for name in names:
+            stub.add_resource('raw', name, b'', tags=[app_settings.MEDIA_TAG])
+        TestModel.objects.bulk_create([TestModel(name='benchmark', file=name) for name in names[orphans:]],
+                                      batch_size=5000)
+        return count
+
+    def run(self, stub):
+        call_command('deleteorphanedmedia', '--noinput', *self.options.deleteorphanedmedia_args.split(),
+                     stdout=StringIO())
+
+
+BENCHMARKS = OrderedDict((benchmark.name, benchmark) for benchmark in (
+    UrlBenchmark,
+    ExistsBenchmark,
+    SizeBenchmark,
+    SaveBenchmark,
+    OpenLargeFileBenchmark,
+    PostProcessBenchmark,
+    CollectStaticBenchmark,
+    LoadManifestBenchmark,
+    LoadCompiledManifestBenchmark,
+    DeleteOrphanedMediaBenchmark,
+))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Runs cloudinary_storage benchmarks against a local stub.')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='Comma separated benchmark names, available: {}.'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Latency injected into every remote call.')
+    parser.add_argument('--iterations', type=int, default=200, help='Number of calls of per call benchmarks.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of command benchmarks.')
+    parser.add_argument('--file-size-kb', type=int, default=64, help='Size of a file saved by save benchmark.')
+    parser.add_argument('--large-file-mb', type=int, default=20, help='Size of a file opened by open benchmark.')
+    parser.add_argument('--static-files', type=int, default=2000, help='Number of generated static files.')
+    parser.add_argument('--collectstatic-args', default='',
+                        help='Extra arguments of collectstatic command, for example "--workers 8 --incremental".')
+    parser.add_argument('--manifest-entries', type=int, default=20000,
+                        help='Number of entries of a manifest loaded by manifest benchmarks.')
+    parser.add_argument('--resources', type=int, default=100000, help='Number of uploaded media resources.')
+    parser.add_argument('--deleteorphanedmedia-args', default='',
+                        help='Extra arguments of deleteorphanedmedia command, for example "--workers 4".')
+    parser.add_argument('--orphaned-percent', type=float, default=1.0,
+                        help='Percent of uploaded media resources which are not referenced by any model.')
+    parser.add_argument('--json', dest='json_path', help='Writes results to a given JSON file as well.')
+    return parser.parse_args(argv)
+
+
+def format_result(result):
+    calls = ', '.join('{}={}'.format(kind, count) for kind, count in result['remote_calls'].items()) or '-'
+    return ('{name:<20} {throughput:>10.1f} {unit}/s  p50 {p50_ms:>9.3f} ms  p95 {p95_ms:>9.3f} ms  '
+            'p99 {p99_ms:>9.3f} ms  peak {peak_memory_kb:>10.1f} KiB  calls: {calls}').format(calls=calls, **result)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    call_command('migrate', verbosity=0)
+    results = []
+    for name in options.only.split(','):
+        result = BENCHMARKS[name.strip()](options).execute()
+        results.append(result)
+        print(format_result(result))
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump({'options': vars(options), 'results': results}, f, indent=2)
+    shutil.rmtree(settings.BENCHMARK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
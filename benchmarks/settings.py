@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+from tests.settings import *  # noqa: F401,F403
+
+BENCHMARK_DIR = os.environ.get('BENCHMARK_DIR') or tempfile.mkdtemp(prefix='cloudinary-storage-benchmarks-')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+STATICFILES_DIRS = [os.path.join(BENCHMARK_DIR, 'static')]
+
+CLOUDINARY_STORAGE = {
+    'CLOUD_NAME': 'benchmark-cloud',
+    'API_KEY': 'benchmark-key',
+    'API_SECRET': 'benchmark-secret',
+    'STATICFILES_MANIFEST_ROOT': os.path.join(BENCHMARK_DIR, 'manifest'),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+}
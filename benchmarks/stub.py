@@ -0,0 +1,232 @@
+"""
+In-memory stand-in for Cloudinary used by the benchmarks.
+
+It replaces the network calls made by cloudinary_storage (CDN requests done with `requests`,
+Upload API and Admin API calls done with `cloudinary`) with local operations delayed by
+a configurable latency, and counts how many remote calls of each kind were made.
+"""
+import hashlib
+import os
+import posixpath
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from unittest import mock
+from urllib.parse import urlsplit
+
+import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+import requests
+
+PAGE_SIZE = 500
+SEARCH_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class StubResponse(object):
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('{} Error'.format(self.status_code), response=self)
+
+
+class StubCloudinary(object):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.resources = {}  # (resource_type, public_id) -> resource dict
+        self._lock = threading.Lock()
+        self._listings = {}  # cache of listings, so that paging doesn't dominate the measured time
+
+    def _remote_call(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_calls(self):
+        self.calls = Counter()
+
+    def add_resource(self, resource_type, public_id, content, tags=()):
+        self._listings.clear()
+        self.resources[(resource_type, public_id)] = {
+            'public_id': public_id,
+            'resource_type': resource_type,
+            'type': 'upload',
+            'version': 1,
+            'bytes': len(content),
+            'etag': hashlib.md5(content).hexdigest(),
+            'tags': list(tags),
+            'created_at': time.strftime(SEARCH_DATE_FORMAT, time.gmtime()),
+            'content': content,
+        }
+
+    def _find_by_url(self, url):
+        # https://res.cloudinary.com/<cloud name>/<resource type>/upload/v1/<public id>
+        path = urlsplit(url).path.lstrip('/').split('/', 4)
+        resource_type, public_id = path[1], path[4]
+        resource = self.resources.get((resource_type, public_id))
+        if resource is None and resource_type != 'raw':
+            resource = self.resources.get((resource_type, os.path.splitext(public_id)[0]))
+        return resource
+
+    def head(self, url, **kwargs):
+        self._remote_call('head')
+        resource = self._find_by_url(url)
+        if resource is None:
+            return StubResponse(404)
+        headers = {'content-length': str(resource['bytes']), 'ETAG': '"{}"'.format(resource['etag'])}
+        return StubResponse(200, headers=headers)
+
+    def get(self, url, **kwargs):
+        self._remote_call('get')
+        resource = self._find_by_url(url)
+        if resource is None:
+            return StubResponse(404)
+        return StubResponse(200, content=resource['content'])
+
+    def _store(self, content, file_name, options):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        resource_type = options.get('resource_type', 'image')
+        public_id = options.get('public_id')
+        if public_id is None:
+            public_id = posixpath.basename(file_name or hashlib.md5(content).hexdigest())
+            if resource_type != 'raw':
+                public_id = os.path.splitext(public_id)[0]
+            if options.get('folder'):
+                public_id = posixpath.join(options['folder'], public_id)
+        tags = options.get('tags', ())
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        self.add_resource(resource_type, public_id, content, tags)
+        return self._public_resource(self.resources[(resource_type, public_id)])
+
+    def _public_resource(self, resource):
+        return {key: value for key, value in resource.items() if key != 'content'}
+
+    def upload(self, file, **options):
+        self._remote_call('upload')
+        content = file.read() if hasattr(file, 'read') else file
+        return self._store(content, getattr(file, 'name', None), options)
+
+    def upload_large(self, file, **options):
+        """
+        Reads the file chunk by chunk like the SDK does, so upload stages run as they would with Cloudinary.
+        """
+        self._remote_call('upload_large')
+        chunk_size = options.get('chunk_size', 20000000)
+        chunks = []
+        with file:
+            chunk = file.read(chunk_size)
+            while chunk:
+                chunks.append(chunk)
+                chunk = file.read(chunk_size)
+        file_name = getattr(file, 'name', None)
+        return self._store(b''.join(chunks), file_name if isinstance(file_name, str) else None, options)
+
+    def destroy(self, public_id, **options):
+        self._remote_call('destroy')
+        self._listings.clear()
+        resource = self.resources.pop((options.get('resource_type', 'image'), public_id), None)
+        return {'result': 'ok' if resource is not None else 'not found'}
+
+    def delete_resources(self, public_ids, **options):
+        self._remote_call('delete_resources')
+        self._listings.clear()
+        resource_type = options.get('resource_type', 'image')
+        deleted = {}
+        for public_id in public_ids:
+            resource = self.resources.pop((resource_type, public_id), None)
+            deleted[public_id] = 'deleted' if resource is not None else 'not_found'
+        return {'deleted': deleted, 'partial': False}
+
+    def _page(self, resources, options):
+        start = int(options.get('next_cursor') or 0)
+        end = start + options.get('max_results', PAGE_SIZE)
+        page = [self._public_resource(resource) for resource in resources[start:end]]
+        response = {'resources': page}
+        if end < len(resources):
+            response['next_cursor'] = str(end)
+        return response
+
+    def _listing(self, resource_type, predicate, key):
+        with self._lock:
+            if key not in self._listings:
+                self._listings[key] = [resource for (type_, _), resource in sorted(self.resources.items())
+                                       if resource_type in (None, type_) and predicate(resource)]
+            return self._listings[key]
+
+    def resources_by_tag(self, tag, **options):
+        self._remote_call('resources_by_tag')
+        resource_type = options.get('resource_type', 'image')
+        resources = self._listing(resource_type, lambda resource: tag in resource['tags'],
+                                  ('tag', resource_type, tag))
+        return self._page(resources, options)
+
+    def list_resources(self, **options):
+        self._remote_call('resources')
+        resource_type = options.get('resource_type', 'image')
+        prefix = options.get('prefix', '')
+        resources = self._listing(resource_type, lambda resource: resource['public_id'].startswith(prefix),
+                                  ('prefix', resource_type, prefix))
+        return self._page(resources, options)
+
+    def resource(self, public_id, **options):
+        self._remote_call('resource')
+        resource = self.resources.get((options.get('resource_type', 'image'), public_id))
+        if resource is None:
+            raise cloudinary.api.NotFound('Resource not found - {}'.format(public_id))
+        return self._public_resource(resource)
+
+    def resources_by_ids(self, public_ids, **options):
+        self._remote_call('resources_by_ids')
+        resource_type = options.get('resource_type', 'image')
+        return {'resources': [self._public_resource(self.resources[(resource_type, public_id)])
+                              for public_id in public_ids if (resource_type, public_id) in self.resources]}
+
+    def _matches_search(self, resource, term):
+        for operator in ('>=', '<'):
+            if term.startswith('created_at' + operator):
+                date = term[len('created_at' + operator):].strip('"')
+                return resource['created_at'] >= date if operator == '>=' else resource['created_at'] < date
+        field, value = term.split(':' if term.startswith('resource_type:') else '=', 1)
+        if field == 'resource_type':
+            return resource['resource_type'] == value
+        return value.strip('"') in resource['tags']
+
+    def search(self, query, **options):
+        """
+        Supports only expressions built by cloudinary_storage: terms joined with AND,
+        matching resource type, a tag and creation dates.
+        """
+        self._remote_call('search')
+        terms = query['expression'].split(' AND ')
+        resources = self._listing(None, lambda resource: all(self._matches_search(resource, term) for term in terms),
+                                  ('search', query['expression']))
+        return self._page(resources, {'max_results': query.get('max_results', PAGE_SIZE),
+                                      'next_cursor': query.get('next_cursor')})
+
+    def patches(self):
+        """
+        Returns context manager within which all remote calls go to this stub.
+        """
+        stack = ExitStack()
+        stack.enter_context(mock.patch.object(requests, 'head', self.head))
+        stack.enter_context(mock.patch.object(requests, 'get', self.get))
+        stack.enter_context(mock.patch.object(cloudinary.uploader, 'upload', self.upload))
+        stack.enter_context(mock.patch.object(cloudinary.uploader, 'upload_large', self.upload_large))
+        stack.enter_context(mock.patch.object(cloudinary.uploader, 'destroy', self.destroy))
+        stack.enter_context(mock.patch.object(cloudinary.api, 'delete_resources', self.delete_resources))
+        stack.enter_context(mock.patch.object(cloudinary.api, 'resources', self.list_resources))
+        stack.enter_context(mock.patch.object(cloudinary.api, 'resources_by_tag', self.resources_by_tag))
+        stack.enter_context(mock.patch.object(cloudinary.api, 'resources_by_ids', self.resources_by_ids))
+        stack.enter_context(mock.patch.object(cloudinary.api, 'resource', self.resource))
+        stack.enter_context(mock.patch.object(cloudinary.Search, 'execute',
+                                              lambda search, **options: self.search(search.query, **options)))
+        return stack
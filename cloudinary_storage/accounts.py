@@ -0,0 +1,108 @@
+import hashlib
+from collections import namedtuple
+
+import cloudinary
+
+from . import app_settings
+
+ACCOUNT_SEPARATOR = ':'
+
+_accounts = (None, [])  # ACCOUNTS setting the accounts were built from, accounts
+
+
+class Account(namedtuple('Account', ['cloud_name', 'api_key', 'api_secret'])):
+    """
+    Cloudinary account from ACCOUNTS setting, its options are passed to Cloudinary calls made for its files.
+    """
+    @property
+    def options(self):
+        return {'cloud_name': self.cloud_name, 'api_key': self.api_key, 'api_secret': self.api_secret}
+
+
+def get_accounts():
+    """
+    Returns accounts media files are sharded among, empty list when sharding is not configured.
+    """
+    global _accounts
+    source, accounts = _accounts
+    if source is not app_settings.ACCOUNTS:
+        accounts = [Account(account['CLOUD_NAME'], account['API_KEY'], account['API_SECRET'])
+                    for account in app_settings.ACCOUNTS]
+        _accounts = (app_settings.ACCOUNTS, accounts)
+    return accounts
+
+
+def is_default_account(account):
+    """
+    Checks whether an account is the one configured globally, None stands for it as well.
+    """
+    return account is None or account.cloud_name == cloudinary.config().cloud_name
+
+
+def get_account_options(account):
+    """
+    Returns options of Cloudinary calls made for files of an account, empty for the default account.
+    """
+    return {} if is_default_account(account) else account.options
+
+
+def get_account_credentials(account):
+    """
+    Returns an account with its credentials, the default one built from global Cloudinary configuration.
+    """
+    if account is not None:
+        return account
+    config = cloudinary.config()
+    return Account(config.cloud_name, config.api_key, config.api_secret)
+
+
+def find_account(cloud_name, accounts):
+    """
+    Returns account of a cloud name, None for the default account, raises ValueError for an unknown one.
+    """
+    if cloud_name == cloudinary.config().cloud_name:
+        return None
+    for account in accounts:
+        if account.cloud_name == cloud_name:
+            return account
+    raise ValueError("Unknown cloud name '{}'.".format(cloud_name))
+
+
+def get_listed_accounts(accounts):
+    """
+    Returns accounts whose files are listed, the default one first, as it keeps files saved before sharding.
+    """
+    return [None] + [account for account in accounts if not is_default_account(account)]
+
+
+def route_name(name, accounts):
+    """
+    Returns account a file is kept in, chosen by MD5 of its name, so it is the same for all processes.
+    """
+    digest = hashlib.md5(name.encode('utf-8')).digest()
+    return accounts[int.from_bytes(digest[:4], 'big') % len(accounts)]
+
+
+def join_name(account, public_id):
+    """
+    Returns name of a file kept in an account, prefixed with cloud name unless it is the default account,
+    so that names of files saved before sharding stay valid.
+    """
+    if is_default_account(account):
+        return public_id
+    return account.cloud_name + ACCOUNT_SEPARATOR + public_id
+
+
+def split_name(name, accounts):
+    """
+    Returns account and public id of a file name, None account for the default one.
+    Cloud name can also prefix the last part of a name, like in a name joined with a file listed by listdir.
+    """
+    directory, slash, file_name = name.rpartition('/')
+    for prefixed_name, head in ((name, ''), (file_name, directory + slash)):
+        cloud_name, separator, public_id = prefixed_name.partition(ACCOUNT_SEPARATOR)
+        if separator:
+            for account in accounts:
+                if account.cloud_name == cloud_name:
+                    return account, head + public_id
+    return None, name
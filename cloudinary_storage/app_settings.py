@@ -1,6 +1,7 @@
-import importlib
 import os
 import sys
+import threading
+import types
 from operator import itemgetter
 
 import cloudinary
@@ -10,7 +11,62 @@ from django.dispatch import receiver
 from django.test.signals import setting_changed
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-user_settings = getattr(settings, 'CLOUDINARY_STORAGE', {})
+
+DEFAULTS = {
+    'MEDIA_TAG': 'media',
+    'ACCOUNTS': [],
+    'INVALID_VIDEO_ERROR_MESSAGE': 'Please upload a valid video file.',
+    'INVALID_IMAGE_ERROR_MESSAGE': 'Please upload a valid image file.',
+    'UPLOAD_LARGE_SIZE': None,
+    'UPLOAD_IMAGE_MAX_DIMENSION': None,
+    'UPLOAD_IMAGE_QUALITY': 85,
+    'UPLOAD_IMAGE_WORKERS': 2,
+    'DIRECT_UPLOAD_MAX_AGE': 3600,
+    'EXCLUDE_DELETE_ORPHANED_MEDIA_PATHS': (),
+    'STATIC_TAG': 'static',
+    'STATICFILES_MANIFEST_ROOT': os.path.join(BASE_DIR, 'manifest'),
+    'STATICFILES_MANIFEST_GENERATIONS': 1,
+    'STATICFILES_UPLOAD_JOURNAL': False,
+    'STATICFILES_HASH_CACHE_ROOT': None,
+    'STATICFILES_COMPILED_MANIFEST': False,
+    'STATIC_TAG_CACHE_SIZE': 1024,
+    'RESPONSIVE_WIDTHS': [320, 640, 960, 1280, 1920],
+    'RESPONSIVE_FORMATS': ['auto'],
+    'STATIC_IMAGES_EXTENSIONS': [
+        'jpg',
+        'jpe',
+        'jpeg',
+        'jpc',
+        'jp2',
+        'j2k',
+        'wdp',
+        'jxr',
+        'hdp',
+        'png',
+        'gif',
+        'webp',
+        'bmp',
+        'tif',
+        'tiff',
+        'ico'
+    ],
+    'STATIC_VIDEOS_EXTENSIONS': [
+        'mp4',
+        'webm',
+        'flv',
+        'mov',
+        'ogv',
+        '3gp',
+        '3g2',
+        'wmv',
+        'mpeg',
+        'flv',
+        'mkv',
+        'avi'
+    ],
+    # used only on Windows, see https://github.com/ahupp/python-magic#dependencies for your reference
+    'MAGIC_FILE_PATH': 'magic',
+}
 
 
 def set_credentials(user_settings):
@@ -35,63 +91,61 @@ def set_credentials(user_settings):
             api_secret=credentials[2]
         )
 
-set_credentials(user_settings)
-
-cloudinary.config(
-    secure=user_settings.get('SECURE', True)
-)
-
-MEDIA_TAG = user_settings.get('MEDIA_TAG', 'media')
-INVALID_VIDEO_ERROR_MESSAGE = user_settings.get('INVALID_VIDEO_ERROR_MESSAGE', 'Please upload a valid video file.')
-EXCLUDE_DELETE_ORPHANED_MEDIA_PATHS = user_settings.get('EXCLUDE_DELETE_ORPHANED_MEDIA_PATHS', ())
-
-STATIC_TAG = user_settings.get('STATIC_TAG', 'static')
-STATICFILES_MANIFEST_ROOT = user_settings.get('STATICFILES_MANIFEST_ROOT', os.path.join(BASE_DIR, 'manifest'))
-
-STATIC_IMAGES_EXTENSIONS = user_settings.get('STATIC_IMAGES_EXTENSIONS',
-                                             [
-                                                 'jpg',
-                                                 'jpe',
-                                                 'jpeg',
-                                                 'jpc',
-                                                 'jp2',
-                                                 'j2k',
-                                                 'wdp',
-                                                 'jxr',
-                                                 'hdp',
-                                                 'png',
-                                                 'gif',
-                                                 'webp',
-                                                 'bmp',
-                                                 'tif',
-                                                 'tiff',
-                                                 'ico'
-                                             ])
-
-STATIC_VIDEOS_EXTENSIONS = user_settings.get('STATIC_VIDEOS_EXTENSIONS',
-                                             [
-                                                 'mp4',
-                                                 'webm',
-                                                 'flv',
-                                                 'mov',
-                                                 'ogv',
-                                                 '3gp',
-                                                 '3g2',
-                                                 'wmv',
-                                                 'mpeg',
-                                                 'flv',
-                                                 'mkv',
-                                                 'avi'
-                                             ])
-
-# used only on Windows, see https://github.com/ahupp/python-magic#dependencies for your reference
-MAGIC_FILE_PATH = user_settings.get('MAGIC_FILE_PATH', 'magic')
-
-PREFIX = user_settings.get('PREFIX', settings.MEDIA_URL)
+
+class LazySettingsModule(types.ModuleType):
+    """
+    Class of this module, resolving settings on the first access and caching them as module attributes,
+    so reading a resolved setting costs a plain attribute lookup and invalidation just drops them.
+    """
+    def __getattr__(self, name):
+        if name not in DEFAULTS and name not in ('PREFIX', 'user_settings'):
+            raise AttributeError("module '{}' has no attribute '{}'".format(self.__name__, name))
+        self.configure()
+        if name == 'user_settings':
+            return self.__dict__['user_settings']
+        default = settings.MEDIA_URL if name == 'PREFIX' else DEFAULTS[name]
+        value = self.__dict__['user_settings'].get(name, default)
+        self.__dict__[name] = value
+        return value
+
+    def configure(self):
+        """
+        Reads CLOUDINARY_STORAGE setting and configures cloudinary with it, once till settings are invalidated.
+        """
+        with _lock:
+            if 'user_settings' in self.__dict__:
+                return
+            user_settings = getattr(settings, 'CLOUDINARY_STORAGE', {})
+            set_credentials(user_settings)
+            cloudinary.config(secure=user_settings.get('SECURE', True))
+            self.__dict__['user_settings'] = user_settings
+
+    def invalidate(self):
+        with _lock:
+            for name in list(DEFAULTS) + ['PREFIX', 'user_settings']:
+                self.__dict__.pop(name, None)
+
+
+class setting(object):
+    """
+    Class attribute reading a setting when it is accessed, like TAG = setting('MEDIA_TAG'),
+    which can be still overridden by instance or class attributes.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        return getattr(sys.modules[__name__], self.name)
+
+
+_lock = threading.RLock()
 
 
 @receiver(setting_changed)
 def reload_settings(*args, **kwargs):
     setting_name, value = kwargs['setting'], kwargs['value']
     if setting_name in ['CLOUDINARY_STORAGE', 'MEDIA_URL']:
-        importlib.reload(sys.modules[__name__])
+        sys.modules[__name__].invalidate()
+
+
+sys.modules[__name__].__class__ = LazySettingsModule
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CloudinaryStorageConfig(AppConfig):
     name = 'cloudinary_storage'
+
+    def ready(self):
+        # credentials are needed by any call to Cloudinary, even if no setting has been read before
+        from . import app_settings
+        app_settings.configure()
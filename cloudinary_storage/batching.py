@@ -0,0 +1,203 @@
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.db.models import FileField
+from django.db.models.signals import post_init
+
+from .accounts import get_account_options
+from .helpers import get_resources_by_ids
+
+_local = threading.local()
+_model_file_fields = {}
+_active_batchers = 0  # number of threads with an active batcher, post_init receiver is connected only while any is
+_active_batchers_lock = threading.Lock()
+# batch key -> prefetched FieldFile, kept only as long as the field file is alive
+_prefetched_files = weakref.WeakValueDictionary()
+_prefetched_files_lock = threading.Lock()
+
+
+class MetadataBatcher(object):
+    """
+    Collects resources whose metadata may be needed, like files of model instances loaded during a request,
+    and fetches metadata of all of them with batched Admin API calls when metadata of any of them is needed.
+    Fetched metadata is kept till the batcher is deactivated, None for resources which don't exist.
+    """
+    def __init__(self):
+        self.pending = {}  # (resource type, account) -> set of public ids
+        self.resources = {}  # (resource type, account, public id) -> resource or None
+        self.lock = threading.RLock()
+
+    def add(self, resource_type, public_id, account=None):
+        with self.lock:
+            if (resource_type, account, public_id) not in self.resources:
+                self.pending.setdefault((resource_type, account), set()).add(public_id)
+
+    def get(self, resource_type, public_id, account=None):
+        with self.lock:
+            if (resource_type, account, public_id) not in self.resources:
+                self.add(resource_type, public_id, account)
+                self.resolve()
+            return self.resources[(resource_type, account, public_id)]
+
+    def resolve(self):
+        """
+        Fetches metadata of pending resources, resources of different accounts are fetched concurrently.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if len({account for resource_type, account in pending}) > 1:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    futures = [(key, public_ids, executor.submit(self._fetch, key, public_ids))
+                               for key, public_ids in pending.items()]
+                    fetched = [(key, public_ids, future.result()) for key, public_ids, future in futures]
+            else:
+                fetched = [(key, public_ids, self._fetch(key, public_ids)) for key, public_ids in pending.items()]
+            for (resource_type, account), public_ids, resources in fetched:
+                for public_id in public_ids:
+                    self.resources[(resource_type, account, public_id)] = resources.get(public_id)
+
+    @staticmethod
+    def _fetch(key, public_ids):
+        resource_type, account = key
+        return get_resources_by_ids(resource_type, public_ids, **get_account_options(account))
+
+    def update(self, batcher):
+        """
+        Adds metadata fetched by another batcher, which doesn't have to be fetched again.
+        """
+        with self.lock:
+            self.resources.update(batcher.resources)
+            for resource_type, account, public_id in batcher.resources:
+                self.pending.get((resource_type, account), set()).discard(public_id)
+
+    def forget(self, resource_type, public_id, account=None):
+        """
+        Drops metadata of a resource which has been uploaded or deleted since it was fetched.
+        """
+        with self.lock:
+            self.resources.pop((resource_type, account, public_id), None)
+
+
+def get_batcher():
+    return getattr(_local, 'batcher', None)
+
+
+def _set_batcher(batcher):
+    global _active_batchers
+    previous_batcher = get_batcher()
+    _local.batcher = batcher
+    if (previous_batcher is None) == (batcher is None):
+        return
+    with _active_batchers_lock:
+        if batcher is None:
+            _active_batchers -= 1
+            if not _active_batchers:
+                post_init.disconnect(add_model_files_to_batch, dispatch_uid=__name__)
+        else:
+            _active_batchers += 1
+            if _active_batchers == 1:
+                post_init.connect(add_model_files_to_batch, dispatch_uid=__name__)
+
+
+def activate():
+    batcher = MetadataBatcher()
+    _set_batcher(batcher)
+    return batcher
+
+
+def deactivate():
+    _set_batcher(None)
+
+
+@contextmanager
+def batched_metadata():
+    """
+    Batches metadata lookups of Cloudinary storages in the current thread, like MetadataBatchingMiddleware
+    does for a request, so that it can be used in management commands or background tasks.
+    """
+    previous_batcher = get_batcher()
+    batcher = activate()
+    try:
+        yield batcher
+    finally:
+        _set_batcher(previous_batcher)
+
+
+def get_model_file_fields(model):
+    """
+    Returns FileFields of a model with storages which support batching, cached per model.
+    """
+    try:
+        return _model_file_fields[model]
+    except KeyError:
+        fields = [field for field in model._meta.fields
+                  if isinstance(field, FileField) and hasattr(field.storage, 'add_to_batch')]
+        _model_file_fields[model] = fields
+        return fields
+
+
+def add_model_files_to_batch(sender, instance, **kwargs):
+    """
+    Receiver of post_init signal, connected only while batching is active in any thread,
+    so that models are not slowed down by it otherwise.
+    """
+    batcher = get_batcher()
+    if batcher is None:
+        return
+    for field in get_model_file_fields(sender):
+        file = instance.__dict__.get(field.attname)  # deferred fields are missing
+        name = getattr(file, 'name', file)
+        if name:
+            field.storage.add_to_batch(batcher, name)
+
+
+def get_prefetched_metadata(key):
+    """
+    Returns cloudinary_metadata of a prefetched field file of a batch key which is still alive,
+    raises KeyError when there is none.
+    """
+    if not _prefetched_files:
+        raise KeyError(key)
+    with _prefetched_files_lock:
+        field_file = _prefetched_files[key]
+    return field_file.cloudinary_metadata
+
+
+def forget_prefetched_metadata(key):
+    if _prefetched_files:
+        with _prefetched_files_lock:
+            _prefetched_files.pop(key, None)
+
+
+def prefetch_cloudinary_metadata(instances, *field_names):
+    """
+    Fetches metadata of files of given fields of model instances, or of a queryset, with batched Admin API calls
+    and attaches it to their FieldFiles as cloudinary_metadata dict with bytes, width, height and format keys,
+    None when a file doesn't exist. While the field files are alive, size and exists of their storages
+    use the metadata instead of HEAD requests. Returns list of instances.
+    """
+    instances = list(instances)
+    batcher = MetadataBatcher()
+    field_files = []
+    for instance in instances:
+        for field_name in field_names:
+            field_file = getattr(instance, field_name)
+            if field_file and hasattr(field_file.storage, 'add_to_batch'):
+                field_file.storage.add_to_batch(batcher, field_file.name)
+                field_files.append(field_file)
+    batcher.resolve()
+    for field_file in field_files:
+        resource = field_file.storage._get_batched_resource(batcher, field_file.name)
+        if resource is None:
+            field_file.cloudinary_metadata = None
+        else:
+            field_file.cloudinary_metadata = {key: resource.get(key) for key in ('bytes', 'width', 'height', 'format')}
+        with _prefetched_files_lock:
+            _prefetched_files[field_file.storage._get_batch_key(field_file.name)] = field_file
+    # with batching active, exists and size of prefetched files don't need any more calls
+    current_batcher = get_batcher()
+    if current_batcher is not None:
+        current_batcher.update(batcher)
+    return instances
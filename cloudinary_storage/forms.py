@@ -0,0 +1,50 @@
+import json
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+from .storage import RESOURCE_TYPES, storages_per_type
+
+
+class DirectUploadWidget(forms.HiddenInput):
+    """
+    Hidden input keeping Cloudinary response to a direct upload. Script rendered with it adds a file input next to it,
+    gets upload parameters from upload_url for a chosen file and uploads it straight to Cloudinary.
+    The script is inlined, so that it isn't collected and uploaded as a static file by every project.
+    """
+    template_name = 'cloudinary_storage/widgets/direct_upload.html'
+
+    def __init__(self, upload_url, attrs=None):
+        attrs = {} if attrs is None else attrs.copy()
+        attrs['data-cloudinary-upload-url'] = upload_url
+        super(DirectUploadWidget, self).__init__(attrs)
+
+
+class DirectUploadField(forms.FileField):
+    """
+    Form field of a file uploaded by a browser directly to Cloudinary with parameters returned by DirectUploadView,
+    so the file is never sent to Django. Cleaned value is name of the uploaded file, which can be assigned
+    to a model FileField of the same storage.
+    """
+    default_error_messages = {
+        'invalid_upload': 'The file could not be verified, please upload it again.',
+    }
+
+    def __init__(self, upload_url, storage=None, **kwargs):
+        self.storage = storages_per_type[RESOURCE_TYPES['IMAGE']] if storage is None else storage
+        kwargs.setdefault('widget', DirectUploadWidget(upload_url))
+        super(DirectUploadField, self).__init__(**kwargs)
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        try:
+            return self.storage.verify_direct_upload(json.loads(data))
+        except (ValueError, TypeError, KeyError):
+            raise ValidationError(self.error_messages['invalid_upload'], code='invalid_upload')
+
+    def clean(self, data, initial=None):
+        # hidden input keeps name of the current file when no other file has been uploaded
+        if data and data == getattr(initial, 'name', initial):
+            return initial
+        return super(DirectUploadField, self).clean(data, initial)
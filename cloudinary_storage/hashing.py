@@ -0,0 +1,162 @@
+import errno
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.staticfiles import finders
+from django.core.files.base import File
+
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_CACHE_VERSION = 1
+# files modified this recently are not persisted, as their later change could keep the same size and mtime
+RACY_MTIME_NS = 2 * 10 ** 9
+
+
+def get_file_hash(content):
+    """
+    Returns the same hash as HashedFilesMixin.file_hash, but reads content in bigger chunks.
+    """
+    md5 = hashlib.md5()
+    for chunk in content.chunks(chunk_size=HASH_CHUNK_SIZE):
+        md5.update(chunk)
+    return md5.hexdigest()[:12]
+
+
+def get_path_hash(path):
+    """
+    Returns (path, size, mtime_ns) key and hash of a file on disk, executed in worker processes.
+    """
+    with open(path, 'rb') as f:
+        content = File(f)
+        return get_disk_file_key(content), get_file_hash(content)
+
+
+def get_disk_file_key(content):
+    """
+    Returns (path, size, mtime_ns) of a file opened from disk, None for other files, like ContentFile.
+    """
+    file = getattr(content, 'file', None)
+    try:
+        stat = os.fstat(file.fileno())
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+    return file.name, stat.st_size, stat.st_mtime_ns
+
+
+def get_path_key(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+class FileHashCache(object):
+    """
+    Cache of files hashes and finders lookups for the time of one collectstatic run.
+    Files opened from disk are identified by their path, size and modification time,
+    other files, like processed css files, by their objects.
+    With path given, hashes of files on disk can be loaded from and saved to a local file,
+    so that unchanged files are not even read by the next run.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.disk_hashes = {}
+        self.stored_hashes = {}
+        self.content_hashes = weakref.WeakKeyDictionary()
+        self.found_paths = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads hashes saved by the previous run, a missing or malformed file is treated as an empty one.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        except ValueError:
+            return
+        if data.get('version') != HASH_CACHE_VERSION:
+            return
+        with self.lock:
+            for path, size, mtime_ns, file_hash in data.get('hashes', []):
+                self.stored_hashes[(path, size, mtime_ns)] = file_hash
+
+    def save(self):
+        """
+        Saves hashes of files on disk used by this run, so entries of removed or changed files are dropped.
+        The file is replaced atomically, so an interrupted save never leaves a malformed cache.
+        """
+        min_racy_mtime_ns = int(time.time() * 10 ** 9) - RACY_MTIME_NS
+        with self.lock:
+            hashes = sorted([path, size, mtime_ns, file_hash]
+                            for (path, size, mtime_ns), file_hash in self.disk_hashes.items()
+                            if mtime_ns < min_racy_mtime_ns)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temporary_path, 'w') as f:
+            json.dump({'version': HASH_CACHE_VERSION, 'hashes': hashes}, f)
+        os.replace(temporary_path, self.path)
+
+    def _get_disk_hash(self, key):
+        with self.lock:
+            file_hash = self.disk_hashes.get(key)
+            if file_hash is None and key in self.stored_hashes:
+                file_hash = self.disk_hashes[key] = self.stored_hashes.pop(key)
+        return file_hash
+
+    def get_hash(self, content):
+        key = get_disk_file_key(content)
+        if key is not None:
+            file_hash = self._get_disk_hash(key)
+        else:
+            with self.lock:
+                file_hash = self.content_hashes.get(content)
+        if file_hash is None:
+            file_hash = get_file_hash(content)
+            self.set_hash(content, file_hash, key)
+        return file_hash
+
+    def set_hash(self, content, file_hash, key=None):
+        with self.lock:
+            if key is not None:
+                self.disk_hashes[key] = file_hash
+            else:
+                self.content_hashes[content] = file_hash
+
+    def get_path_hash(self, path):
+        """
+        Returns hash of a file on disk, the file is opened only when its hash is not cached yet.
+        """
+        file_hash = self._get_disk_hash(get_path_key(path))
+        if file_hash is None:
+            with open(path, 'rb') as f:
+                file_hash = self.get_hash(File(f))
+        return file_hash
+
+    def prefetch(self, paths, processes):
+        """
+        Hashes files on disk in a pool of processes, so that hashing uses all CPU cores.
+        Files with already known hashes are skipped.
+        """
+        paths = [path for path in paths if self._get_disk_hash(get_path_key(path)) is None]
+        if not paths:
+            return
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunksize = max(1, len(paths) // (processes * 4))
+            for key, file_hash in executor.map(get_path_hash, paths, chunksize=chunksize):
+                with self.lock:
+                    self.disk_hashes[key] = file_hash
+
+    def find(self, name):
+        if name not in self.found_paths:
+            self.found_paths[name] = finders.find(name)
+        return self.found_paths[name]
@@ -1,7 +1,14 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+
+import cloudinary
 import cloudinary.api
 
+SEARCH_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
 
-def get_resources_by_path(resource_type, tag, path):
+def get_resources_by_path(resource_type, tag, path, **account_options):
     resources = []
     next_cursor = None
     while True:
@@ -12,6 +19,7 @@ def get_resources_by_path(resource_type, tag, path):
             'max_results': 500,
             'tags': True
         }
+        options.update(account_options)
         if next_cursor is not None:
             options['next_cursor'] = next_cursor
         response = cloudinary.api.resources(**options)
@@ -25,7 +33,68 @@ def get_resources_by_path(resource_type, tag, path):
 
 
 def get_resources(resource_type, tag):
-    resources = []
+    return list(iter_resources(resource_type, tag))
+
+
+def iter_resources(resource_type, tag, created_after=None, created_before=None, **account_options):
+    """
+    Yields public ids of all resources with a tag, the next page of 500 resources is fetched only when needed.
+    """
+    next_cursor = None
+    while True:
+        resources, next_cursor = get_resources_page(resource_type, tag, next_cursor, created_after, created_before,
+                                                    **account_options)
+        for resource in resources:
+            yield resource
+        if next_cursor is None:
+            break
+
+
+def get_resources_page(resource_type, tag, next_cursor=None, created_after=None, created_before=None,
+                       **account_options):
+    """
+    Returns public ids of one page of 500 resources with a tag and a cursor of the next page, None for the last one.
+    When created_after or created_before datetimes are given, only resources created in that window are returned.
+    Account options, like cloud_name, api_key and api_secret, are passed to the API call.
+    """
+    if created_after is not None or created_before is not None:
+        return search_resources_page(resource_type, tag, next_cursor, created_after, created_before,
+                                     **account_options)
+    options = {'resource_type': resource_type, 'max_results': 500}
+    options.update(account_options)
+    if next_cursor is not None:
+        options['next_cursor'] = next_cursor
+    response = cloudinary.api.resources_by_tag(tag, **options)
+    return [resource['public_id'] for resource in response['resources']], response.get('next_cursor')
+
+
+def search_resources_page(resource_type, tag, next_cursor=None, created_after=None, created_before=None,
+                          **account_options):
+    """
+    Same as get_resources_page, but uses Search API, as Admin API can't filter resources by creation date.
+    """
+    expression = ['resource_type:{}'.format(resource_type), 'tags="{}"'.format(tag)]
+    if created_after is not None:
+        expression.append('created_at>="{}"'.format(format_search_date(created_after)))
+    if created_before is not None:
+        expression.append('created_at<"{}"'.format(format_search_date(created_before)))
+    search = cloudinary.Search().expression(' AND '.join(expression)).max_results(500)
+    if next_cursor is not None:
+        search = search.next_cursor(next_cursor)
+    response = search.execute(**account_options)
+    return [resource['public_id'] for resource in response['resources']], response.get('next_cursor')
+
+
+def format_search_date(date):
+    return date.astimezone(timezone.utc).strftime(SEARCH_DATE_FORMAT)
+
+
+def get_resources_etags(resource_type, tag):
+    """
+    Returns dict of public ids of all resources with a tag mapped to their ETags.
+    ETag is None when Cloudinary doesn't return it for a resource.
+    """
+    etags = {}
     next_cursor = None
     while True:
         options = {'resource_type': resource_type, 'max_results': 500}
@@ -33,8 +102,70 @@ def get_resources(resource_type, tag):
             options['next_cursor'] = next_cursor
         response = cloudinary.api.resources_by_tag(tag, **options)
         for resource in response['resources']:
-            resources.append(resource['public_id'])
+            etags[resource['public_id']] = resource.get('etag')
         next_cursor = response.get('next_cursor')
         if next_cursor is None:
             break
+    return etags
+
+
+def delete_resources(resource_type, public_ids, **account_options):
+    """
+    Deletes up to 100 resources with one Admin API call, returns public ids which have been deleted.
+    """
+    response = cloudinary.api.delete_resources(public_ids, resource_type=resource_type, invalidate=True,
+                                               **account_options)
+    return [public_id for public_id, status in response['deleted'].items() if status == 'deleted']
+
+
+def get_resources_by_ids(resource_type, public_ids, **account_options):
+    """
+    Returns dict of public ids mapped to their resources, fetched with one Admin API call per 100 public ids.
+    Public ids of resources which don't exist are missing in the dict.
+    """
+    public_ids = list(public_ids)
+    resources = {}
+    for start in range(0, len(public_ids), 100):
+        response = cloudinary.api.resources_by_ids(public_ids[start:start + 100], resource_type=resource_type,
+                                                   max_results=100, **account_options)
+        for resource in response['resources']:
+            resources[resource['public_id']] = resource
     return resources
+
+
+class TaskPool(object):
+    """
+    Runs tasks concurrently in a bounded pool of threads.
+    Submitting a task blocks when twice as many tasks as workers are pending,
+    so producers cannot get too far ahead of workers and memory usage stays bounded.
+    """
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.semaphore = threading.BoundedSemaphore(2 * workers)
+        self.tasks = []
+
+    def submit(self, key, func, *args, **kwargs):
+        self.semaphore.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self.semaphore.release()
+            raise
+        future.add_done_callback(lambda future: self.semaphore.release())
+        self.tasks.append((key, future))
+
+    def join(self):
+        """
+        Waits for all submitted tasks and returns list of (key, exception) pairs of failed ones,
+        in the order in which tasks were submitted.
+        """
+        tasks, self.tasks = self.tasks, []
+        errors = []
+        for key, future in tasks:
+            error = future.exception()
+            if error is not None:
+                errors.append((key, error))
+        return errors
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,82 @@
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from PIL import Image, ImageOps
+
+from . import app_settings
+
+SUPPORTED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+SPOOL_SIZE = 8 * 2 ** 20  # re-encoded images bigger than that are written to a temporary file instead of memory
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns pool of UPLOAD_IMAGE_WORKERS threads transforming images, created once, so that only that many images
+    are decoded at the same time, however many threads upload files.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app_settings.UPLOAD_IMAGE_WORKERS)
+        return _executor
+
+
+def transform_image(content, max_dimension, quality):
+    """
+    Downscales an image to fit max_dimension, strips its metadata and re-encodes it with quality in a worker thread.
+    Returns the new content with original (width, height), None when the image has an unsupported format,
+    is animated or re-encoding it without downscaling doesn't make it smaller, so that the original is uploaded.
+    """
+    return get_executor().submit(_transform_image, content, max_dimension, quality).result()
+
+
+def _transform_image(content, max_dimension, quality):
+    content.seek(0)
+    try:
+        source = Image.open(content)
+    except (IOError, OSError, SyntaxError, getattr(Image, 'DecompressionBombError', OSError)):
+        # images with more than twice Image.MAX_IMAGE_PIXELS are not decoded at all, they are uploaded as they are
+        content.seek(0)
+        return None
+    image = source
+    try:
+        if image.format not in SUPPORTED_FORMATS or getattr(image, 'is_animated', False):
+            return None
+        image_format = image.format
+        original_mode = image.mode
+        original_size = image.size
+        icc_profile = image.info.get('icc_profile')
+        scale = min(1.0, float(max_dimension) / max(original_size))
+        size = (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale)))
+        if image_format == 'JPEG':
+            # decodes at the smallest DCT scale still bigger than the target size, so full image is never in memory
+            image.draft('RGB', size)
+        if hasattr(ImageOps, 'exif_transpose'):
+            image = ImageOps.exif_transpose(image)  # orientation is kept, as EXIF data is dropped
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        options = {'format': image_format, 'optimize': True}
+        if icc_profile and image.mode == original_mode:
+            # profile of the original color space, like CMYK, doesn't describe converted pixels
+            options['icc_profile'] = icc_profile
+        if image_format in ('JPEG', 'WEBP'):
+            options['quality'] = quality
+        image.save(output, **options)
+        output_size = output.tell()
+        if scale == 1.0 and output_size >= content.size:
+            output.close()
+            return None
+        output.seek(0)
+        transformed_content = File(output, name=content.name)
+        transformed_content.size = output_size
+        return transformed_content, original_size
+    finally:
+        source.close()
+        content.seek(0)
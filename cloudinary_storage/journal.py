@@ -0,0 +1,59 @@
+import errno
+import json
+import os
+import threading
+
+
+class UploadJournal(object):
+    """
+    Local file recording static files confirmed to be uploaded to Cloudinary during collectstatic run,
+    one JSON object per line, so that an interrupted run can be resumed without checking those files again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    def read(self):
+        """
+        Returns dict of journaled file names mapped to their entries.
+        Incomplete last line, left by a killed process, is ignored.
+        """
+        entries = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[entry['name']] = entry
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+        return entries
+
+    def record(self, name, resource_type, etag):
+        line = json.dumps({'name': name, 'resource_type': resource_type, 'etag': etag}) + '\n'
+        with self.lock:
+            if self.file is None:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                self.file = open(self.path, 'a')
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def clear(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
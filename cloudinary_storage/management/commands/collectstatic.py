@@ -1,5 +1,13 @@
+import os
+
 from django.contrib.staticfiles.management.commands import collectstatic
 from django.conf import settings
+from django.core.management.base import CommandError
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.hashing import FileHashCache
+from cloudinary_storage.helpers import TaskPool
+from cloudinary_storage.plan import UploadPlan
 
 
 class Command(collectstatic.Command):
@@ -7,10 +15,118 @@ class Command(collectstatic.Command):
         super(Command, self).add_arguments(parser)
         parser.add_argument('--upload-unhashed-files', action='store_true', dest='upload_unhashed_files',
                             help='Apart from hashed files, upload unhashed ones as well. Use only when you need it.')
+        parser.add_argument('--incremental', action='store_true', dest='incremental',
+                            help='Skip remote checks of hashed files listed in the previous staticfiles.json, '
+                                 'as they are already uploaded. Works only with StaticHashedCloudinaryStorage.')
+        parser.add_argument('--prefetch-etags', action='store_true', dest='prefetch_etags',
+                            help='Fetch ETags of all uploaded static files at the start in a few Admin API calls, '
+                                 'instead of sending HEAD request per each file.')
+        parser.add_argument('--hashing-processes', type=int, default=1, dest='hashing_processes',
+                            help='Number of processes hashing files before post processing, 1 is the default. '
+                                 'Works only with StaticHashedCloudinaryStorage.')
+        parser.add_argument('--workers', type=int, default=1, dest='workers',
+                            help='Number of files checked and uploaded concurrently, 1 is the default.')
+        parser.add_argument('--plan', action='store_true', dest='plan',
+                            help='Print number of files, bytes and upload calls per resource type which the command '
+                                 'would upload, without uploading anything.')
+        parser.add_argument('--plan-output', dest='plan_output',
+                            help='Write upload plan to a given JSON file, implies --plan.')
+        parser.add_argument('--execute-plan', dest='execute_plan',
+                            help='Upload files according to a JSON file written with --plan-output, '
+                                 'without checking planned and already uploaded files against Cloudinary.')
 
     def set_options(self, **options):
         super(Command, self).set_options(**options)
         self.upload_unhashed_files = options['upload_unhashed_files']
+        self.incremental = options['incremental']
+        self.prefetch_etags = options['prefetch_etags']
+        self.workers = options['workers']
+        self.hashing_processes = options['hashing_processes']
+        self.plan_output = options['plan_output']
+        self.plan = options['plan'] or self.plan_output is not None
+        self.execute_plan = options['execute_plan']
+        if self.workers < 1:
+            raise CommandError('--workers must be a positive number.')
+        if self.hashing_processes < 1:
+            raise CommandError('--hashing-processes must be a positive number.')
+        if self.hashing_processes > 1 and not hasattr(self.storage, 'hashing_processes'):
+            raise CommandError('--hashing-processes works only with StaticHashedCloudinaryStorage.')
+        if self.incremental and not hasattr(self.storage, 'incremental'):
+            raise CommandError('--incremental works only with StaticHashedCloudinaryStorage.')
+        if self.prefetch_etags and not hasattr(self.storage, 'fetch_remote_etags'):
+            raise CommandError('--prefetch-etags works only with Cloudinary static storages.')
+        if (self.plan or self.execute_plan) and not hasattr(self.storage, 'upload_plan'):
+            raise CommandError('--plan and --execute-plan work only with Cloudinary static storages.')
+        if self.plan and (self.execute_plan or self.dry_run):
+            raise CommandError('--plan cannot be used together with --execute-plan or --dry-run.')
+
+    def get_storage_options(self):
+        """
+        Returns storage attributes which are set according to command params for the time of collecting.
+        """
+        options = {}
+        if hasattr(self.storage, 'hash_cache'):
+            options['hash_cache'] = self.get_hash_cache()
+        if self.incremental or (self.plan and hasattr(self.storage, 'incremental')):
+            # plan is computed from the difference against the previous manifest
+            options['incremental'] = True
+        if self.plan:
+            options['upload_plan'] = UploadPlan()
+        if self.execute_plan:
+            plan = self.load_plan(self.execute_plan)
+            options['planned_skips'] = plan.skipped
+            options['planned_uploads'] = frozenset(plan.uploads)
+        if self.hashing_processes > 1:
+            options['hashing_processes'] = self.hashing_processes
+        if self.prefetch_etags and not self.dry_run:
+            options['remote_etags'] = self.storage.fetch_remote_etags()
+        if self.workers > 1 and hasattr(self.storage, 'wait_for_uploads') and not self.plan:
+            # files are still processed and reported in the same order, only checks and uploads are concurrent
+            options['upload_pool'] = TaskPool(self.workers)
+        return options
+
+    def get_hash_cache(self):
+        """
+        Returns hash cache for the time of collecting, loaded from STATICFILES_HASH_CACHE_ROOT when it is set.
+        """
+        if app_settings.STATICFILES_HASH_CACHE_ROOT is None:
+            return FileHashCache()
+        hash_cache = FileHashCache(os.path.join(app_settings.STATICFILES_HASH_CACHE_ROOT, 'staticfiles-hashes.json'))
+        hash_cache.load()
+        return hash_cache
+
+    @staticmethod
+    def load_plan(path):
+        try:
+            return UploadPlan.load(path)
+        except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+            raise CommandError('Upload plan {} could not be loaded: {}'.format(path, e))
+
+    def collect(self):
+        """
+        Overwritten to apply storage options and to report files which failed to be uploaded in the background.
+        """
+        options = self.get_storage_options()
+        original_options = {name: getattr(self.storage, name) for name in options}
+        for name, value in options.items():
+            setattr(self.storage, name, value)
+        try:
+            collected = super(Command, self).collect()
+            if 'hash_cache' in options and options['hash_cache'].path is not None and not self.dry_run:
+                options['hash_cache'].save()
+            failed_uploads = self.storage.wait_for_uploads() if 'upload_pool' in options else []
+            if self.plan:
+                self.stdout.write(options['upload_plan'].format_summary())
+                if self.plan_output is not None:
+                    options['upload_plan'].save(self.plan_output)
+        finally:
+            for name, value in original_options.items():
+                setattr(self.storage, name, value)
+            if 'upload_pool' in options:
+                options['upload_pool'].shutdown()
+        if failed_uploads:  # when files were post-processed, failed uploads have already been reported
+            raise CommandError(self.storage.get_upload_error(failed_uploads))
+        return collected
 
     def delete_file(self, path, prefixed_path, source_storage):
         """
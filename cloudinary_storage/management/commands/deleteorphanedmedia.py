@@ -1,24 +1,101 @@
-from itertools import chain
+import errno
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from argparse import ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
 
 from django.apps import apps
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import models
+from django.utils import version
 
 from cloudinary_storage import app_settings
-from cloudinary_storage.helpers import get_resources
+from cloudinary_storage.accounts import (get_account_options, get_accounts, get_listed_accounts, join_name,
+                                        split_name)
+from cloudinary_storage.helpers import (TaskPool, SEARCH_DATE_FORMAT, delete_resources, format_search_date,
+                                       get_resources_page, iter_resources)
+from cloudinary_storage.sorting import SortedRuns, StringHashSet, iter_difference
 from cloudinary_storage.storage import storages_per_type, RESOURCE_TYPES
 
+AGE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_age(value):
+    """
+    Parses age like 30m, 12h, 1d or 2w into timedelta, number without unit is a number of seconds.
+    """
+    match = re.match(r'^(\d+)([smhdw]?)$', value.strip())
+    if match is None:
+        raise ArgumentTypeError("Invalid age '{}', use a number with unit s, m, h, d or w, like 1d.".format(value))
+    return timedelta(**{AGE_UNITS[match.group(2) or 's']: int(match.group(1))})
+
 
 class Command(BaseCommand):
     help = 'Removes all orphaned media files'
-    TAG = app_settings.MEDIA_TAG
+    TAG = app_settings.setting('MEDIA_TAG')
+    DB_CHUNK_SIZE = 2000  # number of rows fetched from the database at once
+    SORT_RUN_SIZE = 100000  # number of files sorted in memory before they are spilled to disk
+    MAX_BATCH_SIZE = 100  # limit of Admin API delete_resources call
+    STATE_FILE = 'deleteorphanedmedia-state.json'
+    STATE_VERSION = 1
+    workers = 1
+    batch_size = MAX_BATCH_SIZE
+    created_after = None
+    created_before = None
 
     def add_arguments(self, parser):
         parser.add_argument('--noinput', action='store_true', dest='no_input',
                             help='Do not prompt the user for input of any kind.')
+        parser.add_argument('--workers', type=int, default=1, dest='workers',
+                            help='Number of resource types listed and batches of files deleted concurrently, '
+                                 '1 is the default.')
+        parser.add_argument('--batch-size', type=int, default=self.MAX_BATCH_SIZE, dest='batch_size',
+                            help='Number of files deleted with one Admin API call, '
+                                 '{0} is the default and the maximum.'.format(self.MAX_BATCH_SIZE))
+        parser.add_argument('--resume', action='store_true', dest='resume',
+                            help='Continue from the checkpoint saved by a previous interrupted or bounded run.')
+        parser.add_argument('--max-deletes', type=int, dest='max_deletes',
+                            help='Stop after deleting a given number of files, saving a checkpoint.')
+        parser.add_argument('--time-budget', type=float, dest='time_budget',
+                            help='Stop after a given number of seconds, saving a checkpoint.')
+        parser.add_argument('--state-file', default=self.STATE_FILE, dest='state_file',
+                            help='Path of the checkpoint file, {} is the default.'.format(self.STATE_FILE))
+        parser.add_argument('--older-than', type=parse_age, dest='older_than',
+                            help='Only check files uploaded earlier than a given age ago, like 1h.')
+        parser.add_argument('--newer-than', type=parse_age, dest='newer_than',
+                            help='Only check files uploaded within a given age, like 1d.')
 
     def set_options(self, **options):
         self.no_input = options['no_input']
+        self.workers = options['workers']
+        self.batch_size = options['batch_size']
+        if self.workers < 1:
+            raise CommandError('--workers must be a positive number.')
+        if not 1 <= self.batch_size <= self.MAX_BATCH_SIZE:
+            raise CommandError('--batch-size must be between 1 and {}.'.format(self.MAX_BATCH_SIZE))
+        self.resume = options['resume']
+        self.max_deletes = options['max_deletes']
+        self.time_budget = options['time_budget']
+        self.state_file = options['state_file']
+        if self.max_deletes is not None and self.max_deletes < 1:
+            raise CommandError('--max-deletes must be a positive number.')
+        if self.time_budget is not None and self.time_budget <= 0:
+            raise CommandError('--time-budget must be a positive number.')
+        now = datetime.now(timezone.utc)
+        older_than = options['older_than']
+        newer_than = options['newer_than']
+        if older_than is not None and newer_than is not None and newer_than <= older_than:
+            raise CommandError('--newer-than must be greater than --older-than.')
+        self.created_before = None if older_than is None else now - older_than
+        self.created_after = None if newer_than is None else now - newer_than
+        # without listing all files first, files are deleted page by page and progress is saved after each page
+        self.checkpointed = self.resume or self.max_deletes is not None or self.time_budget is not None
 
     def models(self):
         """
@@ -46,12 +123,35 @@ class Command(BaseCommand):
                 resource_types.add(resource_type)
         return resource_types
 
+    def get_accounts(self):
+        """
+        Returns accounts media files are sharded among, see ACCOUNTS setting.
+        """
+        return get_accounts()
+
+    def get_listings(self):
+        """
+        Returns (resource type, account) pairs listed to find files to remove, None for the default account.
+        """
+        accounts = get_listed_accounts(self.get_accounts())
+        return [(resource_type, account) for resource_type in sorted(self.get_resource_types())
+                for account in accounts]
+
+    def split_name(self, name):
+        accounts = self.get_accounts()
+        return split_name(name, accounts) if accounts else (None, name)
+
     def get_needful_files(self):
         """
         Returns set of media files associated with models.
         Those files won't be deleted.
         """
-        needful_files = []
+        return set(self.iter_needful_files())
+
+    def iter_needful_files(self):
+        """
+        Yields media files associated with models, rows are fetched from the database in chunks.
+        """
         for model in self.models():
             media_fields = []
             for field in self.model_file_fields(model):
@@ -59,8 +159,15 @@ class Command(BaseCommand):
             if media_fields:
                 exclude_options = {media_field: '' for media_field in media_fields}
                 model_uploaded_media = model.objects.exclude(**exclude_options).values_list(*media_fields)
-                needful_files.extend(model_uploaded_media)
-        return set(chain.from_iterable(needful_files))
+                for files in self.iterate_queryset(model_uploaded_media):
+                    for file in files:
+                        if file:
+                            yield file
+
+    def iterate_queryset(self, queryset):
+        if version.get_complete_version() >= (2, 0):
+            return queryset.iterator(chunk_size=self.DB_CHUNK_SIZE)
+        return queryset.iterator()
 
     def get_exclude_paths(self):
         storage = storages_per_type[RESOURCE_TYPES['RAW']]
@@ -71,45 +178,210 @@ class Command(BaseCommand):
         """
         Returns orphaned media files to be removed grouped by resource type.
         All files which paths start with any of exclude paths are ignored.
+        Needful and uploaded files are compared as sorted runs spilled to disk,
+        so memory usage doesn't grow with the number of files.
         """
         files_to_remove = {}
-        needful_files = self.get_needful_files()
-        for resources_type, resources in self.get_uploaded_resources():
-            exclude_paths = self.get_exclude_paths()
-            resources = {resource for resource in resources if not resource.startswith(exclude_paths)}
-            files_to_remove[resources_type] = resources - needful_files
+        with SortedRuns(self.iter_needful_files(), self.SORT_RUN_SIZE) as needful_files:
+            for resources_type, resources in self.get_uploaded_resources():
+                with SortedRuns(resources, self.SORT_RUN_SIZE) as sorted_resources:
+                    files_to_remove[resources_type] = set(iter_difference(sorted_resources, needful_files))
         return files_to_remove
 
     def get_uploaded_resources(self):
-        for resources_type in self.get_resource_types():
-            resources = get_resources(resources_type, self.TAG)
-            yield resources_type, resources
+        """
+        Yields resource types with iterators of their uploaded files which are not excluded, fetched page by page
+        from all accounts. With more workers, resource types and accounts are listed concurrently into sorted runs.
+        """
+        listings = self.get_listings()
+        resource_types = sorted(set(resources_type for resources_type, account in listings))
+        if self.workers == 1 or len(listings) == 1:
+            for resources_type in resource_types:
+                resources = itertools.chain.from_iterable(
+                    self.iter_uploaded_files(resources_type, account)
+                    for listed_type, account in listings if listed_type == resources_type)
+                yield resources_type, resources
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(listings))) as executor:
+            futures = [(listing, executor.submit(self.list_sorted_resources, *listing)) for listing in listings]
+            for resources_type in resource_types:
+                with ExitStack() as stack:
+                    runs = [stack.enter_context(future.result())
+                            for (listed_type, account), future in futures if listed_type == resources_type]
+                    yield resources_type, itertools.chain.from_iterable(runs)
+
+    def list_sorted_resources(self, resources_type, account=None):
+        return SortedRuns(self.iter_uploaded_files(resources_type, account), self.SORT_RUN_SIZE)
+
+    def iter_uploaded_files(self, resources_type, account=None):
+        """
+        Yields uploaded files of an account which are not excluded, named like storages name saved files,
+        so that they can be compared with needful files.
+        """
+        exclude_paths = self.get_exclude_paths()
+        resources = iter_resources(resources_type, self.TAG, self.created_after, self.created_before,
+                                   **get_account_options(account))
+        for resource in resources:
+            if not resource.startswith(exclude_paths):
+                yield join_name(account, resource)
 
     def get_flattened_files_to_remove(self, files):
         result = set()
         for files_per_type in files.values():
-            result = result | files_per_type
+            result.update(files_per_type)
         return result
 
     def delete_orphaned_files(self, files):
-        for resource_type, files_per_type in files.items():
-            for file in files_per_type:
-                self.get_file_storage(resource_type).delete(file)
-                self.stdout.write('Deleted {}.'.format(file))
+        """
+        Deletes files in batches per account with Admin API, with more workers batches are deleted concurrently.
+        """
+        self.output_lock = threading.Lock()
+        self.deleted_count = 0
+        pool = TaskPool(self.workers)
+        try:
+            for resource_type, files_per_type in files.items():
+                files_per_account = {}
+                for file in sorted(files_per_type):
+                    account, public_id = self.split_name(file)
+                    files_per_account.setdefault(account, []).append(public_id)
+                for account, public_ids in files_per_account.items():
+                    for start in range(0, len(public_ids), self.batch_size):
+                        batch = public_ids[start:start + self.batch_size]
+                        pool.submit(batch, self.delete_batch, resource_type, batch, account)
+            failed_batches = pool.join()
+        finally:
+            pool.shutdown()
+        if failed_batches:
+            lines = ['- {} files from {}: {}'.format(len(batch), batch[0], error) for batch, error in failed_batches]
+            raise CommandError('Deletion of {} batches failed:\n{}'.format(len(failed_batches), '\n'.join(lines)))
+
+    def delete_batch(self, resource_type, files, account=None):
+        deleted_files = delete_resources(resource_type, files, **get_account_options(account))
+        with self.output_lock:
+            self.deleted_count += len(deleted_files)
+            for file in deleted_files:
+                self.stdout.write('Deleted {}.'.format(join_name(account, file)))
 
     def get_file_storage(self, resource_type):
         return storages_per_type[resource_type]
 
+    def load_state(self):
+        """
+        Returns checkpoint saved by a previous run, None when there is none or it was saved for a different tag.
+        """
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        except ValueError:
+            return None
+        if state.get('version') != self.STATE_VERSION or state.get('tag') != self.TAG:
+            return None
+        return state
+
+    def save_state(self, state):
+        temporary_path = '{}.{}.tmp'.format(self.state_file, os.getpid())
+        with open(temporary_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary_path, self.state_file)
+
+    def clear_state(self):
+        try:
+            os.remove(self.state_file)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def get_initial_state(self):
+        return {'version': self.STATE_VERSION, 'tag': self.TAG, 'completed_resource_types': [],
+                'resource_type': None, 'next_cursor': None, 'processed': 0, 'deleted': 0,
+                'created_after': self.format_date(self.created_after),
+                'created_before': self.format_date(self.created_before)}
+
+    def format_date(self, date):
+        return None if date is None else format_search_date(date)
+
+    def parse_date(self, date):
+        return None if date is None else datetime.strptime(date, SEARCH_DATE_FORMAT).replace(tzinfo=timezone.utc)
+
+    def delete_orphaned_files_with_checkpoints(self):
+        """
+        Lists uploaded files page by page, deletes orphaned ones from each page right away and saves a checkpoint
+        with Admin API cursor after each page, so that a run stopped by --max-deletes, --time-budget
+        or an interruption can be continued with --resume.
+        """
+        state = self.load_state() if self.resume else None
+        if state is None:
+            state = self.get_initial_state()
+        else:
+            self.stdout.write('Resuming after {processed} checked and {deleted} deleted files.'.format(**state))
+            # cursor is valid only for the same window, so the window of the first run is used till the end
+            self.created_after = self.parse_date(state.get('created_after'))
+            self.created_before = self.parse_date(state.get('created_before'))
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        deleted_count = 0
+        needful_files = StringHashSet(self.iter_needful_files(), self.SORT_RUN_SIZE)
+        exclude_paths = self.get_exclude_paths()
+        for resource_type, account in self.get_listings():
+            # resource types of other accounts than the default one are saved with the account like file names
+            listing = join_name(account, resource_type)
+            if listing in state['completed_resource_types']:
+                continue
+            if state['resource_type'] != listing:
+                state.update(resource_type=listing, next_cursor=None)
+            while True:
+                if ((deadline is not None and time.time() >= deadline) or
+                        (self.max_deletes is not None and deleted_count >= self.max_deletes)):
+                    self.save_state(state)
+                    self.stdout.write('Stopped after {} deleted files, run the command with --resume '
+                                      'to continue.'.format(deleted_count))
+                    return
+                resources, next_cursor = get_resources_page(resource_type, self.TAG, state['next_cursor'],
+                                                            self.created_after, self.created_before,
+                                                            **get_account_options(account))
+                files = [join_name(account, resource) for resource in resources
+                         if not resource.startswith(exclude_paths)]
+                files = [file for file in files if file not in needful_files]
+                page_completed = self.max_deletes is None or len(files) <= self.max_deletes - deleted_count
+                if not page_completed:
+                    # cursor is not advanced, so the rest of the page is listed again by the next run
+                    files = files[:self.max_deletes - deleted_count]
+                self.delete_orphaned_files({resource_type: files})
+                deleted_count += self.deleted_count
+                state['deleted'] += self.deleted_count
+                if page_completed:
+                    state['processed'] += len(resources)
+                    state['next_cursor'] = next_cursor
+                self.save_state(state)
+                if page_completed and next_cursor is None:
+                    break
+            state['completed_resource_types'].append(listing)
+            state.update(resource_type=None, next_cursor=None)
+            self.save_state(state)
+        self.clear_state()
+        self.stdout.write('{} files have been deleted successfully.'.format(deleted_count))
+
     def handle(self, *args, **options):
         self.set_options(**options)
+        if self.checkpointed:
+            if self.no_input or input("Orphaned files will be deleted without listing them first. "
+                                      "If you are sure to delete them, please type 'yes': ") == 'yes':
+                self.delete_orphaned_files_with_checkpoints()
+            else:
+                self.stdout.write('As ordered, no file has been deleted.')
+            return
         files_to_remove = self.get_files_to_remove()
         flattened_files_to_remove = self.get_flattened_files_to_remove(files_to_remove)
         length = len(flattened_files_to_remove)
-        files_to_remove_str = '\n- '.join(flattened_files_to_remove)
         if not length:
             self.stdout.write('There is no file to delete.')
             return
-        self.stdout.write('{} files will be deleted:\n- {}'.format(length, files_to_remove_str))
+        self.stdout.write('{} files will be deleted:'.format(length))
+        for file in flattened_files_to_remove:
+            self.stdout.write('- {}'.format(file))
         if self.no_input or input("If you are sure to delete them, please type 'yes': ") == 'yes':
             self.delete_orphaned_files(files_to_remove)
             self.stdout.write('{} files have been deleted successfully.'.format(length))
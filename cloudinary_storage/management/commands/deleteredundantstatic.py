@@ -8,7 +8,8 @@ from . import deleteorphanedmedia
 class Command(deleteorphanedmedia.Command):
     help = 'Removes redundant static files'
     storage = StaticHashedCloudinaryStorage()
-    TAG = app_settings.STATIC_TAG
+    TAG = app_settings.setting('STATIC_TAG')
+    STATE_FILE = 'deleteredundantstatic-state.json'
 
     def add_arguments(self, parser):
         super(Command, self).add_arguments(parser)
@@ -27,24 +28,32 @@ class Command(deleteorphanedmedia.Command):
         """
         return set(RESOURCE_TYPES.values())
 
+    def get_accounts(self):
+        """
+        Overwritten as static files are never sharded.
+        """
+        return []
+
     def get_file_storage(self, resource_type):
         return self.storage
 
     def get_exclude_paths(self):
         return ()
 
-    def get_needful_files(self):
+    def iter_needful_files(self):
         """
-        Returns currently used static files.
+        Yields static files used by the current manifest and older ones kept by STATICFILES_MANIFEST_GENERATIONS.
         Assumes that manifest staticfiles.json is up-to-date.
         """
-        manifest = self.storage.load_manifest()
-        if self.keep_unhashed_files:
-            needful_files = set(manifest.keys() | manifest.values())
-            needful_files = {self.storage.clean_name(file) for file in needful_files}
-        else:
-            needful_files = set(manifest.values())
-        return {self.process_file(file) for file in needful_files}
+        for manifest in self.storage.load_manifest_generations():
+            if self.keep_unhashed_files:
+                for file in manifest.keys():
+                    yield self.process_file(self.storage.clean_name(file))
+                for file in manifest.values():
+                    yield self.process_file(self.storage.clean_name(file))
+            else:
+                for file in manifest.values():
+                    yield self.process_file(file)
 
     def process_file(self, file):
         return self.storage._remove_extension_for_non_raw_file(self.storage._prepend_prefix(file))
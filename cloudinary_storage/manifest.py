@@ -0,0 +1,105 @@
+import hashlib
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+
+MAGIC = b'CSMF0002'
+HEADER = struct.Struct('<16sI')  # MD5 digest of JSON manifest the file was compiled from, number of entries
+ENTRY = struct.Struct('<IIII')  # key offset, key length, value offset, value length, relative to the strings
+
+
+def get_manifest_digest(contents):
+    """
+    Returns digest of JSON manifest contents, hashed names have fixed length, so sizes of different manifests
+    are often the same.
+    """
+    return hashlib.md5(contents).digest()
+
+
+def write_compiled_manifest(path, paths, json_digest):
+    """
+    Writes manifest paths as a binary file with entries sorted by UTF-8 encoded keys, so that it can be
+    memory-mapped and searched without parsing. The file is replaced atomically, so processes which
+    have already mapped the previous file keep reading it.
+    """
+    entries = sorted((key.encode('utf-8'), value.encode('utf-8')) for key, value in paths.items())
+    index = []
+    strings = []
+    offset = 0
+    for key, value in entries:
+        index.append(ENTRY.pack(offset, len(key), offset + len(key), len(value)))
+        strings.append(key)
+        strings.append(value)
+        offset += len(key) + len(value)
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(json_digest, len(entries)))
+        f.writelines(index)
+        f.writelines(strings)
+    os.replace(temporary_path, path)
+
+
+class CompiledManifest(MutableMapping):
+    """
+    Read-only view of a manifest written by write_compiled_manifest, looked up with binary search
+    over a memory-mapped file, so pages are shared between forked processes.
+    Names set later, like names hashed on a manifest miss, are kept in a regular dict.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.mmap.close()
+            raise ValueError("File '%s' is not a compiled manifest." % path)
+        self.json_digest, self.count = HEADER.unpack_from(self.mmap, len(MAGIC))
+        self.index_offset = len(MAGIC) + HEADER.size
+        self.strings_offset = self.index_offset + self.count * ENTRY.size
+        self.added = {}
+
+    def _get_entry(self, position):
+        key_offset, key_length, value_offset, value_length = ENTRY.unpack_from(
+            self.mmap, self.index_offset + position * ENTRY.size)
+        key_offset += self.strings_offset
+        value_offset += self.strings_offset
+        return self.mmap[key_offset:key_offset + key_length], self.mmap[value_offset:value_offset + value_length]
+
+    def _find(self, key):
+        encoded_key = key.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            middle_key, value = self._get_entry(middle)
+            if middle_key < encoded_key:
+                low = middle + 1
+            elif middle_key > encoded_key:
+                high = middle
+            else:
+                return value.decode('utf-8')
+        return None
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+        value = self._find(key) if isinstance(key, str) else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.added[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError('Compiled manifest entries cannot be deleted.')
+
+    def __iter__(self):
+        for position in range(self.count):
+            key = self._get_entry(position)[0].decode('utf-8')
+            if key not in self.added:
+                yield key
+        for key in self.added:
+            yield key
+
+    def __len__(self):
+        return self.count + sum(1 for key in self.added if self._find(key) is None)
@@ -0,0 +1,17 @@
+from django.utils.deprecation import MiddlewareMixin
+
+from . import batching
+
+
+class MetadataBatchingMiddleware(MiddlewareMixin):
+    """
+    Collects files of model instances loaded during a request, so that the first exists or size call
+    of a Cloudinary storage fetches metadata of all of them with batched Admin API calls,
+    instead of a HEAD request per file.
+    """
+    def process_request(self, request):
+        batching.activate()
+
+    def process_response(self, request, response):
+        batching.deactivate()
+        return response
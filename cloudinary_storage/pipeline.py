@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+
+from django.core.exceptions import ValidationError
+
+DEFAULT_CHUNK_SIZE = 64 * 2 ** 10
+HEADER_SIZE = 64 * 2 ** 10  # enough for validators reading file headers, like image dimensions behind EXIF data
+
+
+class UploadStage(object):
+    """
+    Consumer of content of an uploaded file, fed with chunks read by UploadPipeline before the uploader gets them.
+    Raising an exception from feed aborts the upload before the chunk is sent.
+    """
+    def feed(self, chunk):
+        pass
+
+    def finish(self):
+        pass
+
+
+class HashStage(UploadStage):
+    """
+    Computes hash of uploaded content, MD5 by default, like ETag of Cloudinary resources.
+    """
+    def __init__(self, algorithm='md5'):
+        self.hash = hashlib.new(algorithm)
+
+    def feed(self, chunk):
+        self.hash.update(chunk)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class HeaderFile(object):
+    """
+    First bytes of an uploaded file with size of the whole file, validated instead of the file.
+    """
+    def __init__(self, name, header, size):
+        self.name = name
+        self.file = io.BytesIO(header)
+        self.size = size
+        self._cloudinary_header = header
+
+
+class ValidationStage(UploadStage):
+    """
+    Runs validators which need only the first header_size bytes of a file, as soon as they are read,
+    so that an invalid file is rejected before any of its chunks is uploaded.
+    """
+    def __init__(self, validators, name, size, header_size=HEADER_SIZE):
+        self.validators = validators
+        self.name = name
+        self.size = size
+        self.header_size = header_size
+        self.header = b''
+        self.validated = False
+
+    def feed(self, chunk):
+        if not self.validated:
+            self.header += chunk[:self.header_size - len(self.header)]
+            if len(self.header) >= self.header_size:
+                self.validate()
+
+    def finish(self):
+        if not self.validated:
+            self.validate()
+
+    def validate(self):
+        self.validated = True
+        value = HeaderFile(self.name, self.header, self.size)
+        errors = []
+        for validator in self.validators:
+            try:
+                validator(value)
+            except ValidationError as e:
+                errors.extend(e.error_list)
+        if errors:
+            raise ValidationError(errors)
+
+
+def feed_stages(content, stages, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads content once through stages without uploading it, for content which is checked before it is changed.
+    """
+    with UploadPipeline(content, stages, chunk_size) as pipeline:
+        while pipeline.read(chunk_size):
+            pass
+    content.seek(0)
+
+
+class UploadPipeline(object):
+    """
+    File-like object reading content of a file once, chunk by chunk, passing each chunk through stages
+    before returning it to the uploader. Chunks are read only when the uploader asks for them,
+    so a slow upload slows down reading and at most one chunk is buffered.
+    It is a context manager like other files, closing it doesn't close the content.
+    """
+    def __init__(self, content, stages, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.name = content.name
+        self.size = content.size
+        self.stages = stages
+        self.chunks = content.chunks(chunk_size)
+        self.buffer = b''
+        self.position = 0
+        self.seek_position = None  # position reported after seeking to the end to get the size
+        self.finished = False
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.chunks.close()
+            self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def _next_chunk(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            if not self.finished:
+                self.finished = True
+                for stage in self.stages:
+                    stage.finish()
+            return b''
+        for stage in self.stages:
+            stage.feed(chunk)
+        return chunk
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed upload pipeline.')
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while size is None or size < 0 or length < size:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = b''.join(parts)
+        if size is not None and size >= 0:
+            data, self.buffer = data[:size], data[size:]
+        else:
+            self.buffer = b''
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position if self.seek_position is None else self.seek_position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Only allows seeking to the end and back to the current position, which uploaders do to get the size.
+        """
+        if whence == os.SEEK_END and offset == 0:
+            self.seek_position = self.size
+        elif whence == os.SEEK_SET and offset == self.position:
+            self.seek_position = None
+        else:
+            raise io.UnsupportedOperation('Upload pipeline can be read only once.')
+        return self.tell()
@@ -0,0 +1,76 @@
+import json
+import threading
+from collections import OrderedDict
+
+UPLOAD_PLAN_VERSION = 2
+
+
+class UploadPlan(object):
+    """
+    Static files which collectstatic would upload to Cloudinary, computed without uploading anything.
+    Files known to be already uploaded are listed as skipped with hashes of their content, so that the plan
+    can be executed later without any remote check of both planned and skipped files which haven't changed since.
+    """
+    def __init__(self, uploads=None, skipped=None):
+        self.uploads = OrderedDict() if uploads is None else uploads  # name -> (resource type, size)
+        self.skipped = {} if skipped is None else skipped  # name -> file hash
+        self.lock = threading.Lock()
+
+    def add_upload(self, name, resource_type, size):
+        with self.lock:
+            self.uploads[name] = (resource_type, size)
+            self.skipped.pop(name, None)
+
+    def add_skipped(self, name, file_hash):
+        with self.lock:
+            if name not in self.uploads:
+                self.skipped[name] = file_hash
+
+    def get_summary(self):
+        """
+        Returns number of files, bytes and Upload API calls per resource type, each file is uploaded with one call.
+        """
+        summary = OrderedDict()
+        for resource_type, size in self.uploads.values():
+            totals = summary.setdefault(resource_type, OrderedDict([('files', 0), ('bytes', 0), ('upload_calls', 0)]))
+            totals['files'] += 1
+            totals['bytes'] += size
+            totals['upload_calls'] += 1
+        return OrderedDict(sorted(summary.items()))
+
+    def format_summary(self):
+        summary = self.get_summary()
+        files = sum(totals['files'] for totals in summary.values())
+        size = sum(totals['bytes'] for totals in summary.values())
+        lines = ['Upload plan: {} files to upload, {} bytes, {} upload calls, {} files already uploaded.'.format(
+            files, size, files, len(self.skipped))]
+        for resource_type, totals in summary.items():
+            lines.append('  {}: {files} files, {bytes} bytes, {upload_calls} upload calls'.format(
+                resource_type, **totals))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        payload = OrderedDict([
+            ('version', UPLOAD_PLAN_VERSION),
+            ('summary', self.get_summary()),
+            ('uploads', [OrderedDict([('name', name), ('resource_type', resource_type), ('size', size)])
+                         for name, (resource_type, size) in self.uploads.items()]),
+            ('skipped', [OrderedDict([('name', name), ('hash', file_hash)])
+                         for name, file_hash in sorted(self.skipped.items())]),
+        ])
+        with open(path, 'w') as f:
+            json.dump(payload, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a plan saved by collectstatic --plan-output, raises ValueError when it is not a valid plan.
+        """
+        with open(path) as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict) or payload.get('version') != UPLOAD_PLAN_VERSION:
+            raise ValueError('Unsupported upload plan version.')
+        uploads = OrderedDict((upload['name'], (upload['resource_type'], upload['size']))
+                              for upload in payload['uploads'])
+        skipped = {skipped['name']: skipped['hash'] for skipped in payload['skipped']}
+        return cls(uploads, skipped)
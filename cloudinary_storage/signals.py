@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# sent by StaticHashedCloudinaryStorage with storage argument after staticfiles.json is saved
+manifest_saved = Signal()
@@ -0,0 +1,102 @@
+import hashlib
+import heapq
+import json
+import tempfile
+from array import array
+from bisect import bisect_left
+
+DEFAULT_RUN_SIZE = 100000
+
+
+class SortedRuns(object):
+    """
+    Sorted and deduplicated strings or numbers, which don't have to fit into memory.
+    Items are sorted in runs of run_size items, runs are spilled to temporary files and merged when iterated,
+    so only one run is kept in memory. With fewer items than run_size nothing is written to disk.
+    """
+    def __init__(self, items, run_size=DEFAULT_RUN_SIZE):
+        self.files = []
+        self.items = []
+        run = set()
+        for item in items:
+            run.add(item)
+            if len(run) >= run_size:
+                self._spill(run)
+                run = set()
+        if self.files:
+            self._spill(run)
+        else:
+            self.items = sorted(run)
+
+    def _spill(self, run):
+        file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self.files.append(file)
+        for item in sorted(run):
+            # JSON keeps each string on one line, even when it contains new lines
+            file.write(json.dumps(item))
+            file.write('\n')
+
+    def _read_run(self, file):
+        file.seek(0)
+        for line in file:
+            yield json.loads(line)
+
+    def __iter__(self):
+        if not self.files:
+            return iter(self.items)
+        return self._merge()
+
+    def _merge(self):
+        previous = None
+        for item in heapq.merge(*[self._read_run(file) for file in self.files]):
+            if item != previous:
+                yield item
+                previous = item
+
+    def close(self):
+        for file in self.files:
+            file.close()
+        self.files = []
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_difference(items, excluded_items):
+    """
+    Yields items which are not excluded, both iterables must be sorted.
+    """
+    excluded_items = iter(excluded_items)
+    excluded_item = next(excluded_items, None)
+    for item in items:
+        while excluded_item is not None and excluded_item < item:
+            excluded_item = next(excluded_items, None)
+        if excluded_item != item:
+            yield item
+
+
+def get_string_hash(item):
+    return int.from_bytes(hashlib.md5(item.encode('utf-8')).digest()[:8], 'big')
+
+
+class StringHashSet(object):
+    """
+    Compact set of strings kept as a sorted array of their 64-bit hashes, 8 bytes per string,
+    built from sorted runs, so it can hold tens of millions of strings.
+    A string is reported as a member by mistake only on a hash collision.
+    """
+    def __init__(self, items, run_size=DEFAULT_RUN_SIZE):
+        with SortedRuns((get_string_hash(item) for item in items), run_size) as hashes:
+            self.hashes = array('Q', hashes)
+
+    def __contains__(self, item):
+        item_hash = get_string_hash(item)
+        index = bisect_left(self.hashes, item_hash)
+        return index < len(self.hashes) and self.hashes[index] == item_hash
+
+    def __len__(self):
+        return len(self.hashes)
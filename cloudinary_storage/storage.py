@@ -1,11 +1,15 @@
 import errno
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote, urlsplit, urlunsplit
 
 import cloudinary
 import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
 import requests
 from django.conf import settings
 from django.contrib.staticfiles import finders
@@ -13,10 +17,24 @@ from django.contrib.staticfiles.storage import HashedFilesMixin, ManifestFilesMi
 from django.core.files.base import ContentFile, File
 from django.core.files.storage import Storage, FileSystemStorage
 from django.core.files.uploadedfile import UploadedFile
+from django.utils.crypto import constant_time_compare
 from django.utils.deconstruct import deconstructible
 
 from . import app_settings
-from .helpers import get_resources_by_path
+from .accounts import (find_account, get_account_credentials, get_account_options, get_accounts, get_listed_accounts,
+                       join_name, route_name, split_name)
+from .batching import forget_prefetched_metadata, get_batcher, get_prefetched_metadata
+from .hashing import FileHashCache, get_file_hash
+from .helpers import get_resources_by_path, get_resources_etags
+from .journal import UploadJournal
+from .manifest import CompiledManifest, get_manifest_digest, write_compiled_manifest
+from .pipeline import UploadPipeline, ValidationStage, feed_stages
+from .signals import manifest_saved
+
+try:
+    from cloudinary.exceptions import Error as CloudinaryError
+except ImportError:  # cloudinary < 1.17 defines its exceptions in cloudinary.api
+    CloudinaryError = cloudinary.api.Error
 
 RESOURCE_TYPES = {
     'IMAGE': 'image',
@@ -28,13 +46,14 @@ RESOURCE_TYPES = {
 @deconstructible
 class MediaCloudinaryStorage(Storage):
     RESOURCE_TYPE = RESOURCE_TYPES['IMAGE']
-    TAG = app_settings.MEDIA_TAG
+    TAG = app_settings.setting('MEDIA_TAG')
 
-    def __init__(self, tag=None, resource_type=None):
+    def __init__(self, tag=None, resource_type=None, upload_validators=None):
         if tag is not None:
             self.TAG = tag
         if resource_type is not None:
             self.RESOURCE_TYPE = resource_type
+        self.upload_validators = upload_validators or []
 
     def _get_resource_type(self, name):
         """
@@ -43,6 +62,26 @@ class MediaCloudinaryStorage(Storage):
         """
         return self.RESOURCE_TYPE
 
+    def _get_accounts(self):
+        """
+        Returns accounts files are sharded among, see ACCOUNTS setting, empty list without sharding.
+        """
+        return get_accounts()
+
+    def _route(self, name):
+        """
+        Returns account a new file is uploaded to, None for the default account.
+        """
+        accounts = self._get_accounts()
+        return route_name(name, accounts) if accounts else None
+
+    def _split_name(self, name):
+        """
+        Returns account and public id of a saved file, the account is encoded in the name, so no lookup is needed.
+        """
+        accounts = self._get_accounts()
+        return split_name(name, accounts) if accounts else (None, name)
+
     def _open(self, name, mode='rb'):
         url = self._get_url(name)
         response = requests.get(url)
@@ -54,33 +93,169 @@ class MediaCloudinaryStorage(Storage):
         file.mode = mode
         return file
 
+    def get_upload_stages(self, name, content):
+        """
+        Returns stages fed with content of a file while it is read by the uploader, see UploadPipeline.
+        Can be extended to add more stages, new ones are needed for each upload.
+        """
+        stages = []
+        if self.upload_validators:
+            stages.append(ValidationStage(self.upload_validators, name, content.size))
+        return stages
+
     def _upload(self, name, content):
         options = {'use_filename': True, 'resource_type': self._get_resource_type(name), 'tags': self.TAG}
         folder = os.path.dirname(name)
         if folder:
             options['folder'] = folder
-        return cloudinary.uploader.upload(content, **options)
+        options.update(get_account_options(self._route(name)))
+        stages = self.get_upload_stages(name, content)
+        if stages and self._is_transformed_image(name):
+            # stages check what was uploaded by a user, so they read the original before it is decoded and changed
+            feed_stages(content, stages)
+            stages = []
+        transformed_image = self._transform_image(name, content)
+        if transformed_image is not None:
+            content, (width, height) = transformed_image
+            options['context'] = 'original_width={}|original_height={}'.format(width, height)
+        try:
+            if stages:
+                # upload() reads the whole file at once, upload_large() reads and sends the pipeline chunk by chunk
+                return cloudinary.uploader.upload_large(UploadPipeline(content, stages), **options)
+            if app_settings.UPLOAD_LARGE_SIZE is not None and content.size > app_settings.UPLOAD_LARGE_SIZE:
+                # content is read and uploaded chunk by chunk instead of being read into memory at once
+                return cloudinary.uploader.upload_large(content, **options)
+            return cloudinary.uploader.upload(content, **options)
+        finally:
+            if transformed_image is not None:
+                transformed_image[0].close()
+
+    def _is_transformed_image(self, name):
+        return (app_settings.UPLOAD_IMAGE_MAX_DIMENSION is not None and
+                self._get_resource_type(name) == RESOURCE_TYPES['IMAGE'])
+
+    def _transform_image(self, name, content):
+        """
+        Returns image downscaled to UPLOAD_IMAGE_MAX_DIMENSION and re-encoded without metadata with its original
+        dimensions, see transform_image. None when the setting is not set or the file is not an image.
+        """
+        if not self._is_transformed_image(name):
+            return None
+        from .images import transform_image  # Pillow is needed only when images are transformed
+        return transform_image(content, app_settings.UPLOAD_IMAGE_MAX_DIMENSION, app_settings.UPLOAD_IMAGE_QUALITY)
 
     def _save(self, name, content):
         name = self._normalise_name(name)
         name = self._prepend_prefix(name)
-        content = UploadedFile(content, name)
+        content = UploadedFile(content, name, size=content.size)
         response = self._upload(name, content)
-        return response['public_id']
+        name = join_name(self._route(name), response['public_id'])
+        self._forget_batched_resource(name)
+        return name
+
+    def get_direct_upload_params(self, name):
+        """
+        Returns upload URL, cloud name and signed parameters of an upload sent by a browser directly to Cloudinary,
+        with the same folder, tag and resource type as _upload uses, and the same account a file would be saved to.
+        """
+        name = self._prepend_prefix(self._normalise_name(name))
+        resource_type = self._get_resource_type(name)
+        credentials = get_account_credentials(self._route(name))
+        # strings, not booleans, so that the signed values are exactly the ones sent by the browser
+        params = {'timestamp': str(int(time.time())), 'use_filename': 'true', 'tags': self.TAG}
+        folder = os.path.dirname(name)
+        if folder:
+            params['folder'] = folder
+        params['signature'] = cloudinary.utils.api_sign_request(params, credentials.api_secret)
+        params['api_key'] = credentials.api_key
+        return {
+            'url': cloudinary.utils.cloudinary_api_url('upload', resource_type=resource_type,
+                                                       cloud_name=credentials.cloud_name),
+            'cloud_name': credentials.cloud_name,
+            'params': params,
+        }
+
+    def verify_direct_upload(self, upload):
+        """
+        Checks Cloudinary response to a direct upload, with cloud_name returned by get_direct_upload_params,
+        and returns name of the uploaded file. Raises ValueError when the response is not signed by Cloudinary,
+        the file was uploaded earlier than DIRECT_UPLOAD_MAX_AGE seconds ago or not with parameters of this storage.
+        Only public_id and version are signed, so resource type and tags are checked with the Admin API.
+        """
+        try:
+            account = find_account(upload['cloud_name'], self._get_accounts())
+            public_id, version, signature = upload['public_id'], int(upload['version']), upload['signature']
+        except (KeyError, TypeError) as e:
+            raise ValueError('Invalid direct upload: {!r}.'.format(e))
+        expected_signature = cloudinary.utils.api_sign_request({'public_id': public_id, 'version': version},
+                                                               get_account_credentials(account).api_secret)
+        if not constant_time_compare(expected_signature, str(signature)):
+            raise ValueError('Invalid signature of direct upload.')
+        # version is the signed upload time of the file
+        if time.time() - version > app_settings.DIRECT_UPLOAD_MAX_AGE:
+            raise ValueError('Direct upload has expired.')
+        if self._prepend_prefix(public_id) != public_id:
+            raise ValueError('File was not uploaded with parameters of the storage.')
+        try:
+            resource = cloudinary.api.resource(public_id, resource_type=self._get_resource_type(public_id),
+                                               **get_account_options(account))
+        except cloudinary.api.NotFound:
+            raise ValueError('File was not uploaded with parameters of the storage.')
+        if resource['version'] != version or self.TAG not in resource.get('tags', []):
+            raise ValueError('File was not uploaded with parameters of the storage.')
+        name = join_name(account, public_id)
+        self._forget_batched_resource(name)
+        return name
 
     def delete(self, name):
-        response = cloudinary.uploader.destroy(name, invalidate=True, resource_type=self._get_resource_type(name))
+        account, public_id = self._split_name(name)
+        response = cloudinary.uploader.destroy(public_id, invalidate=True, resource_type=self._get_resource_type(name),
+                                               **get_account_options(account))
+        self._forget_batched_resource(name)
         return response['result'] == 'ok'
 
     def _get_url(self, name):
+        account, name = self._split_name(name)
         name = self._prepend_prefix(name)
         cloudinary_resource = cloudinary.CloudinaryResource(name, default_resource_type=self._get_resource_type(name))
-        return cloudinary_resource.url
+        if account is None:
+            return cloudinary_resource.url
+        return cloudinary_resource.build_url(cloud_name=account.cloud_name)
 
     def url(self, name):
         return self._get_url(name)
 
+    def _get_public_id(self, name):
+        return self._prepend_prefix(name)
+
+    def _get_batch_key(self, name):
+        account, public_id = self._split_name(name)
+        return self._get_resource_type(name), self._get_public_id(public_id), account
+
+    def add_to_batch(self, batcher, name):
+        batcher.add(*self._get_batch_key(name))
+
+    def _get_batched_resource(self, batcher, name):
+        return batcher.get(*self._get_batch_key(name))
+
+    def _forget_batched_resource(self, name):
+        key = self._get_batch_key(name)
+        batcher = get_batcher()
+        if batcher is not None:
+            batcher.forget(*key)
+        forget_prefetched_metadata(key)
+
     def exists(self, name):
+        batcher = get_batcher()
+        if batcher is not None:
+            try:
+                return self._get_batched_resource(batcher, name) is not None
+            except CloudinaryError:
+                pass  # like a hit Admin API rate limit, the HEAD request below doesn't count towards it
+        try:
+            return get_prefetched_metadata(self._get_batch_key(name)) is not None
+        except KeyError:
+            pass
         url = self._get_url(name)
         response = requests.head(url)
         if response.status_code == 404:
@@ -89,6 +264,20 @@ class MediaCloudinaryStorage(Storage):
         return True
 
     def size(self, name):
+        batcher = get_batcher()
+        if batcher is not None:
+            try:
+                resource = self._get_batched_resource(batcher, name)
+            except CloudinaryError:
+                pass  # like a hit Admin API rate limit, the HEAD request below doesn't count towards it
+            else:
+                return None if resource is None else resource['bytes']
+        try:
+            metadata = get_prefetched_metadata(self._get_batch_key(name))
+        except KeyError:
+            pass
+        else:
+            return None if metadata is None else metadata['bytes']
         url = self._get_url(name)
         response = requests.head(url)
         if response.status_code == 200:
@@ -118,17 +307,32 @@ class MediaCloudinaryStorage(Storage):
         return name
 
     def listdir(self, path):
+        """
+        Lists files of all accounts, accounts are listed concurrently.
+        Files of other accounts than the default one are prefixed with their cloud name, like saved names,
+        so that a listed file joined with the path resolves to its account.
+        """
         path = self._normalize_path(path)
-        resources = get_resources_by_path(self.RESOURCE_TYPE, self.TAG, path)
+        accounts = get_listed_accounts(self._get_accounts())
+
+        def get_account_resources(account):
+            return get_resources_by_path(self.RESOURCE_TYPE, self.TAG, path, **get_account_options(account))
+
+        if len(accounts) == 1:
+            resources_per_account = [get_account_resources(accounts[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+                resources_per_account = list(executor.map(get_account_resources, accounts))
         directories = set()
         files = []
-        for resource in resources:
-            resource_tail = resource.replace(path, '', 1)
-            if '/' in resource_tail:
-                directory = resource_tail.split('/', 1)[0]
-                directories.add(directory)
-            else:
-                files.append(resource_tail)
+        for account, resources in zip(accounts, resources_per_account):
+            for resource in resources:
+                resource_tail = resource.replace(path, '', 1)
+                if '/' in resource_tail:
+                    directory = resource_tail.split('/', 1)[0]
+                    directories.add(directory)
+                else:
+                    files.append(join_name(account, resource_tail))
         return list(directories), files
 
     def _normalise_name(self, name):
@@ -158,7 +362,15 @@ class StaticCloudinaryStorage(MediaCloudinaryStorage):
     and changing files could become problematic.
     """
     RESOURCE_TYPE = RESOURCE_TYPES['RAW']
-    TAG = app_settings.STATIC_TAG
+    TAG = app_settings.setting('STATIC_TAG')
+    upload_pool = None  # set by collectstatic command to upload files concurrently
+    uploaded_files = frozenset()  # prefixed names of files known to be uploaded, saved without any remote check
+    remote_etags = None  # (resource type, public id) -> ETag map of all uploaded files, when prefetched
+    hash_cache = None  # set for the time of collectstatic run, so that each file is hashed only once
+    upload_journal = None  # set for the time of post processing to record hashed files confirmed to be uploaded
+    upload_plan = None  # set by collectstatic command to record files to upload instead of uploading them
+    planned_uploads = frozenset()  # prefixed names of files known to be changed, uploaded without any remote check
+    planned_skips = {}  # prefixed name -> hash of a file planned as uploaded, skipped while its content is the same
 
     def _get_resource_type(self, name):
         """
@@ -189,6 +401,15 @@ class StaticCloudinaryStorage(MediaCloudinaryStorage):
             return settings.STATIC_URL + name
         return super(StaticCloudinaryStorage, self).url(name)
 
+    def _get_accounts(self):
+        """
+        Static files are never sharded, their names are kept in the manifest and resolved without any prefix.
+        """
+        return []
+
+    def _get_public_id(self, name):
+        return self._remove_extension_for_non_raw_file(self._prepend_prefix(name))
+
     def _upload(self, name, content):
         resource_type = self._get_resource_type(name)
         name = self._remove_extension_for_non_raw_file(name)
@@ -209,15 +430,44 @@ class StaticCloudinaryStorage(MediaCloudinaryStorage):
             extension = self._get_file_extension(name)
             return name[:-len(extension) - 1]
 
-    # we only need 2 methods of HashedFilesMixin, so we just copy them as function objects to avoid MRO complexities
-    file_hash = HashedFilesMixin.file_hash
+    # we only need 1 method of HashedFilesMixin, so we just copy it as function object to avoid MRO complexities
     clean_name = HashedFilesMixin.clean_name
 
+    def file_hash(self, name, content=None):
+        """
+        Returns the same hash as HashedFilesMixin.file_hash, taken from hash cache when it is set.
+        """
+        if content is None:
+            return None
+        if self.hash_cache is None:
+            return get_file_hash(content)
+        return self.hash_cache.get_hash(content)
+
+    def _matches_remote_etag(self, name, content):
+        """
+        Checks a file against prefetched ETags, returns None when ETags are not prefetched
+        or Cloudinary didn't return ETag for the file.
+        """
+        if self.remote_etags is None:
+            return None
+        resource_type = self._get_resource_type(name)
+        public_id = self._remove_extension_for_non_raw_file(self._prepend_prefix(name))
+        if (resource_type, public_id) not in self.remote_etags:
+            return False
+        etag = self.remote_etags[(resource_type, public_id)]
+        if etag is None:
+            return None
+        return etag.startswith(self.file_hash(name, content))
+
     def _exists_with_etag(self, name, content):
         """
         Checks whether a file with a name and a content is already uploaded to Cloudinary.
         Uses ETAG header and MD5 hash for the content comparison.
+        With prefetched ETags, HEAD request is sent only when Cloudinary didn't return ETag for a file.
         """
+        matches_remote_etag = self._matches_remote_etag(name, content)
+        if matches_remote_etag is not None:
+            return matches_remote_etag
         url = self._get_url(name)
         response = requests.head(url)
         if response.status_code == 404:
@@ -229,13 +479,85 @@ class StaticCloudinaryStorage(MediaCloudinaryStorage):
     def _save(self, name, content):
         """
         Saves only when a file with a name and a content is not already uploaded to Cloudinary.
+        With upload pool set, the check and the upload are done in the background.
+        With upload plan set, nothing is uploaded, files are only added to the plan.
         """
         name = self.clean_name(name)  # to change to UNIX style path on windows if necessary
-        if not self._exists_with_etag(name, content):
+        if self.upload_plan is not None:
+            self._add_to_upload_plan(name, content)
+        elif self._prepend_prefix(name) in self.uploaded_files or self._is_planned_skip(name, content):
+            pass
+        elif self.upload_pool is None:
+            self._upload_if_changed(name, content, self.upload_journal, self._needs_remote_check(name))
+        else:
+            # content is read into memory, because callers close files as soon as _save returns
+            file_hash = self.file_hash(name, content)
             content.seek(0)
-            super(StaticCloudinaryStorage, self)._save(name, content)
+            copied_content = ContentFile(content.read())
+            if self.hash_cache is not None:
+                self.hash_cache.set_hash(copied_content, file_hash)
+            self.upload_pool.submit(name, self._upload_if_changed, name, copied_content, self.upload_journal,
+                                    self._needs_remote_check(name))
         return self._prepend_prefix(name)
 
+    def _needs_remote_check(self, name):
+        """
+        Checked in the thread calling _save, as storages decide it by thread local state.
+        Files planned to be uploaded are known to be changed.
+        """
+        return self._prepend_prefix(name) not in self.planned_uploads
+
+    def _is_planned_skip(self, name, content):
+        """
+        Checks whether an executed plan lists a file as uploaded with the same content, so that a file changed
+        after the plan was computed is checked and uploaded as usual.
+        """
+        planned_hash = self.planned_skips.get(self._prepend_prefix(name))
+        return planned_hash is not None and planned_hash == self.file_hash(name, content)
+
+    def _add_to_upload_plan(self, name, content):
+        """
+        Plans upload of a file unless it is known to be uploaded, no request is sent to Cloudinary,
+        so without prefetched ETags all files not listed as uploaded are planned.
+        """
+        prefixed_name = self._prepend_prefix(name)
+        if prefixed_name in self.uploaded_files or self._matches_remote_etag(name, content):
+            self.upload_plan.add_skipped(prefixed_name, self.file_hash(name, content))
+        else:
+            self.upload_plan.add_upload(prefixed_name, self._get_resource_type(name), content.size)
+
+    def _upload_if_changed(self, name, content, upload_journal=None, check_remote=True):
+        if not check_remote or not self._exists_with_etag(name, content):
+            content.seek(0)
+            super(StaticCloudinaryStorage, self)._save(name, content)
+        if upload_journal is not None:
+            # Cloudinary ETag is MD5 of a file, so file hash is its prefix
+            etag = self.file_hash(name, content)
+            upload_journal.record(self._prepend_prefix(name), self._get_resource_type(name), etag)
+
+    def fetch_remote_etags(self):
+        """
+        Returns ETags of all static files uploaded to Cloudinary, fetched with Admin API in pages of 500 files.
+        """
+        remote_etags = {}
+        for resource_type in RESOURCE_TYPES.values():
+            for public_id, etag in get_resources_etags(resource_type, self.TAG).items():
+                remote_etags[(resource_type, public_id)] = etag
+        return remote_etags
+
+    def wait_for_uploads(self):
+        """
+        Waits for files uploaded in the background and returns list of (name, error) pairs of failed uploads.
+        """
+        if self.upload_pool is None:
+            return []
+        return self.upload_pool.join()
+
+    @staticmethod
+    def get_upload_error(failed_uploads):
+        lines = ['- {}: {}'.format(name, error) for name, error in failed_uploads]
+        return IOError('Upload of {} files failed:\n{}'.format(len(failed_uploads), '\n'.join(lines)))
+
     def _get_prefix(self):
         return settings.STATIC_URL
 
@@ -268,32 +590,76 @@ class ManifestCloudinaryStorage(FileSystemStorage):
         location = app_settings.STATICFILES_MANIFEST_ROOT if location is None else location
         super(ManifestCloudinaryStorage, self).__init__(location, base_url, *args, **kwargs)
 
+    @staticmethod
+    def get_generation_name(name, generation):
+        """
+        Returns name of a manifest saved the given number of collectstatic runs ago, 0 is the current one.
+        """
+        return name if generation == 0 else '{}.{}'.format(name, generation)
+
+    def rotate(self, name, generations):
+        """
+        Moves each kept manifest to the next generation, the oldest one is overwritten,
+        so that a new manifest can be saved under the name.
+        """
+        for generation in range(generations - 1, 0, -1):
+            previous_name = self.get_generation_name(name, generation - 1)
+            if self.exists(previous_name):
+                os.replace(self.path(previous_name), self.path(self.get_generation_name(name, generation)))
+
 
 class HashCloudinaryMixin(object):
+    incremental = False  # set by collectstatic command to trust files listed in the previous manifest
+    hashing_processes = 1  # set by collectstatic command to hash files in a pool of processes
+
     def __init__(self, *args, **kwargs):
         self.manifest_storage = ManifestCloudinaryStorage()
+        self._post_processing = threading.local()
+        self._failed_uploads = []
         super(HashCloudinaryMixin, self).__init__(*args, **kwargs)
 
+    def exists(self, name):
+        """
+        Always False during post processing to prevent any exist check, as uploads are checked by ETag anyway.
+        The flag is thread local, so other threads using the storage are not affected.
+        """
+        if getattr(self._post_processing, 'active', False):
+            return False
+        return super(HashCloudinaryMixin, self).exists(name)
+
+    def _needs_remote_check(self, name):
+        """
+        With incremental collecting, files from the previous manifest are skipped, so any file saved during post
+        processing has a new hashed name, which is uploaded without any check, as its content is new.
+        """
+        if self.incremental and getattr(self._post_processing, 'active', False):
+            return False
+        return super(HashCloudinaryMixin, self)._needs_remote_check(name)
+
+    def _get_found_file_hash(self, name):
+        """
+        Returns hash of a file found by staticfiles finders.
+        With hash cache set, finders lookups are memoized and files are opened only when not hashed yet.
+        """
+        absolute_path = finders.find(name) if self.hash_cache is None else self.hash_cache.find(name)
+        try:
+            if self.hash_cache is not None:
+                return self.hash_cache.get_path_hash(absolute_path)
+            with open(absolute_path, 'rb') as content:
+                return self.file_hash(name, File(content))
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                raise ValueError("The file '%s' could not be found with %r." % (name, self))
+            else:
+                raise
+
     def hashed_name(self, name, content=None, filename=None):
         parsed_name = urlsplit(unquote(name))
         clean_name = parsed_name.path.strip()
-        opened = False
         if content is None:
-            absolute_path = finders.find(clean_name)
-            try:
-                content = open(absolute_path, 'rb')
-            except (IOError, OSError) as e:
-                if e.errno == errno.ENOENT:
-                    raise ValueError("The file '%s' could not be found with %r." % (clean_name, self))
-                else:
-                    raise
-            content = File(content)
-            opened = True
-        try:
+            file_hash = self._get_found_file_hash(clean_name)
+        else:
             file_hash = self.file_hash(clean_name, content)
-        finally:
-            if opened:
-                content.close()
         path, filename = os.path.split(clean_name)
         root, ext = os.path.splitext(filename)
         if file_hash is not None:
@@ -308,11 +674,90 @@ class HashCloudinaryMixin(object):
         return urlunsplit(unparsed_name)
 
     def post_process(self, paths, dry_run=False, **options):
-        original_exists = self.exists
-        self.exists = lambda name: False  # temporarily overwritten to prevent any exist check
-        for response in super(HashCloudinaryMixin, self).post_process(paths, dry_run, **options):
-            yield response
-        self.exists = original_exists
+        original_uploaded_files = self.uploaded_files
+        self.uploaded_files = set(original_uploaded_files)
+        if self.incremental:
+            # hashed names contain hashes of files content, so files from the previous manifest are already uploaded
+            self.uploaded_files.update(self.load_manifest().values())
+        if app_settings.STATICFILES_UPLOAD_JOURNAL and not dry_run and self.upload_plan is None:
+            # files confirmed to be uploaded by an interrupted run are not checked again
+            self.upload_journal = UploadJournal(self.manifest_storage.path(self.manifest_name + '.journal'))
+            self.uploaded_files.update(self.upload_journal.read())
+        own_hash_cache = self.hash_cache is None
+        if own_hash_cache:
+            self.hash_cache = FileHashCache()
+        self._post_processing.active = True
+        try:
+            if self.hashing_processes > 1 and not dry_run:
+                self.hash_cache.prefetch(self._get_local_paths(paths), self.hashing_processes)
+            for response in super(HashCloudinaryMixin, self).post_process(paths, dry_run, **options):
+                yield response
+            failed_uploads = self._failed_uploads + self.wait_for_uploads()
+        finally:
+            self._post_processing.active = False
+            self._failed_uploads = []
+            self.uploaded_files = original_uploaded_files
+            if self.upload_journal is not None:
+                self.upload_journal.close()
+                self.upload_journal = None
+            if own_hash_cache:
+                self.hash_cache = None
+        if failed_uploads:
+            yield 'All', None, self.get_upload_error(failed_uploads)
+
+    @staticmethod
+    def _get_local_paths(paths):
+        """
+        Returns absolute paths of files to post process, skipping files from storages without local paths.
+        """
+        local_paths = []
+        for storage, path in paths.values():
+            try:
+                local_paths.append(storage.path(path))
+            except NotImplementedError:
+                pass
+        return local_paths
+
+    def load_manifest(self):
+        if app_settings.STATICFILES_COMPILED_MANIFEST:
+            compiled_manifest = self.load_compiled_manifest()
+            if compiled_manifest is not None:
+                return compiled_manifest
+        return super(HashCloudinaryMixin, self).load_manifest()
+
+    def load_compiled_manifest(self):
+        """
+        Returns memory-mapped manifest, None when it doesn't exist or it was compiled from different staticfiles.json.
+        """
+        try:
+            compiled_manifest = CompiledManifest(self.manifest_storage.path(self.manifest_name + '.compiled'))
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            # hashing is much faster than parsing, so the JSON manifest is still read
+            with self.manifest_storage.open(self.manifest_name) as manifest:
+                json_digest = get_manifest_digest(manifest.read())
+        except (IOError, OSError):
+            json_digest = None
+        if compiled_manifest.json_digest != json_digest:
+            compiled_manifest.mmap.close()
+            return None
+        return compiled_manifest
+
+    def load_manifest_generations(self):
+        """
+        Yields paths of the current manifest and of older ones kept according to STATICFILES_MANIFEST_GENERATIONS,
+        one manifest at a time, so that they are never all kept in memory.
+        """
+        yield self.load_manifest()
+        for generation in range(1, app_settings.STATICFILES_MANIFEST_GENERATIONS):
+            name = self.manifest_storage.get_generation_name(self.manifest_name, generation)
+            try:
+                with self.manifest_storage.open(name) as manifest:
+                    content = manifest.read().decode('utf-8')
+            except IOError:
+                return  # older generations are moved in order, so they don't exist either
+            yield json.loads(content).get('paths', {})
 
     def read_manifest(self):
         try:
@@ -328,17 +773,35 @@ class HashCloudinaryMixin(object):
                 paths[clean_path] = paths[path]
 
     def save_manifest(self):
+        # background uploads must be finished, so that the manifest never points to files which are not uploaded,
+        # for the same reason the manifest is not saved when files are only planned to be uploaded
+        self._failed_uploads = self.wait_for_uploads()
+        if self._failed_uploads or self.upload_plan is not None:
+            return
         payload = {'paths': self.hashed_files, 'version': self.manifest_version}
         if os.name == 'nt':
             paths = payload['paths']
             self.add_unix_path_keys_to_paths(paths)
-        if self.manifest_storage.exists(self.manifest_name):
-            self.manifest_storage.delete(self.manifest_name)
         contents = json.dumps(payload).encode('utf-8')
+        if self.manifest_storage.exists(self.manifest_name):
+            # unchanged manifest doesn't take place of an older generation
+            if (app_settings.STATICFILES_MANIFEST_GENERATIONS > 1 and
+                    self.read_manifest() != contents.decode('utf-8')):
+                self.manifest_storage.rotate(self.manifest_name, app_settings.STATICFILES_MANIFEST_GENERATIONS)
+            else:
+                self.manifest_storage.delete(self.manifest_name)
         self.manifest_storage._save(self.manifest_name, ContentFile(contents))
+        if app_settings.STATICFILES_COMPILED_MANIFEST:
+            write_compiled_manifest(self.manifest_storage.path(self.manifest_name + '.compiled'),
+                                    self.hashed_files, get_manifest_digest(contents))
+        if self.upload_journal is not None:
+            self.upload_journal.clear()
+        manifest_saved.send(sender=self.__class__, storage=self)
 
     # we only need 1 method of HashedFilesMixin, so we just copy it as function objects to avoid MRO complexities
     stored_name = HashedFilesMixin.stored_name
+    # StaticCloudinaryStorage.file_hash would be shadowed by HashedFilesMixin.file_hash otherwise
+    file_hash = StaticCloudinaryStorage.file_hash
 
 
 class StaticHashedCloudinaryStorage(HashCloudinaryMixin, ManifestFilesMixin, StaticCloudinaryStorage):
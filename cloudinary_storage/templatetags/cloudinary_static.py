@@ -1,20 +1,149 @@
+import threading
+
 from django import template
+from django.db.models.fields.files import FieldFile
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.contrib.staticfiles.storage import staticfiles_storage
 
 from cloudinary import CloudinaryResource
 
+from cloudinary_storage import app_settings
+from cloudinary_storage.cache import LRUCache, freeze
+from cloudinary_storage.signals import manifest_saved
+
 register = template.Library()
 
-@register.simple_tag(name='cloudinary_static', takes_context=True)
-def cloudinary_static(context, image, options_dict={}, **options):
+# rendered HTML of static images, keyed by name and options, which include secure flag,
+# created on the first use, so that STATIC_TAG_CACHE_SIZE is read only after settings are configured
+_rendered_tags = None
+_rendered_tags_lock = threading.Lock()
+
+MIME_TYPES = {'jpg': 'image/jpeg', 'svg': 'image/svg+xml'}
+
+
+@receiver(manifest_saved)
+@receiver(setting_changed)
+def clear_rendered_tags(*args, **kwargs):
+    """
+    Drops the cache, a new one is created with the current STATIC_TAG_CACHE_SIZE on the next use.
+    """
+    global _rendered_tags
+    _rendered_tags = None
+
+
+def get_rendered_tags():
+    global _rendered_tags
+    with _rendered_tags_lock:
+        if _rendered_tags is None:
+            _rendered_tags = LRUCache(app_settings.STATIC_TAG_CACHE_SIZE)
+        return _rendered_tags
+
+
+def get_options(context, options_dict, options):
     options = dict(options_dict, **options)
     try:
         if context['request'].is_secure() and 'secure' not in options:
             options['secure'] = True
     except KeyError:
         pass
-    if not isinstance(image, CloudinaryResource):
-        image = staticfiles_storage.stored_name(image)
-        image = CloudinaryResource(image)
-    return mark_safe(image.image(**options))
+    return options
+
+
+def get_cached(key, render, *args):
+    rendered_tags = get_rendered_tags()
+    try:
+        html = rendered_tags.get(key)
+    except TypeError:  # options with unhashable values are not cached
+        return mark_safe(render(*args))
+    if html is None:
+        html = render(*args)
+        rendered_tags.set(key, html)
+    return mark_safe(html)
+
+
+def render_static_image(image, options):
+    image = staticfiles_storage.stored_name(image)
+    return CloudinaryResource(image).image(**options)
+
+
+@register.simple_tag(name='cloudinary_static', takes_context=True)
+def cloudinary_static(context, image, options_dict={}, **options):
+    options = get_options(context, options_dict, options)
+    if isinstance(image, CloudinaryResource):
+        return mark_safe(image.image(**options))
+    return get_cached((image, freeze(options)), render_static_image, image, options)
+
+
+cloudinary_static.cache_info = lambda: get_rendered_tags().cache_info()
+cloudinary_static.cache_clear = clear_rendered_tags
+
+
+def split(value):
+    if isinstance(value, str):
+        return tuple(item.strip() for item in value.split(',') if item.strip())
+    return tuple(value)
+
+
+def get_urls(resource, options, widths, fetch_format):
+    urls = []
+    for width in widths:
+        url_options = dict(options, width=width, crop=options.get('crop', 'scale'))
+        if fetch_format is not None:
+            url_options['fetch_format'] = fetch_format
+        urls.append((resource.build_url(**url_options), width))
+    return urls
+
+
+def get_srcset(urls):
+    return ', '.join('{} {}w'.format(url, width) for url, width in urls)
+
+
+def get_media_public_id(image):
+    """
+    Returns cloud name and public id of a media file, cloud name is None for files of the default account.
+    """
+    account, public_id = image.storage._split_name(image.name)
+    return None if account is None else account.cloud_name, image.storage._prepend_prefix(public_id)
+
+
+def render_responsive_image(image, options, widths, formats, sizes, alt):
+    if isinstance(image, FieldFile):
+        cloud_name, public_id = get_media_public_id(image)
+        if cloud_name is not None:
+            options = dict(options, cloud_name=cloud_name)
+    else:
+        public_id = staticfiles_storage.stored_name(image)
+    resource = CloudinaryResource(public_id)
+    # f_auto lets Cloudinary choose the best format supported by a browser, so it is used by img fallback
+    urls = get_urls(resource, options, widths, 'auto' if 'auto' in formats else None)
+    html = format_html('<img src="{}" srcset="{}" sizes="{}" alt="{}">', urls[-1][0], get_srcset(urls), sizes, alt)
+    sources = [format_html('<source type="{}" srcset="{}" sizes="{}">',
+                           MIME_TYPES.get(fetch_format, 'image/' + fetch_format),
+                           get_srcset(get_urls(resource, options, widths, fetch_format)), sizes)
+               for fetch_format in formats if fetch_format != 'auto']
+    if sources:
+        html = format_html('<picture>{}{}</picture>', mark_safe(''.join(sources)), html)
+    return html
+
+
+@register.simple_tag(name='cloudinary_responsive', takes_context=True)
+def cloudinary_responsive(context, image, options_dict={}, widths=None, formats=None, sizes='100vw', alt='',
+                          **options):
+    """
+    Renders img with srcset of widths, or picture with a source per format other than auto,
+    for a static image name or an image FieldFile.
+    """
+    options = get_options(context, options_dict, options)
+    widths = split(app_settings.RESPONSIVE_WIDTHS if widths is None else widths)
+    if not widths:
+        raise template.TemplateSyntaxError('cloudinary_responsive tag needs at least one width.')
+    formats = split(app_settings.RESPONSIVE_FORMATS if formats is None else formats)
+    if isinstance(image, FieldFile):
+        name = ('media',) + get_media_public_id(image)
+    else:
+        name = ('static', image)
+    key = (name, freeze(options), widths, formats, sizes, alt)
+    return get_cached(key, render_responsive_image, image, options, widths, formats, sizes, alt)
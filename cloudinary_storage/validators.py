@@ -1,19 +1,137 @@
 import os
+import threading
 
 import magic
 
 from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
+from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext as _
 
 from cloudinary_storage import app_settings
 
+HEADER_SIZE = 2048  # number of first bytes of a file libmagic needs to recognise common formats
+
+_local = threading.local()
+
+
+def get_magic():
+    """
+    Returns magic object of the current thread, created once, as libmagic cookies cannot be shared between threads.
+    """
+    magic_object = getattr(_local, 'magic', None)
+    if magic_object is None:
+        if os.name == 'nt':
+            magic_object = magic.Magic(magic_file=app_settings.MAGIC_FILE_PATH, mime=True)
+        else:
+            magic_object = magic.Magic(mime=True)
+        _local.magic = magic_object
+    return magic_object
+
+
+def get_header(value):
+    """
+    Returns first bytes of an uploaded file, read once and kept with the file for other validators.
+    """
+    header = getattr(value, '_cloudinary_header', None)
+    if header is None:
+        value.file.seek(0)
+        header = value.file.read(HEADER_SIZE)
+        value.file.seek(0)
+        value._cloudinary_header = header
+    return header
+
+
+def get_mime_type(value):
+    mime = getattr(value, '_cloudinary_mime_type', None)
+    if mime is None:
+        mime = get_magic().from_buffer(get_header(value))
+        value._cloudinary_mime_type = mime
+    return mime
+
+
+@deconstructible
+class MimeTypeValidator(object):
+    """
+    Validates that MIME type recognised from the first bytes of a file starts with any of allowed MIME types,
+    like image/ or application/pdf.
+    """
+    message = 'Files of type %(mime_type)s are not allowed.'
+    code = 'invalid_mime_type'
+
+    def __init__(self, allowed_mime_types, message=None):
+        self.allowed_mime_types = tuple(allowed_mime_types)
+        if message is not None:
+            self.message = message
+
+    def __call__(self, value):
+        mime = get_mime_type(value)
+        if not mime.startswith(self.allowed_mime_types):
+            raise ValidationError(_(self.message), code=self.code, params={'mime_type': mime})
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and self.allowed_mime_types == other.allowed_mime_types and
+                self.message == other.message)
+
+
+@deconstructible
+class MaxFileSizeValidator(object):
+    """
+    Validates that a file is not bigger than max_size bytes, without reading it.
+    """
+    message = 'Files bigger than %(max_size)s bytes are not allowed.'
+    code = 'file_too_big'
+
+    def __init__(self, max_size, message=None):
+        self.max_size = max_size
+        if message is not None:
+            self.message = message
+
+    def __call__(self, value):
+        if value.size > self.max_size:
+            raise ValidationError(_(self.message), code=self.code, params={'max_size': self.max_size})
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and self.max_size == other.max_size and self.message == other.message
+
+
+@deconstructible
+class ImageDimensionsValidator(object):
+    """
+    Validates width, height and number of pixels of an image, reading only as much of it as Pillow needs
+    to parse its dimensions, usually its header.
+    """
+    message = 'Images bigger than %(max_width)sx%(max_height)s pixels or %(max_pixels)s pixels are not allowed.'
+    code = 'image_too_big'
+
+    def __init__(self, max_width=None, max_height=None, max_pixels=None, message=None):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_pixels = max_pixels
+        if message is not None:
+            self.message = message
+
+    def __call__(self, value):
+        width, height = get_image_dimensions(value.file)
+        if width is None:
+            raise ValidationError(_(app_settings.INVALID_IMAGE_ERROR_MESSAGE), code='invalid_image')
+        if ((self.max_width is not None and width > self.max_width) or
+                (self.max_height is not None and height > self.max_height) or
+                (self.max_pixels is not None and width * height > self.max_pixels)):
+            params = {'max_width': self.max_width, 'max_height': self.max_height, 'max_pixels': self.max_pixels}
+            raise ValidationError(_(self.message), code=self.code, params=params)
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and
+                (self.max_width, self.max_height, self.max_pixels, self.message) ==
+                (other.max_width, other.max_height, other.max_pixels, other.message))
+
 
 def validate_video(value):
-    if os.name == 'nt':
-        magic_object = magic.Magic(magic_file='magic', mime=True)
-        mime = magic_object.from_buffer(value.file.read(1024))
-    else:
-        mime = magic.from_buffer(value.file.read(1024), mime=True)
-    value.file.seek(0)
-    if not mime.startswith('video/'):
+    if not get_mime_type(value).startswith('video/'):
         raise ValidationError(_(app_settings.INVALID_VIDEO_ERROR_MESSAGE))
+
+
+def validate_image(value):
+    if not get_mime_type(value).startswith('image/'):
+        raise ValidationError(_(app_settings.INVALID_IMAGE_ERROR_MESSAGE))
@@ -0,0 +1,34 @@
+import posixpath
+
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.generic import View
+
+from .storage import RESOURCE_TYPES, storages_per_type
+
+
+class DirectUploadView(View):
+    """
+    Returns JSON with URL and signed parameters of a direct upload of a file named by name query parameter,
+    see DirectUploadField. Only file name is taken from the browser, it is put into upload_to folder of the storage.
+    """
+    storage = None  # MediaCloudinaryStorage is the default
+    upload_to = ''
+
+    def get_storage(self):
+        return storages_per_type[RESOURCE_TYPES['IMAGE']] if self.storage is None else self.storage
+
+    def has_permission(self, request):
+        """
+        Anyone allowed to get upload parameters can upload files to your Cloudinary account,
+        so only authenticated users are allowed by default.
+        """
+        return request.user.is_authenticated
+
+    def get(self, request):
+        if not self.has_permission(request):
+            return HttpResponseForbidden()
+        storage = self.get_storage()
+        name = posixpath.basename(storage._normalise_name(request.GET.get('name', '')))
+        if not name:
+            return HttpResponseBadRequest()
+        return JsonResponse(storage.get_direct_upload_params(posixpath.join(self.upload_to, name)))
@@ -41,7 +41,8 @@ setup(
         'cloudinary>=1.4.0'
     ],
     extras_require={
-        'video': ['python-magic>=0.4.12']
+        'video': ['python-magic>=0.4.12'],
+        'image': ['Pillow>=3.3.0']
     },
     classifiers=[
         'Environment :: Web Environment',
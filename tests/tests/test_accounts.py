@@ -0,0 +1,142 @@
+from io import StringIO
+
+import cloudinary
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.accounts import Account, get_accounts, join_name, route_name, split_name
+from cloudinary_storage.batching import MetadataBatcher
+from cloudinary_storage.management.commands.deleteorphanedmedia import Command as DeleteOrphanedMediaCommand
+from cloudinary_storage.storage import RawMediaCloudinaryStorage, StaticCloudinaryStorage, RESOURCE_TYPES
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+ACCOUNTS = [
+    {'CLOUD_NAME': 'shard-1', 'API_KEY': 'key-1', 'API_SECRET': 'secret-1'},
+    {'CLOUD_NAME': 'shard-2', 'API_KEY': 'key-2', 'API_SECRET': 'secret-2'},
+]
+SHARD_1 = Account('shard-1', 'key-1', 'secret-1')
+SHARD_2 = Account('shard-2', 'key-2', 'secret-2')
+
+
+@mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+class AccountsTests(SimpleTestCase):
+    def test_accounts_are_read_from_settings(self):
+        self.assertEqual(get_accounts(), [SHARD_1, SHARD_2])
+
+    def test_route_is_stable_and_spreads_names(self):
+        accounts = get_accounts()
+        names = ['media/file-{}.txt'.format(i) for i in range(100)]
+        routes = [route_name(name, accounts) for name in names]
+        self.assertEqual(routes, [route_name(name, accounts) for name in names])
+        self.assertEqual(set(routes), {SHARD_1, SHARD_2})
+
+    def test_name_is_joined_and_split(self):
+        name = join_name(SHARD_2, 'media/file.txt')
+        self.assertEqual(name, 'shard-2:media/file.txt')
+        self.assertEqual(split_name(name, get_accounts()), (SHARD_2, 'media/file.txt'))
+
+    def test_name_of_default_account_is_not_prefixed(self):
+        self.assertEqual(join_name(None, 'media/file.txt'), 'media/file.txt')
+        self.assertEqual(split_name('media/file.txt', get_accounts()), (None, 'media/file.txt'))
+        self.assertEqual(split_name('unknown:media/file.txt', get_accounts()), (None, 'unknown:media/file.txt'))
+
+    def test_listed_name_joined_with_directory_is_split(self):
+        self.assertEqual(split_name('media/shard-2:file.txt', get_accounts()), (SHARD_2, 'media/file.txt'))
+
+
+@mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+class ShardedStorageTests(SimpleTestCase):
+    def get_sharded_name(self, account):
+        accounts = get_accounts()
+        for i in range(100):
+            name = 'file-{}.txt'.format(i)
+            if route_name(RawMediaCloudinaryStorage()._prepend_prefix(name), accounts) == account:
+                return name
+
+    @mock.patch('cloudinary_storage.storage.cloudinary.uploader.upload')
+    def test_file_is_uploaded_to_routed_account(self, upload_mock):
+        storage = RawMediaCloudinaryStorage()
+        name = self.get_sharded_name(SHARD_2)
+        upload_mock.return_value = {'public_id': storage._prepend_prefix(name)}
+        saved_name = storage.save(name, ContentFile(b'content'))
+        self.assertEqual(saved_name, 'shard-2:' + storage._prepend_prefix(name))
+        options = upload_mock.call_args[1]
+        self.assertEqual((options['cloud_name'], options['api_key'], options['api_secret']),
+                         ('shard-2', 'key-2', 'secret-2'))
+
+    def test_url_points_to_account_cloud(self):
+        storage = RawMediaCloudinaryStorage()
+        url = storage.url('shard-1:media/file.txt')
+        self.assertIn('/shard-1/raw/upload/', url)
+        self.assertIn('/{}/raw/upload/'.format(cloudinary.config().cloud_name), storage.url('media/file.txt'))
+
+    @mock.patch('cloudinary_storage.storage.cloudinary.uploader.destroy', return_value={'result': 'ok'})
+    def test_file_is_deleted_from_its_account(self, destroy_mock):
+        self.assertTrue(RawMediaCloudinaryStorage().delete('shard-1:media/file.txt'))
+        destroy_mock.assert_called_once_with('media/file.txt', invalidate=True, resource_type='raw',
+                                             **SHARD_1.options)
+
+    @mock.patch('cloudinary_storage.storage.get_resources_by_path')
+    def test_listdir_lists_all_accounts(self, get_resources_mock):
+        get_resources_mock.side_effect = lambda resource_type, tag, path, **options: [
+            path + options.get('cloud_name', 'default') + '.txt']
+        storage = RawMediaCloudinaryStorage()
+        directories, files = storage.listdir('media')
+        self.assertEqual(sorted(files), ['default.txt', 'shard-1:shard-1.txt', 'shard-2:shard-2.txt'])
+        self.assertEqual(storage._split_name('media/shard-1:shard-1.txt'), (SHARD_1, 'media/shard-1.txt'))
+        self.assertIn('/shard-1/raw/upload/', storage.url('media/shard-1:shard-1.txt'))
+
+    def test_static_files_are_not_sharded(self):
+        storage = StaticCloudinaryStorage()
+        self.assertIsNone(storage._route('file.txt'))
+        self.assertEqual(storage._split_name('shard-1:file.txt'), (None, 'shard-1:file.txt'))
+
+    @mock.patch('cloudinary_storage.batching.get_resources_by_ids')
+    def test_batched_metadata_is_fetched_per_account(self, get_resources_mock):
+        get_resources_mock.side_effect = lambda resource_type, public_ids, **options: {
+            public_id: {'public_id': public_id, 'bytes': len(options)} for public_id in public_ids}
+        storage = RawMediaCloudinaryStorage()
+        batcher = MetadataBatcher()
+        storage.add_to_batch(batcher, 'media/file.txt')
+        storage.add_to_batch(batcher, 'shard-1:media/file.txt')
+        self.assertEqual(storage._get_batched_resource(batcher, 'media/file.txt')['bytes'], 0)
+        self.assertEqual(storage._get_batched_resource(batcher, 'shard-1:media/file.txt')['bytes'], 3)
+        self.assertEqual(get_resources_mock.call_count, 2)
+
+
+@mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+@mock.patch.object(DeleteOrphanedMediaCommand, 'get_resource_types', return_value={RESOURCE_TYPES['RAW']})
+@mock.patch.object(DeleteOrphanedMediaCommand, 'iter_needful_files',
+                   side_effect=lambda: iter(['media/needful', 'shard-1:media/needful']))
+class DeleteOrphanedMediaCommandShardingTests(SimpleTestCase):
+    RESOURCES = {
+        None: ['media/needful', 'media/a'],
+        'shard-1': ['media/needful', 'media/b'],
+        'shard-2': ['media/needful'],
+    }
+
+    def iter_resources(self, resource_type, tag, created_after=None, created_before=None, **options):
+        return iter(self.RESOURCES[options.get('cloud_name')])
+
+    def test_files_of_all_accounts_are_compared(self, needful_mock, types_mock):
+        for workers in (1, 3):
+            command = DeleteOrphanedMediaCommand()
+            command.workers = workers
+            with mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.iter_resources',
+                            side_effect=self.iter_resources):
+                files_to_remove = command.get_files_to_remove()
+            expected = {'media/a', 'shard-1:media/b', 'shard-2:media/needful'}
+            self.assertEqual(files_to_remove, {RESOURCE_TYPES['RAW']: expected})
+
+    @mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.delete_resources',
+                side_effect=lambda resource_type, files, **options: files)
+    def test_files_are_deleted_from_their_accounts(self, delete_resources_mock, needful_mock, types_mock):
+        command = DeleteOrphanedMediaCommand(stdout=StringIO())
+        command.delete_orphaned_files({RESOURCE_TYPES['RAW']: {'media/a', 'shard-1:media/b', 'shard-1:media/c'}})
+        calls = sorted((call[0], call[1].get('cloud_name')) for call in delete_resources_mock.call_args_list)
+        self.assertEqual(calls, [((RESOURCE_TYPES['RAW'], ['media/a']), None),
+                                 ((RESOURCE_TYPES['RAW'], ['media/b', 'media/c']), 'shard-1')])
+        self.assertIn('Deleted shard-1:media/b.', command.stdout.getvalue())
@@ -74,3 +74,44 @@ class OverrideSettingsTests(SimpleTestCase):
         with override_settings(CLOUDINARY_STORAGE={'MEDIA_TAG': 'test'}):
             self.assertEqual(app_settings.MEDIA_TAG, 'test')
         self.assertEqual(app_settings.MEDIA_TAG, old_value)
+
+
+CREDENTIALS = {'CLOUD_NAME': 'name', 'API_SECRET': 'secret', 'API_KEY': 'key'}
+
+
+class LazySettingsTests(SimpleTestCase):
+    def tearDown(self):
+        app_settings.invalidate()
+        app_settings.configure()  # credentials of the test settings
+
+    @mock.patch('cloudinary_storage.app_settings.set_credentials')
+    def test_settings_are_resolved_once_on_first_access(self, set_credentials_mock):
+        app_settings.invalidate()
+        self.assertNotIn('MEDIA_TAG', vars(app_settings))
+        self.assertEqual(app_settings.STATIC_TAG, 'static')
+        self.assertEqual(app_settings.MEDIA_TAG, 'media')
+        self.assertEqual(vars(app_settings)['MEDIA_TAG'], 'media')
+        self.assertEqual(set_credentials_mock.call_count, 1)
+
+    def test_settings_are_invalidated_without_reloading_module(self):
+        module = app_settings
+        with override_settings(CLOUDINARY_STORAGE=dict(CREDENTIALS, MEDIA_TAG='test')):
+            self.assertEqual(app_settings.MEDIA_TAG, 'test')
+        self.assertIs(module, app_settings)
+        self.assertIsInstance(app_settings, app_settings.LazySettingsModule)
+        self.assertNotIn('MEDIA_TAG', vars(app_settings))
+
+    def test_setting_class_attribute_follows_settings(self):
+        class Storage(object):
+            TAG = app_settings.setting('MEDIA_TAG')
+
+        with override_settings(CLOUDINARY_STORAGE=dict(CREDENTIALS, MEDIA_TAG='test')):
+            self.assertEqual(Storage.TAG, 'test')
+            storage = Storage()
+            storage.TAG = 'other'
+            self.assertEqual(storage.TAG, 'other')
+        self.assertEqual(Storage().TAG, 'media')
+
+    def test_unknown_setting_raises_attribute_error(self):
+        with self.assertRaises(AttributeError):
+            app_settings.UNKNOWN_SETTING
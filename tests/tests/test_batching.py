@@ -0,0 +1,182 @@
+import gc
+
+import cloudinary.api
+from django.db.models.signals import post_init
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory
+
+from cloudinary_storage import batching
+from cloudinary_storage.batching import MetadataBatcher, batched_metadata, get_batcher, prefetch_cloudinary_metadata
+from cloudinary_storage.middleware import MetadataBatchingMiddleware
+from tests.models import TestImageModel, TestModel
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+
+def get_resources_by_ids(resource_type, public_ids):
+    return {public_id: {'public_id': public_id, 'bytes': len(public_id)}
+            for public_id in public_ids if 'missing' not in public_id}
+
+
+@mock.patch('cloudinary_storage.batching.get_resources_by_ids', side_effect=get_resources_by_ids)
+class MetadataBatcherTests(SimpleTestCase):
+    def test_pending_resources_are_fetched_together(self, get_resources_mock):
+        batcher = MetadataBatcher()
+        batcher.add('raw', 'media/a')
+        batcher.add('raw', 'media/missing')
+        batcher.add('image', 'media/b')
+        self.assertEqual(batcher.get('raw', 'media/a')['bytes'], 7)
+        self.assertIsNone(batcher.get('raw', 'media/missing'))
+        self.assertEqual(batcher.get('image', 'media/b')['bytes'], 7)
+        self.assertEqual(get_resources_mock.call_count, 2)
+
+    def test_forgotten_resource_is_fetched_again(self, get_resources_mock):
+        batcher = MetadataBatcher()
+        batcher.get('raw', 'media/a')
+        batcher.forget('raw', 'media/a')
+        batcher.get('raw', 'media/a')
+        self.assertEqual(get_resources_mock.call_count, 2)
+
+
+@mock.patch('cloudinary_storage.batching.get_resources_by_ids', side_effect=get_resources_by_ids)
+class MetadataBatchingStorageTests(SimpleTestCase):
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_files_of_loaded_instances_are_fetched_with_one_call(self, head_mock, get_resources_mock):
+        with batched_metadata():
+            instances = [TestModel(name='file', file='tests/file-{}.txt'.format(i)) for i in range(3)]
+            instances.append(TestModel(name='missing', file='tests/missing.txt'))
+            instances.append(TestModel(name='without file'))
+            sizes = [instance.file.size for instance in instances[:3]]
+            self.assertFalse(instances[3].file.storage.exists(instances[3].file.name))
+        self.assertEqual(sizes, [len(instances[0].file.storage._prepend_prefix('tests/file-0.txt'))] * 3)
+        get_resources_mock.assert_called_once_with('raw', mock.ANY)
+        self.assertEqual(len(get_resources_mock.call_args[0][1]), 4)
+        self.assertFalse(head_mock.called)
+
+    def test_files_are_fetched_per_resource_type(self, get_resources_mock):
+        with batched_metadata():
+            instance = TestImageModel(name='image', file='tests/file.txt', image='tests-images/image')
+            instance.image.storage.exists(instance.image.name)
+        resource_types = sorted(call[0][0] for call in get_resources_mock.call_args_list)
+        self.assertEqual(resource_types, ['image', 'raw'])
+
+    @mock.patch('cloudinary_storage.storage.cloudinary.uploader.destroy', return_value={'result': 'ok'})
+    def test_deleted_file_is_forgotten(self, destroy_mock, get_resources_mock):
+        with batched_metadata() as batcher:
+            instance = TestModel(name='file', file='tests/file.txt')
+            self.assertTrue(instance.file.storage.exists(instance.file.name))
+            instance.file.storage.delete(instance.file.name)
+            self.assertEqual(batcher.resources, {})
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_exists_falls_back_to_head_request_on_admin_api_error(self, head_mock, get_resources_mock):
+        get_resources_mock.side_effect = cloudinary.api.RateLimited('Rate Limit Exceeded')
+        head_mock.return_value.status_code = 404
+        with batched_metadata():
+            instance = TestModel(name='file', file='tests/file.txt')
+            self.assertFalse(instance.file.storage.exists(instance.file.name))
+        head_mock.assert_called_once_with(mock.ANY)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_size_falls_back_to_head_request_on_admin_api_error(self, head_mock, get_resources_mock):
+        get_resources_mock.side_effect = cloudinary.api.RateLimited('Rate Limit Exceeded')
+        head_mock.return_value.status_code = 200
+        head_mock.return_value.headers = {'content-length': '42'}
+        with batched_metadata():
+            instance = TestModel(name='file', file='tests/file.txt')
+            self.assertEqual(instance.file.storage.size(instance.file.name), 42)
+        head_mock.assert_called_once_with(mock.ANY)
+
+    def test_instances_loaded_without_batcher_are_not_collected(self, get_resources_mock):
+        TestModel(name='file', file='tests/file.txt')
+        self.assertIsNone(get_batcher())
+
+    def test_receiver_is_connected_only_while_batching(self, get_resources_mock):
+        self.assertFalse(post_init.has_listeners(TestModel))
+        with batched_metadata():
+            with batched_metadata():
+                self.assertTrue(post_init.has_listeners(TestModel))
+            self.assertTrue(post_init.has_listeners(TestModel))
+        self.assertFalse(post_init.has_listeners(TestModel))
+
+
+class MetadataBatchingMiddlewareTests(SimpleTestCase):
+    def test_batcher_is_active_only_during_request(self):
+        batchers = []
+
+        def get_response(request):
+            batchers.append(get_batcher())
+            return HttpResponse()
+
+        MetadataBatchingMiddleware(get_response)(RequestFactory().get('/'))
+        self.assertIsInstance(batchers[0], MetadataBatcher)
+        self.assertIsNone(batching.get_batcher())
+
+
+@mock.patch('cloudinary_storage.batching.get_resources_by_ids')
+class PrefetchCloudinaryMetadataTests(SimpleTestCase):
+    def get_resources_by_ids(self, resource_type, public_ids):
+        resources = {}
+        for public_id in public_ids:
+            if resource_type == 'image':
+                resources[public_id] = {'public_id': public_id, 'bytes': 100, 'width': 40, 'height': 30,
+                                        'format': 'png'}
+            elif 'missing' not in public_id:
+                resources[public_id] = {'public_id': public_id, 'bytes': 10, 'format': 'txt'}
+        return resources
+
+    def test_metadata_is_attached_to_field_files(self, get_resources_mock):
+        get_resources_mock.side_effect = self.get_resources_by_ids
+        instances = [TestImageModel(name='image', file='tests/file.txt', image='tests-images/image-{}'.format(i))
+                     for i in range(3)]
+        instances.append(TestImageModel(name='missing', file='tests/missing.txt'))
+        result = prefetch_cloudinary_metadata(instances, 'file', 'image')
+        self.assertEqual(result, instances)
+        self.assertFalse(hasattr(instances[0].image, '_dimensions_cache'))
+        self.assertEqual(get_resources_mock.call_count, 2)
+        self.assertEqual(instances[1].image.cloudinary_metadata,
+                         {'bytes': 100, 'width': 40, 'height': 30, 'format': 'png'})
+        self.assertEqual(instances[2].file.cloudinary_metadata,
+                         {'bytes': 10, 'width': None, 'height': None, 'format': 'txt'})
+        self.assertIsNone(instances[3].file.cloudinary_metadata)
+        self.assertFalse(hasattr(instances[3].image, 'cloudinary_metadata'))
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_prefetched_metadata_is_used_without_batcher(self, head_mock, get_resources_mock):
+        get_resources_mock.side_effect = self.get_resources_by_ids
+        instances = prefetch_cloudinary_metadata([TestModel(name='file', file='tests/file-{}.txt'.format(i))
+                                                  for i in range(3)] +
+                                                 [TestModel(name='missing', file='tests/missing.txt')], 'file')
+        self.assertEqual([instance.file.size for instance in instances[:3]], [10, 10, 10])
+        self.assertTrue(instances[0].file.storage.exists(instances[0].file.name))
+        self.assertFalse(instances[3].file.storage.exists(instances[3].file.name))
+        self.assertFalse(head_mock.called)
+        self.assertEqual(get_resources_mock.call_count, 1)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_prefetched_metadata_is_dropped_with_field_files(self, head_mock, get_resources_mock):
+        get_resources_mock.side_effect = self.get_resources_by_ids
+        head_mock.return_value.status_code = 404
+        prefetch_cloudinary_metadata([TestModel(name='file', file='tests/dropped.txt')], 'file')
+        gc.collect()
+        self.assertFalse(TestModel(name='file', file='tests/dropped.txt').file.storage.exists('tests/dropped.txt'))
+        self.assertTrue(head_mock.called)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    @mock.patch('cloudinary_storage.storage.cloudinary.uploader.destroy', return_value={'result': 'ok'})
+    def test_prefetched_metadata_of_deleted_file_is_forgotten(self, destroy_mock, head_mock, get_resources_mock):
+        get_resources_mock.side_effect = self.get_resources_by_ids
+        head_mock.return_value.status_code = 404
+        instance = prefetch_cloudinary_metadata([TestModel(name='file', file='tests/file.txt')], 'file')[0]
+        instance.file.storage.delete(instance.file.name)
+        self.assertFalse(instance.file.storage.exists(instance.file.name))
+        self.assertTrue(head_mock.called)
+
+    def test_prefetched_metadata_is_used_by_active_batcher(self, get_resources_mock):
+        get_resources_mock.side_effect = self.get_resources_by_ids
+        with batched_metadata():
+            instances = prefetch_cloudinary_metadata([TestModel(name='file', file='tests/file.txt')], 'file')
+            self.assertEqual(instances[0].file.size, 10)
+            self.assertEqual(get_batcher().pending, {('raw', None): set()})
+        self.assertEqual(get_resources_mock.call_count, 1)
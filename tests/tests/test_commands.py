@@ -1,16 +1,24 @@
+import json
 import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.files.base import ContentFile
 from django.core.files.images import ImageFile
 from django.test import TestCase, SimpleTestCase, override_settings
 from django.utils import version
 from django.core.management import CommandError
 
-from cloudinary_storage.management.commands.deleteorphanedmedia import Command as DeleteOrphanedMediaCommand
+from cloudinary_storage.management.commands.deleteorphanedmedia import Command as DeleteOrphanedMediaCommand, parse_age
 from cloudinary_storage.management.commands.deleteredundantstatic import Command as DeleteRedundantStaticCommand
 from cloudinary_storage.storage import (MediaCloudinaryStorage, RawMediaCloudinaryStorage, StaticCloudinaryStorage,
                                         StaticHashedCloudinaryStorage, RESOURCE_TYPES, storages_per_type)
 from cloudinary_storage import app_settings
+from cloudinary_storage.hashing import FileHashCache
+from cloudinary_storage.journal import UploadJournal
+from cloudinary_storage.plan import UploadPlan
 from tests.models import TestModel, TestImageModel, TestModelWithoutFile
 from tests.tests.test_helpers import (get_random_name, set_media_tag, execute_command, StaticHashedStorageTestsMixin,
                                       get_save_calls_counter_in_postprocess_of_adjustable_file,
@@ -117,6 +125,222 @@ class DeleteOrphanedMediaCommandExecutionTests(BaseOrphanedMediaCommandTestsMixi
             self.assertIn('There is no file to delete.', output)
 
 
+class DeleteOrphanedMediaCommandStreamingTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            TestModel.objects.create(name='with file', file='tests/file-{}.txt'.format(i))
+        TestImageModel.objects.create(name='with image', image='tests/image')
+        self.uploaded_resources = {
+            RESOURCE_TYPES['RAW']: ['tests/file-{}.txt'.format(i) for i in range(8)] + [
+                storages_per_type[RESOURCE_TYPES['RAW']]._prepend_prefix('excluded/file.txt')],
+            RESOURCE_TYPES['IMAGE']: ['tests/image', 'tests/other-image'],
+            RESOURCE_TYPES['VIDEO']: [],
+        }
+
+    def iter_resources(self, resource_type, tag, created_after=None, created_before=None):
+        return iter(self.uploaded_resources[resource_type])
+
+    def test_files_to_remove_with_runs_spilled_to_disk(self):
+        command = DeleteOrphanedMediaCommand()
+        command.SORT_RUN_SIZE = 2
+        with mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.iter_resources',
+                        side_effect=self.iter_resources):
+            with mock.patch.object(app_settings, 'EXCLUDE_DELETE_ORPHANED_MEDIA_PATHS', ('excluded/',)):
+                files_to_remove = command.get_files_to_remove()
+        expected = {
+            RESOURCE_TYPES['RAW']: {'tests/file-5.txt', 'tests/file-6.txt', 'tests/file-7.txt'},
+            RESOURCE_TYPES['IMAGE']: {'tests/other-image'},
+            RESOURCE_TYPES['VIDEO']: set()
+        }
+        self.assertEqual(files_to_remove, expected)
+
+    def test_files_to_remove_with_resource_types_listed_concurrently(self):
+        command = DeleteOrphanedMediaCommand()
+        command.workers = 3
+        with mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.iter_resources',
+                        side_effect=self.iter_resources):
+            files_to_remove = command.get_files_to_remove()
+        self.assertEqual(files_to_remove[RESOURCE_TYPES['IMAGE']], {'tests/other-image'})
+        self.assertEqual(len(files_to_remove[RESOURCE_TYPES['RAW']]), 4)
+
+    def test_needful_files_are_fetched_in_chunks(self):
+        command = DeleteOrphanedMediaCommand()
+        command.DB_CHUNK_SIZE = 2
+        expected = {'tests/file-{}.txt'.format(i) for i in range(5)} | {'tests/image'}
+        self.assertEqual(command.get_needful_files(), expected)
+
+
+@mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.delete_resources',
+            side_effect=lambda resource_type, files: files)
+class DeleteOrphanedMediaCommandBatchDeletionTests(SimpleTestCase):
+    FILES = {
+        RESOURCE_TYPES['RAW']: {'media/a.txt', 'media/b.txt', 'media/c.txt'},
+        RESOURCE_TYPES['IMAGE']: {'media/d'},
+    }
+
+    def test_files_are_deleted_in_batches(self, delete_resources_mock):
+        command = DeleteOrphanedMediaCommand(stdout=StringIO())
+        command.batch_size = 2
+        command.workers = 2
+        command.delete_orphaned_files(self.FILES)
+        calls = sorted(call[0] for call in delete_resources_mock.call_args_list)
+        expected_calls = [
+            (RESOURCE_TYPES['IMAGE'], ['media/d']),
+            (RESOURCE_TYPES['RAW'], ['media/a.txt', 'media/b.txt']),
+            (RESOURCE_TYPES['RAW'], ['media/c.txt']),
+        ]
+        self.assertEqual(calls, expected_calls)
+        output = command.stdout.getvalue()
+        for file in ('media/a.txt', 'media/b.txt', 'media/c.txt', 'media/d'):
+            self.assertIn('Deleted {}.'.format(file), output)
+
+    def test_failed_batches_raise_error(self, delete_resources_mock):
+        delete_resources_mock.side_effect = IOError('Deletion failed')
+        command = DeleteOrphanedMediaCommand(stdout=StringIO())
+        with self.assertRaises(CommandError):
+            command.delete_orphaned_files(self.FILES)
+
+    def test_command_raises_error_with_too_big_batch_size(self, delete_resources_mock):
+        with self.assertRaises(CommandError):
+            execute_command('deleteorphanedmedia', '--noinput', '--batch-size', '101')
+
+    def test_command_raises_error_with_workers_lower_than_one(self, delete_resources_mock):
+        with self.assertRaises(CommandError):
+            execute_command('deleteorphanedmedia', '--noinput', '--workers', '0')
+
+
+PAGES = {
+    None: (['media/a', 'media/needful', 'media/b'], 'cursor-1'),
+    'cursor-1': (['media/c', 'media/d'], None),
+}
+
+
+@mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.delete_resources',
+            side_effect=lambda resource_type, files: files)
+@mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.get_resources_page',
+            side_effect=lambda resource_type, tag, next_cursor, *window: PAGES[next_cursor])
+@mock.patch.object(DeleteOrphanedMediaCommand, 'get_resource_types', return_value={RESOURCE_TYPES['RAW']})
+@mock.patch.object(DeleteOrphanedMediaCommand, 'iter_needful_files', side_effect=lambda: iter(['media/needful']))
+class DeleteOrphanedMediaCommandCheckpointTests(SimpleTestCase):
+    def setUp(self):
+        self.state_file = os.path.join(tempfile.gettempdir(), get_random_name())
+
+    def tearDown(self):
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    def execute_command(self, *args):
+        return execute_command('deleteorphanedmedia', '--noinput', '--state-file', self.state_file, *args)
+
+    def get_deleted_files(self, delete_resources_mock):
+        return [file for call in delete_resources_mock.call_args_list for file in call[0][1]]
+
+    def test_command_stops_after_max_deletes_and_saves_state(self, needful_mock, types_mock, page_mock,
+                                                             delete_resources_mock):
+        output = self.execute_command('--max-deletes', '1')
+        self.assertIn('run the command with --resume', output)
+        self.assertEqual(self.get_deleted_files(delete_resources_mock), ['media/a'])
+        with open(self.state_file) as f:
+            state = json.load(f)
+        self.assertEqual(state['deleted'], 1)
+        self.assertEqual(state['processed'], 0)
+        self.assertIsNone(state['next_cursor'])
+
+    def test_resume_continues_from_saved_cursor(self, needful_mock, types_mock, page_mock, delete_resources_mock):
+        self.execute_command('--max-deletes', '2')
+        with open(self.state_file) as f:
+            self.assertEqual(json.load(f)['next_cursor'], 'cursor-1')
+        output = self.execute_command('--resume')
+        self.assertIn('Resuming after 3 checked and 2 deleted files.', output)
+        self.assertIn('2 files have been deleted successfully.', output)
+        self.assertEqual(self.get_deleted_files(delete_resources_mock), ['media/a', 'media/b', 'media/c', 'media/d'])
+        self.assertEqual(page_mock.call_args_list[-1][0][2], 'cursor-1')
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_command_stops_when_time_budget_is_exceeded(self, needful_mock, types_mock, page_mock,
+                                                        delete_resources_mock):
+        with mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.time.time',
+                        side_effect=[0, 0, 10]):
+            output = self.execute_command('--time-budget', '5')
+        self.assertIn('Stopped after 2 deleted files', output)
+        self.assertEqual(page_mock.call_count, 1)
+        self.assertTrue(os.path.exists(self.state_file))
+
+    def test_state_of_different_tag_is_ignored(self, needful_mock, types_mock, page_mock, delete_resources_mock):
+        with open(self.state_file, 'w') as f:
+            json.dump({'version': 1, 'tag': 'other-tag', 'completed_resource_types': [RESOURCE_TYPES['RAW']],
+                       'resource_type': None, 'next_cursor': None, 'processed': 0, 'deleted': 0}, f)
+        output = self.execute_command('--resume')
+        self.assertIn('4 files have been deleted successfully.', output)
+
+    def test_command_raises_error_with_invalid_max_deletes(self, needful_mock, types_mock, page_mock,
+                                                           delete_resources_mock):
+        with self.assertRaises(CommandError):
+            self.execute_command('--max-deletes', '0')
+
+
+@mock.patch('cloudinary_storage.management.commands.deleteorphanedmedia.delete_resources',
+            side_effect=lambda resource_type, files: files)
+@mock.patch.object(DeleteOrphanedMediaCommand, 'get_resource_types', return_value={RESOURCE_TYPES['RAW']})
+@mock.patch.object(DeleteOrphanedMediaCommand, 'iter_needful_files', side_effect=lambda: iter(['media/needful']))
+class DeleteOrphanedMediaCommandAgeWindowTests(SimpleTestCase):
+    def execute_search(self, *pages):
+        search_mock = mock.MagicMock()
+        search_mock.expression.return_value = search_mock
+        search_mock.max_results.return_value = search_mock
+        search_mock.next_cursor.return_value = search_mock
+        search_mock.execute.side_effect = [{'resources': [{'public_id': public_id} for public_id in page]}
+                                           for page in pages]
+        return search_mock
+
+    def test_files_are_searched_by_creation_date(self, needful_mock, types_mock, delete_resources_mock):
+        search_mock = self.execute_search(['media/a', 'media/needful'])
+        with mock.patch('cloudinary_storage.helpers.cloudinary.Search', return_value=search_mock):
+            output = execute_command('deleteorphanedmedia', '--noinput', '--older-than', '1h', '--newer-than', '1d')
+        self.assertIn('1 files have been deleted successfully.', output)
+        delete_resources_mock.assert_called_once_with(RESOURCE_TYPES['RAW'], ['media/a'])
+        expression = search_mock.expression.call_args[0][0]
+        self.assertRegex(expression, r'^resource_type:raw AND tags="{}" AND created_at>="\d{{4}}-\d\d-\d\dT'
+                                     r'[\d:]+Z" AND created_at<"[\dT:-]+Z"$'.format(DeleteOrphanedMediaCommand.TAG))
+
+    def test_admin_api_is_used_without_window(self, needful_mock, types_mock, delete_resources_mock):
+        with mock.patch('cloudinary_storage.helpers.cloudinary.api.resources_by_tag',
+                        return_value={'resources': [{'public_id': 'media/a'}]}) as resources_by_tag_mock:
+            with mock.patch('cloudinary_storage.helpers.cloudinary.Search') as search_mock:
+                execute_command('deleteorphanedmedia', '--noinput')
+        self.assertTrue(resources_by_tag_mock.called)
+        self.assertFalse(search_mock.called)
+
+    def test_window_is_saved_with_checkpoint(self, needful_mock, types_mock, delete_resources_mock):
+        state_file = os.path.join(tempfile.gettempdir(), get_random_name())
+        search_mock = self.execute_search(['media/a', 'media/b'])
+        try:
+            with mock.patch('cloudinary_storage.helpers.cloudinary.Search', return_value=search_mock):
+                execute_command('deleteorphanedmedia', '--noinput', '--state-file', state_file,
+                                '--newer-than', '2d', '--max-deletes', '1')
+            with open(state_file) as f:
+                state = json.load(f)
+        finally:
+            os.remove(state_file)
+        self.assertIsNone(state['created_before'])
+        self.assertIn('created_at>="{}"'.format(state['created_after']), search_mock.expression.call_args[0][0])
+
+    def test_command_raises_error_with_invalid_window(self, needful_mock, types_mock, delete_resources_mock):
+        with self.assertRaises(CommandError):
+            execute_command('deleteorphanedmedia', '--noinput', '--older-than', '2d', '--newer-than', '1d')
+        with self.assertRaises(CommandError):
+            execute_command('deleteorphanedmedia', '--noinput', '--older-than', 'yesterday')
+
+
+class ParseAgeTests(SimpleTestCase):
+    def test_ages(self):
+        self.assertEqual(parse_age('90'), timedelta(seconds=90))
+        self.assertEqual(parse_age('30m'), timedelta(minutes=30))
+        self.assertEqual(parse_age('12h'), timedelta(hours=12))
+        self.assertEqual(parse_age('1d'), timedelta(days=1))
+        self.assertEqual(parse_age('2w'), timedelta(weeks=2))
+
+
 class DeleteOrphanedMediaCommandPromptTests(TestCase):
     def test_command_execution_with_prompt_as_yes(self):
         with mock.patch.object(DeleteOrphanedMediaCommand,
@@ -181,6 +405,270 @@ class CollectStaticCommandWithHashedStorageTests(SimpleTestCase):
         self.assertIn('2 static files copied, {} post-processed.'.format(post_process_counter), output)
 
 
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+class CollectStaticCommandWithWorkersTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def setUp(self):
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def test_command_uploads_files_and_saves_manifest(self, upload_mock, exists_mock):
+        output = execute_command('collectstatic', '--noinput', '--workers', '2')
+        self.assertEqual(upload_mock.call_count, 1 * get_save_calls_counter_in_postprocess_of_adjustable_file() + 1)
+        post_process_counter = 1 + 1 * get_postprocess_counter_of_adjustable_file()
+        self.assertIn('0 static files copied, {} post-processed.'.format(post_process_counter), output)
+        self.assertTrue(os.path.exists(self.manifest_path))
+
+    def test_failed_upload_raises_error_and_manifest_is_not_saved(self, upload_mock, exists_mock):
+        upload_mock.side_effect = IOError('Upload failed')
+        with self.assertRaises(IOError):
+            execute_command('collectstatic', '--noinput', '--workers', '2')
+        self.assertFalse(os.path.exists(self.manifest_path))
+
+    def test_command_raises_error_with_workers_lower_than_one(self, upload_mock, exists_mock):
+        with self.assertRaises(CommandError):
+            execute_command('collectstatic', '--noinput', '--workers', '0')
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticCloudinaryStorage')
+@mock.patch.object(StaticCloudinaryStorage, '_exists_with_etag', return_value=False)
+class CollectStaticCommandWithWorkersAndUnhashedStorageTests(SimpleTestCase):
+    @mock.patch.object(StaticCloudinaryStorage, '_upload')
+    def test_command_uploads_files(self, upload_mock, exists_mock):
+        output = execute_command('collectstatic', '--noinput', '--workers', '2')
+        self.assertEqual(upload_mock.call_count, 2)
+        self.assertIn('2 static files copied.', output)
+
+    @mock.patch.object(StaticCloudinaryStorage, '_upload', side_effect=IOError('Upload failed'))
+    def test_failed_upload_raises_error(self, upload_mock, exists_mock):
+        with self.assertRaises(CommandError):
+            execute_command('collectstatic', '--noinput', '--workers', '2')
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+class CollectStaticCommandIncrementalTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(CollectStaticCommandIncrementalTests, cls).setUpClass()
+        with mock.patch.object(StaticHashedCloudinaryStorage, '_upload'):
+            with mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False):
+                execute_command('collectstatic', '--noinput')
+
+    def test_files_from_previous_manifest_are_neither_checked_nor_uploaded(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput', '--incremental')
+        self.assertFalse(exists_mock.called)
+        self.assertFalse(upload_mock.called)
+
+    def test_files_missing_in_previous_manifest_are_uploaded_without_checks(self, exists_mock, upload_mock):
+        previous_manifest = {'tests/css/style.css': 'static/tests/css/style.{}.css'.format(self.style_hash)}
+        with mock.patch.object(StaticHashedCloudinaryStorage, 'load_manifest', return_value=previous_manifest):
+            execute_command('collectstatic', '--noinput', '--incremental')
+        self.assertFalse(exists_mock.called)
+        self.assertEqual(upload_mock.call_count, 1)
+        self.assertEqual(upload_mock.call_args[0][0],
+                         'static/tests/images/dummy-static-image.{}.jpg'.format(self.image_hash))
+
+    def test_files_missing_in_previous_manifest_are_uploaded_by_workers_without_checks(self, exists_mock,
+                                                                                          upload_mock):
+        previous_manifest = {'tests/css/style.css': 'static/tests/css/style.{}.css'.format(self.style_hash)}
+        with mock.patch.object(StaticHashedCloudinaryStorage, 'load_manifest', return_value=previous_manifest):
+            execute_command('collectstatic', '--noinput', '--incremental', '--workers', '4')
+        self.assertFalse(exists_mock.called)
+        self.assertEqual(upload_mock.call_count, 1)
+
+    def test_files_are_checked_without_incremental_param(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput')
+        self.assertTrue(exists_mock.called)
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, 'fetch_remote_etags', return_value={})
+class CollectStaticCommandWithPrefetchedEtagsTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_files_are_uploaded_without_head_requests(self, head_mock, fetch_remote_etags_mock, upload_mock):
+        execute_command('collectstatic', '--noinput', '--prefetch-etags')
+        fetch_remote_etags_mock.assert_called_once_with()
+        self.assertFalse(head_mock.called)
+        self.assertEqual(upload_mock.call_count, 1 * get_save_calls_counter_in_postprocess_of_adjustable_file() + 1)
+
+    def test_remote_etags_are_reset_after_command(self, fetch_remote_etags_mock, upload_mock):
+        execute_command('collectstatic', '--noinput', '--prefetch-etags')
+        self.assertIsNone(staticfiles_storage.remote_etags)
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+class CollectStaticCommandWithHashingProcessesTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def test_manifest_is_the_same_as_with_sequential_hashing(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput')
+        with open(self.manifest_path) as f:
+            manifest = f.read()
+        with mock.patch('cloudinary_storage.hashing.FileHashCache.prefetch',
+                        autospec=True, side_effect=FileHashCache.prefetch) as prefetch_mock:
+            execute_command('collectstatic', '--noinput', '--hashing-processes', '2')
+        self.assertEqual(prefetch_mock.call_args[0][2], 2)
+        with open(self.manifest_path) as f:
+            self.assertEqual(f.read(), manifest)
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+class CollectStaticCommandWithHashCacheRootTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def setUp(self):
+        self.hash_cache_root = os.path.join(app_settings.STATICFILES_MANIFEST_ROOT, get_random_name())
+        self.hash_cache_path = os.path.join(self.hash_cache_root, 'staticfiles-hashes.json')
+        patcher = mock.patch.object(app_settings, 'STATICFILES_HASH_CACHE_ROOT', self.hash_cache_root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if os.path.exists(self.hash_cache_path):
+            os.remove(self.hash_cache_path)
+            os.rmdir(self.hash_cache_root)
+
+    def test_unchanged_files_are_not_hashed_again(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput')
+        self.assertTrue(os.path.exists(self.hash_cache_path))
+        with mock.patch('cloudinary_storage.hashing.get_file_hash', return_value='hash') as get_file_hash_mock:
+            execute_command('collectstatic', '--noinput')
+        for call in get_file_hash_mock.call_args_list:
+            self.assertIsInstance(call[0][0], ContentFile)  # only processed css content is hashed
+        with open(self.manifest_path) as f:
+            self.assertIn(self.image_hash, f.read())
+
+    def test_hash_cache_is_not_saved_with_dry_run(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput', '--dry-run')
+        self.assertFalse(os.path.exists(self.hash_cache_path))
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+@mock.patch.object(app_settings, 'STATICFILES_UPLOAD_JOURNAL', True)
+class CollectStaticCommandWithUploadJournalTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def setUp(self):
+        self.journal = UploadJournal(self.manifest_path + '.journal')
+        self.image_name = 'static/tests/images/dummy-static-image.{}'.format(self.image_hash)
+
+    def tearDown(self):
+        self.journal.clear()
+
+    def test_journaled_files_are_not_checked_and_journal_is_cleared_after_run(self, exists_mock, upload_mock):
+        self.journal.record(self.image_name + '.jpg', RESOURCE_TYPES['IMAGE'], self.image_hash)
+        self.journal.close()
+        execute_command('collectstatic', '--noinput')
+        for call in exists_mock.call_args_list:
+            self.assertIn('style', call[0][0])
+        self.assertFalse(os.path.exists(self.journal.path))
+
+    def test_journal_keeps_uploaded_files_when_run_fails(self, exists_mock, upload_mock):
+        def upload(name, content):
+            if 'style' in name:
+                raise IOError('Upload failed')
+            return {'public_id': name}
+
+        upload_mock.side_effect = upload
+        with self.assertRaises(IOError):
+            execute_command('collectstatic', '--noinput')
+        self.assertEqual(list(self.journal.read()), [self.image_name + '.jpg'])
+
+    def test_journal_is_not_used_by_default(self, exists_mock, upload_mock):
+        self.journal.record(self.image_name + '.jpg', RESOURCE_TYPES['IMAGE'], self.image_hash)
+        self.journal.close()
+        default = app_settings.DEFAULTS['STATICFILES_UPLOAD_JOURNAL']
+        with mock.patch.object(app_settings, 'STATICFILES_UPLOAD_JOURNAL', default):
+            execute_command('collectstatic', '--noinput')
+        self.assertEqual(exists_mock.call_count, 1 + 1 * get_save_calls_counter_in_postprocess_of_adjustable_file())
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_upload')
+@mock.patch.object(StaticHashedCloudinaryStorage, '_exists_with_etag', return_value=False)
+class CollectStaticCommandWithPlanTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def setUp(self):
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        self.plan_path = os.path.join(app_settings.STATICFILES_MANIFEST_ROOT, get_random_name())
+
+    def tearDown(self):
+        if os.path.exists(self.plan_path):
+            os.remove(self.plan_path)
+
+    def test_plan_doesnt_upload_anything(self, exists_mock, upload_mock):
+        output = execute_command('collectstatic', '--noinput', '--plan-output', self.plan_path)
+        self.assertIn('Upload plan: 2 files to upload', output)
+        self.assertFalse(exists_mock.called)
+        self.assertFalse(upload_mock.called)
+        self.assertFalse(os.path.exists(self.manifest_path))
+        plan = UploadPlan.load(self.plan_path)
+        self.assertIn('static/tests/images/dummy-static-image.{}.jpg'.format(self.image_hash), plan.uploads)
+        self.assertEqual(plan.skipped, {})
+
+    def test_files_from_previous_manifest_are_not_planned(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput')
+        output = execute_command('collectstatic', '--noinput', '--plan')
+        self.assertIn('Upload plan: 0 files to upload, 0 bytes, 0 upload calls, 2 files already uploaded.', output)
+
+    def test_plan_is_executed_without_remote_checks(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput', '--plan-output', self.plan_path)
+        execute_command('collectstatic', '--noinput', '--execute-plan', self.plan_path)
+        self.assertFalse(exists_mock.called)
+        self.assertEqual(upload_mock.call_count, 1 + 1 * get_save_calls_counter_in_postprocess_of_adjustable_file())
+        self.assertTrue(os.path.exists(self.manifest_path))
+
+    def test_skipped_files_are_not_uploaded_when_plan_is_executed(self, exists_mock, upload_mock):
+        execute_command('collectstatic', '--noinput')
+        os.remove(self.manifest_path)
+        with mock.patch.object(StaticHashedCloudinaryStorage, 'load_manifest', return_value={
+                'tests/images/dummy-static-image.jpg':
+                    'static/tests/images/dummy-static-image.{}.jpg'.format(self.image_hash)}):
+            execute_command('collectstatic', '--noinput', '--plan-output', self.plan_path)
+        upload_mock.reset_mock()
+        execute_command('collectstatic', '--noinput', '--execute-plan', self.plan_path)
+        for call in upload_mock.call_args_list:
+            self.assertIn('style', call[0][0])
+
+    @override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticCloudinaryStorage')
+    @mock.patch.object(StaticCloudinaryStorage, '_upload')
+    @mock.patch.object(StaticCloudinaryStorage, '_exists_with_etag', return_value=True)
+    def test_skipped_unhashed_file_changed_since_plan_is_checked(self, unhashed_exists_mock, unhashed_upload_mock,
+                                                                 exists_mock, upload_mock):
+        with mock.patch.object(StaticCloudinaryStorage, '_matches_remote_etag', return_value=True):
+            execute_command('collectstatic', '--noinput', '--plan-output', self.plan_path)
+        execute_command('collectstatic', '--noinput', '--execute-plan', self.plan_path)
+        self.assertFalse(unhashed_exists_mock.called)
+        plan = UploadPlan.load(self.plan_path)
+        changed_name = sorted(plan.skipped)[0]
+        plan.skipped[changed_name] = 'outdated'
+        plan.save(self.plan_path)
+        execute_command('collectstatic', '--noinput', '--execute-plan', self.plan_path)
+        self.assertEqual(unhashed_exists_mock.call_count, 1)
+        self.assertEqual(unhashed_exists_mock.call_args[0][0], changed_name[len('static/'):])
+
+    def test_invalid_plan_raises_error(self, exists_mock, upload_mock):
+        with open(self.plan_path, 'w') as f:
+            f.write('not a plan')
+        with self.assertRaises(CommandError):
+            execute_command('collectstatic', '--noinput', '--execute-plan', self.plan_path)
+
+    def test_plan_with_dry_run_raises_error(self, exists_mock, upload_mock):
+        with self.assertRaises(CommandError):
+            execute_command('collectstatic', '--noinput', '--plan', '--dry-run')
+
+
+@override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticCloudinaryStorage')
+class CollectStaticCommandIncrementalWithUnhashedStorageTests(SimpleTestCase):
+    def test_command_raises_error(self):
+        with self.assertRaises(CommandError):
+            execute_command('collectstatic', '--noinput', '--incremental')
+
+
 class CollectStaticCommandWithHashedStorageWithoutMockTests(SimpleTestCase):
     def test_command_saves_manifest_file(self):
         name = get_random_name()
@@ -194,6 +682,37 @@ class CollectStaticCommandWithHashedStorageWithoutMockTests(SimpleTestCase):
             StaticHashedCloudinaryStorage.manifest_name = 'staticfiles.json'
 
 
+@mock.patch.object(app_settings, 'STATICFILES_MANIFEST_GENERATIONS', 2)
+class DeleteRedundantStaticCommandWithManifestGenerationsTests(StaticHashedStorageTestsMixin, SimpleTestCase):
+    def setUp(self):
+        for path, hashes in ((self.manifest_path, ('abc', 'def')), (self.manifest_path + '.1', ('ghi', 'def'))):
+            with open(path, 'w') as f:
+                json.dump({'paths': {
+                    'tests/css/style.css': 'static/tests/css/style.{}.css'.format(hashes[0]),
+                    'tests/images/dummy-static-image.jpg': 'static/tests/images/dummy-static-image.{}.jpg'.format(
+                        hashes[1]),
+                }, 'version': '1.0'}, f)
+
+    def tearDown(self):
+        os.remove(self.manifest_path + '.1')
+
+    def test_get_needful_files_includes_files_of_older_manifest_generations(self):
+        command = DeleteRedundantStaticCommand()
+        command.keep_unhashed_files = False
+        expected_response = {
+            'static/tests/css/style.abc.css',
+            'static/tests/css/style.ghi.css',
+            'static/tests/images/dummy-static-image.def',  # removed jpg extension
+        }
+        self.assertEqual(command.get_needful_files(), expected_response)
+
+    def test_get_needful_files_with_keep_unhashed_files_true(self):
+        command = DeleteRedundantStaticCommand()
+        command.keep_unhashed_files = True
+        self.assertIn('static/tests/css/style.css', command.get_needful_files())
+        self.assertIn('static/tests/css/style.ghi.css', command.get_needful_files())
+
+
 @override_settings(STATICFILES_STORAGE='cloudinary_storage.storage.StaticHashedCloudinaryStorage')
 class DeleteRedundantStaticCommandTests(StaticHashedStorageTestsMixin, SimpleTestCase):
     @classmethod
@@ -258,7 +777,7 @@ class DeleteRedundantStaticCommandTests(StaticHashedStorageTestsMixin, SimpleTes
         ]
         needful_files = {'style.css'}
         with mock.patch.object(command, 'get_uploaded_resources', return_value=uploaded_resources):
-            with mock.patch.object(command, 'get_needful_files', return_value=needful_files):
+            with mock.patch.object(command, 'iter_needful_files', return_value=needful_files):
                 files_to_remove = command.get_files_to_remove()
         expected_response = {
             RESOURCE_TYPES['RAW']: set(),
@@ -276,7 +795,7 @@ class DeleteRedundantStaticCommandTests(StaticHashedStorageTestsMixin, SimpleTes
         ]
         needful_files = {'style.css'}
         with mock.patch.object(command, 'get_uploaded_resources', return_value=uploaded_resources):
-            with mock.patch.object(command, 'get_needful_files', return_value=needful_files):
+            with mock.patch.object(command, 'iter_needful_files', return_value=needful_files):
                 files_to_remove = command.get_files_to_remove()
         expected_response = {
             RESOURCE_TYPES['RAW']: {'style1.css'},
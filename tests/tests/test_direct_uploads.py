@@ -0,0 +1,160 @@
+import json
+import time
+
+import cloudinary
+import cloudinary.api
+import cloudinary.utils
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, RequestFactory
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.forms import DirectUploadField
+from cloudinary_storage.storage import MediaCloudinaryStorage, RawMediaCloudinaryStorage
+from cloudinary_storage.views import DirectUploadView
+from tests.tests.test_accounts import ACCOUNTS
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+
+def get_upload(public_id='media/tests/file_abc.txt', cloud_name=None, api_secret=None, version=None, **kwargs):
+    config = cloudinary.config()
+    version = int(time.time()) if version is None else version
+    upload = {
+        'cloud_name': cloud_name or config.cloud_name,
+        'public_id': public_id,
+        'version': version,
+        'signature': cloudinary.utils.api_sign_request({'public_id': public_id, 'version': version},
+                                                       api_secret or config.api_secret),
+    }
+    upload.update(kwargs)
+    return upload
+
+
+def get_resource(public_id, resource_type='raw', **options):
+    if resource_type != 'raw':
+        raise cloudinary.api.NotFound('Resource not found')
+    return {'public_id': public_id, 'version': get_resource.version, 'tags': get_resource.tags}
+
+
+def mock_resource(version=None, tags=None):
+    """
+    Mocks Admin API returning the uploaded raw file with the version and tags, the current time and tag of raw files
+    of the storage as the default.
+    """
+    get_resource.version = int(time.time()) if version is None else version
+    get_resource.tags = [RawMediaCloudinaryStorage().TAG] if tags is None else tags
+    return mock.patch('cloudinary_storage.storage.cloudinary.api.resource', side_effect=get_resource)
+
+
+class DirectUploadStorageTests(SimpleTestCase):
+    def test_params_are_signed_with_storage_folder_and_tag(self):
+        upload = RawMediaCloudinaryStorage().get_direct_upload_params('tests/file.txt')
+        config = cloudinary.config()
+        self.assertEqual(upload['url'], 'https://api.cloudinary.com/v1_1/{}/raw/upload'.format(config.cloud_name))
+        params = upload['params']
+        self.assertEqual(params['folder'], 'media/tests')
+        self.assertEqual(params['tags'], RawMediaCloudinaryStorage().TAG)
+        self.assertEqual(params['api_key'], config.api_key)
+        signed_params = {key: value for key, value in params.items() if key not in ('signature', 'api_key')}
+        self.assertEqual(params['signature'], cloudinary.utils.api_sign_request(signed_params, config.api_secret))
+
+    @mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+    @mock.patch('cloudinary_storage.storage.route_name', side_effect=lambda name, accounts: accounts[1])
+    def test_params_are_signed_for_routed_account(self, route_mock):
+        upload = RawMediaCloudinaryStorage().get_direct_upload_params('tests/file.txt')
+        self.assertEqual(upload['cloud_name'], 'shard-2')
+        self.assertEqual(upload['params']['api_key'], 'key-2')
+
+    def test_verified_upload_returns_public_id(self):
+        with mock_resource() as resource_mock:
+            name = RawMediaCloudinaryStorage().verify_direct_upload(get_upload())
+        self.assertEqual(name, 'media/tests/file_abc.txt')
+        resource_mock.assert_called_once_with('media/tests/file_abc.txt', resource_type='raw')
+
+    @mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+    def test_verified_upload_of_other_account_returns_name_with_account(self):
+        upload = get_upload(cloud_name='shard-1', api_secret='secret-1')
+        with mock_resource() as resource_mock:
+            name = RawMediaCloudinaryStorage().verify_direct_upload(upload)
+        self.assertEqual(name, 'shard-1:media/tests/file_abc.txt')
+        self.assertEqual(resource_mock.call_args[1]['cloud_name'], 'shard-1')
+
+    def test_invalid_uploads_are_rejected(self):
+        storage = RawMediaCloudinaryStorage()
+        upload = get_upload()
+        del upload['version']
+        invalid_uploads = [
+            get_upload(signature='invalid'),
+            get_upload(api_secret='other-secret'),
+            get_upload(cloud_name='unknown-cloud'),
+            get_upload(public_id='other/file.txt'),
+            get_upload(version=int(time.time()) - app_settings.DIRECT_UPLOAD_MAX_AGE - 60),
+            get_upload(version='yesterday'),
+            upload,
+            [],
+        ]
+        with mock_resource():
+            for upload in invalid_uploads:
+                with self.assertRaises(ValueError):
+                    storage.verify_direct_upload(upload)
+
+    def test_uploads_not_matching_resource_are_rejected(self):
+        storage = RawMediaCloudinaryStorage()
+        version = int(time.time())
+        for resource in (mock_resource(version=version - 60), mock_resource(version=version, tags=['other-tag'])):
+            with resource, self.assertRaises(ValueError):
+                storage.verify_direct_upload(get_upload(version=version))
+
+    def test_upload_of_other_resource_type_is_rejected(self):
+        with mock_resource() as resource_mock, self.assertRaises(ValueError):
+            MediaCloudinaryStorage().verify_direct_upload(get_upload())
+        self.assertEqual(resource_mock.call_args[1]['resource_type'], 'image')
+
+
+class DirectUploadFieldTests(SimpleTestCase):
+    def get_field(self, **kwargs):
+        return DirectUploadField('/upload/', storage=RawMediaCloudinaryStorage(), **kwargs)
+
+    def test_widget_renders_upload_url_and_script(self):
+        field = self.get_field()
+        html = field.widget.render('file', None)
+        self.assertIn('type="hidden"', html)
+        self.assertIn('data-cloudinary-upload-url="/upload/"', html)
+        self.assertIn('<script>', html)
+
+    def test_verified_upload_is_cleaned_to_name(self):
+        with mock_resource():
+            self.assertEqual(self.get_field().clean(json.dumps(get_upload())), 'media/tests/file_abc.txt')
+
+    def test_invalid_upload_raises_validation_error(self):
+        field = self.get_field()
+        for value in ('not json', json.dumps({}), json.dumps(get_upload(signature='invalid'))):
+            with self.assertRaisesMessage(Exception, 'The file could not be verified'):
+                field.clean(value)
+
+    def test_initial_name_is_kept(self):
+        self.assertEqual(self.get_field().clean('media/tests/old.txt', 'media/tests/old.txt'), 'media/tests/old.txt')
+
+    def test_other_name_than_initial_is_rejected(self):
+        with self.assertRaisesMessage(Exception, 'The file could not be verified'):
+            self.get_field().clean('media/tests/other.txt', 'media/tests/old.txt')
+
+
+class DirectUploadViewTests(SimpleTestCase):
+    def get_response(self, name, user=None):
+        request = RequestFactory().get('/upload/', {'name': name})
+        request.user = user or mock.Mock(is_authenticated=True)
+        view = DirectUploadView.as_view(storage=RawMediaCloudinaryStorage(), upload_to='uploads/')
+        return view(request)
+
+    def test_params_are_returned_for_file_name_in_upload_to_folder(self):
+        response = self.get_response('C:\\Users\\me\\file.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['params']['folder'], 'media/uploads')
+
+    def test_anonymous_user_is_forbidden(self):
+        self.assertEqual(self.get_response('file.txt', AnonymousUser()).status_code, 403)
+
+    def test_missing_name_is_bad_request(self):
+        self.assertEqual(self.get_response('').status_code, 400)
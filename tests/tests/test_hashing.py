@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import HashedFilesMixin
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from cloudinary_storage.hashing import FileHashCache, get_disk_file_key, get_file_hash
+from cloudinary_storage.storage import StaticHashedCloudinaryStorage
+from tests.tests.test_helpers import get_random_name, import_mock
+
+mock = import_mock()
+
+STYLE_PATH = os.path.abspath(os.path.join('tests', 'static', 'tests', 'css', 'style.css'))
+
+
+class GetFileHashTests(SimpleTestCase):
+    def test_hash_is_the_same_as_hashed_files_mixin_one(self):
+        with open(STYLE_PATH, 'rb') as f:
+            content = File(f)
+            self.assertEqual(get_file_hash(content), HashedFilesMixin().file_hash('style.css', content))
+
+    def test_disk_file_key(self):
+        with open(STYLE_PATH, 'rb') as f:
+            key = get_disk_file_key(File(f))
+        self.assertEqual(key[:2], (STYLE_PATH, os.path.getsize(STYLE_PATH)))
+
+    def test_disk_file_key_of_content_file_is_none(self):
+        self.assertIsNone(get_disk_file_key(ContentFile(b'content')))
+
+
+@mock.patch('cloudinary_storage.hashing.get_file_hash', wraps=get_file_hash)
+class FileHashCacheTests(SimpleTestCase):
+    def test_disk_file_is_hashed_once(self, get_file_hash_mock):
+        cache = FileHashCache()
+        with open(STYLE_PATH, 'rb') as f:
+            file_hash = cache.get_hash(File(f))
+        self.assertEqual(cache.get_path_hash(STYLE_PATH), file_hash)
+        with open(STYLE_PATH, 'rb') as f:
+            self.assertEqual(cache.get_hash(File(f)), file_hash)
+        self.assertEqual(get_file_hash_mock.call_count, 1)
+
+    def test_content_file_is_hashed_once(self, get_file_hash_mock):
+        cache = FileHashCache()
+        content = ContentFile(b'content')
+        self.assertEqual(cache.get_hash(content), cache.get_hash(content))
+        self.assertEqual(get_file_hash_mock.call_count, 1)
+
+    def test_different_content_files_are_hashed_separately(self, get_file_hash_mock):
+        cache = FileHashCache()
+        self.assertNotEqual(cache.get_hash(ContentFile(b'content')), cache.get_hash(ContentFile(b'other')))
+
+    def test_prefetch_hashes_files_in_processes(self, get_file_hash_mock):
+        image_path = os.path.abspath(os.path.join('tests', 'static', 'tests', 'images', 'dummy-static-image.jpg'))
+        cache = FileHashCache()
+        cache.prefetch([STYLE_PATH, image_path], processes=2)
+        with mock.patch('cloudinary_storage.hashing.open', create=True) as open_mock:
+            style_hash = cache.get_path_hash(STYLE_PATH)
+            image_hash = cache.get_path_hash(image_path)
+        self.assertFalse(open_mock.called)
+        with open(STYLE_PATH, 'rb') as f:
+            self.assertEqual(style_hash, get_file_hash(File(f)))
+        with open(image_path, 'rb') as f:
+            self.assertEqual(image_hash, get_file_hash(File(f)))
+
+    def test_set_hash(self, get_file_hash_mock):
+        cache = FileHashCache()
+        content = ContentFile(b'content')
+        cache.set_hash(content, 'hash')
+        self.assertEqual(cache.get_hash(content), 'hash')
+        self.assertFalse(get_file_hash_mock.called)
+
+
+@mock.patch('cloudinary_storage.hashing.get_file_hash', wraps=get_file_hash)
+class PersistentFileHashCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.gettempdir(), get_random_name(), 'hashes.json')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            os.rmdir(os.path.dirname(self.path))
+
+    def save_style_hash(self):
+        cache = FileHashCache(self.path)
+        file_hash = cache.get_path_hash(STYLE_PATH)
+        cache.save()
+        return file_hash
+
+    def test_saved_hash_is_used_without_opening_file(self, get_file_hash_mock):
+        file_hash = self.save_style_hash()
+        cache = FileHashCache(self.path)
+        cache.load()
+        with mock.patch('cloudinary_storage.hashing.open', create=True) as open_mock:
+            self.assertEqual(cache.get_path_hash(STYLE_PATH), file_hash)
+        self.assertFalse(open_mock.called)
+        self.assertEqual(get_file_hash_mock.call_count, 1)
+
+    def test_hash_of_modified_file_is_not_used(self, get_file_hash_mock):
+        file_hash = self.save_style_hash()
+        with open(self.path) as f:
+            data = json.load(f)
+        data['hashes'][0][2] += 1
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        cache = FileHashCache(self.path)
+        cache.load()
+        self.assertEqual(cache.get_path_hash(STYLE_PATH), file_hash)
+        self.assertEqual(get_file_hash_mock.call_count, 2)
+
+    def test_only_hashes_used_by_last_run_are_saved(self, get_file_hash_mock):
+        self.save_style_hash()
+        cache = FileHashCache(self.path)
+        cache.load()
+        cache.save()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['hashes'], [])
+
+    def test_recently_modified_files_are_not_saved(self, get_file_hash_mock):
+        os.makedirs(os.path.dirname(self.path))
+        file_path = os.path.join(os.path.dirname(self.path), 'file.txt')
+        with open(file_path, 'w') as f:
+            f.write('content')
+        try:
+            cache = FileHashCache(self.path)
+            cache.get_path_hash(file_path)
+            cache.save()
+        finally:
+            os.remove(file_path)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['hashes'], [])
+
+    def test_missing_and_malformed_files_are_ignored(self, get_file_hash_mock):
+        cache = FileHashCache(self.path)
+        cache.load()
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"version": 1, "hash')
+        cache.load()
+        self.assertEqual(cache.stored_hashes, {})
+
+    def test_prefetch_skips_saved_hashes(self, get_file_hash_mock):
+        self.save_style_hash()
+        cache = FileHashCache(self.path)
+        cache.load()
+        with mock.patch('cloudinary_storage.hashing.ProcessPoolExecutor') as executor_mock:
+            cache.prefetch([STYLE_PATH], processes=2)
+        self.assertFalse(executor_mock.called)
+
+
+class StaticHashedCloudinaryStorageHashCacheTests(SimpleTestCase):
+    @mock.patch('cloudinary_storage.hashing.finders.find', return_value=STYLE_PATH)
+    def test_hashed_name_finds_and_hashes_file_once(self, find_mock):
+        storage = StaticHashedCloudinaryStorage()
+        storage.hash_cache = FileHashCache()
+        with mock.patch('cloudinary_storage.hashing.open', wraps=open, create=True) as open_mock:
+            hashed_name = storage.hashed_name('tests/css/style.css')
+            self.assertEqual(storage.hashed_name('tests/css/style.css'), hashed_name)
+        find_mock.assert_called_once_with('tests/css/style.css')
+        self.assertEqual(open_mock.call_count, 1)
+
+    def test_hashed_name_without_hash_cache(self):
+        storage = StaticHashedCloudinaryStorage()
+        with open(STYLE_PATH, 'rb') as f:
+            file_hash = get_file_hash(File(f))
+        self.assertEqual(storage.hashed_name('tests/css/style.css'), 'tests/css/style.{}.css'.format(file_hash))
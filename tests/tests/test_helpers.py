@@ -45,11 +45,12 @@ class StaticHashedStorageTestsMixin(object):
 
     @classmethod
     def tearDownClass(cls):
-        try:
-            os.remove(cls.manifest_path)
-        except (IOError, OSError) as e:
-            if e.errno != errno.ENOENT:
-                raise
+        for path in (cls.manifest_path, cls.manifest_path + '.journal'):
+            try:
+                os.remove(path)
+            except (IOError, OSError) as e:
+                if e.errno != errno.ENOENT:
+                    raise
         super(StaticHashedStorageTestsMixin, cls).tearDownClass()
         StaticHashedCloudinaryStorage.manifest_name = 'staticfiles.json'
 
@@ -0,0 +1,127 @@
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from PIL import Image
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.images import transform_image
+from cloudinary_storage.storage import MediaCloudinaryStorage, RawMediaCloudinaryStorage
+from cloudinary_storage.validators import MaxFileSizeValidator
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+
+def get_image_content(size=(400, 300), image_format='JPEG', name='image.jpg', mode='RGB', **options):
+    output = io.BytesIO()
+    Image.new(mode, size, 'red').save(output, format=image_format, **options)
+    return ContentFile(output.getvalue(), name=name)
+
+
+def open_image(content):
+    content.seek(0)
+    return Image.open(io.BytesIO(content.read()))
+
+
+class TransformImageTests(SimpleTestCase):
+    def test_image_is_downscaled_to_max_dimension(self):
+        content, original_size = transform_image(get_image_content(), 100, 85)
+        self.assertEqual(original_size, (400, 300))
+        image = open_image(content)
+        self.assertEqual((image.format, image.size), ('JPEG', (100, 75)))
+        content.seek(0)
+        self.assertEqual(content.size, len(content.read()))
+        content.close()
+
+    def test_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010f] = 'Phone maker'
+        exif[0x0112] = 6  # rotated by 90 degrees
+        content, original_size = transform_image(get_image_content(exif=exif.tobytes()), 100, 85)
+        image = open_image(content)
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(image.size, (75, 100))
+        content.close()
+
+    def test_png_is_downscaled(self):
+        content, original_size = transform_image(get_image_content(image_format='PNG', name='image.png',
+                                                                   mode='RGBA'), 200, 85)
+        image = open_image(content)
+        self.assertEqual((image.format, image.mode, image.size), ('PNG', 'RGBA', (200, 150)))
+        content.close()
+
+    def test_small_image_which_doesnt_get_smaller_is_not_transformed(self):
+        output = io.BytesIO()
+        Image.frombytes('RGB', (100, 100), os.urandom(100 * 100 * 3)).save(output, format='JPEG', quality=10)
+        self.assertIsNone(transform_image(ContentFile(output.getvalue(), name='image.jpg'), 1000, 95))
+
+    def test_icc_profile_is_dropped_when_mode_changes(self):
+        content, original_size = transform_image(get_image_content(mode='CMYK', icc_profile=b'cmyk profile'), 100, 85)
+        image = open_image(content)
+        self.assertEqual(image.mode, 'RGB')
+        self.assertNotIn('icc_profile', image.info)
+        content.close()
+
+    def test_icc_profile_is_kept_in_the_same_mode(self):
+        content, original_size = transform_image(get_image_content(icc_profile=b'rgb profile'), 100, 85)
+        self.assertEqual(open_image(content).info['icc_profile'], b'rgb profile')
+        content.close()
+
+    @mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100)
+    def test_decompression_bomb_is_not_transformed(self):
+        content = get_image_content()
+        self.assertIsNone(transform_image(content, 100, 85))
+        self.assertEqual(content.tell(), 0)
+
+    def test_unsupported_files_are_not_transformed(self):
+        gif = get_image_content(image_format='GIF', name='image.gif', mode='P')
+        self.assertIsNone(transform_image(gif, 100, 85))
+        text = ContentFile(b'not an image', name='file.txt')
+        self.assertIsNone(transform_image(text, 100, 85))
+        self.assertEqual(text.tell(), 0)
+
+
+def upload(file, **options):
+    upload.content = file.read()
+    return {'public_id': 'media/image'}
+
+
+@mock.patch('cloudinary_storage.storage.cloudinary.uploader.upload', side_effect=upload)
+class MediaCloudinaryStorageImageTransformTests(SimpleTestCase):
+    def uploaded_image(self, upload_mock):
+        return Image.open(io.BytesIO(upload.content))
+
+    @mock.patch.object(app_settings, 'UPLOAD_IMAGE_MAX_DIMENSION', 100)
+    def test_image_is_transformed_and_original_dimensions_are_recorded(self, upload_mock):
+        MediaCloudinaryStorage().save('image.jpg', get_image_content())
+        self.assertEqual(upload_mock.call_args[1]['context'], 'original_width=400|original_height=300')
+        self.assertEqual(self.uploaded_image(upload_mock).size, (100, 75))
+
+    def test_image_is_not_transformed_without_max_dimension(self, upload_mock):
+        MediaCloudinaryStorage().save('image.jpg', get_image_content())
+        self.assertNotIn('context', upload_mock.call_args[1])
+        self.assertEqual(self.uploaded_image(upload_mock).size, (400, 300))
+
+    @mock.patch.object(app_settings, 'UPLOAD_IMAGE_MAX_DIMENSION', 100)
+    def test_raw_files_are_not_transformed(self, upload_mock):
+        RawMediaCloudinaryStorage().save('image.jpg', get_image_content())
+        self.assertNotIn('context', upload_mock.call_args[1])
+
+    @mock.patch.object(app_settings, 'UPLOAD_IMAGE_MAX_DIMENSION', 100)
+    def test_validators_check_original_image(self, upload_mock):
+        content = get_image_content()
+        storage = MediaCloudinaryStorage(upload_validators=[MaxFileSizeValidator(content.size - 1)])
+        with mock.patch('cloudinary_storage.images._transform_image') as transform_mock:
+            with self.assertRaises(ValidationError):
+                storage.save('image.jpg', content)
+        self.assertFalse(transform_mock.called)
+        self.assertFalse(upload_mock.called)
+
+    @mock.patch.object(app_settings, 'UPLOAD_IMAGE_MAX_DIMENSION', 100)
+    def test_valid_original_image_is_transformed(self, upload_mock):
+        content = get_image_content()
+        MediaCloudinaryStorage(upload_validators=[MaxFileSizeValidator(content.size)]).save('image.jpg', content)
+        self.assertEqual(self.uploaded_image(upload_mock).size, (100, 75))
@@ -0,0 +1,38 @@
+import os
+
+from django.test import SimpleTestCase
+
+from cloudinary_storage.journal import UploadJournal
+from tests.tests.test_helpers import get_random_name
+
+
+class UploadJournalTests(SimpleTestCase):
+    def setUp(self):
+        self.journal = UploadJournal(os.path.join('tests', get_random_name(), 'staticfiles.json.journal'))
+
+    def tearDown(self):
+        self.journal.clear()
+        os.rmdir(os.path.dirname(self.journal.path))
+
+    def test_recorded_entries_are_read(self):
+        self.journal.record('static/file.abc.css', 'raw', 'abc')
+        self.journal.record('static/image.def', 'image', 'def')
+        self.journal.close()
+        expected = {
+            'static/file.abc.css': {'name': 'static/file.abc.css', 'resource_type': 'raw', 'etag': 'abc'},
+            'static/image.def': {'name': 'static/image.def', 'resource_type': 'image', 'etag': 'def'},
+        }
+        self.assertEqual(self.journal.read(), expected)
+
+    def test_incomplete_last_line_is_ignored(self):
+        self.journal.record('static/file.abc.css', 'raw', 'abc')
+        self.journal.close()
+        with open(self.journal.path, 'a') as f:
+            f.write('{"name": "static/fi')
+        self.assertEqual(list(self.journal.read()), ['static/file.abc.css'])
+
+    def test_clear_removes_journal(self):
+        self.journal.record('static/file.abc.css', 'raw', 'abc')
+        self.journal.clear()
+        self.assertFalse(os.path.exists(self.journal.path))
+        self.assertEqual(self.journal.read(), {})
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from cloudinary_storage.manifest import CompiledManifest, get_manifest_digest, write_compiled_manifest
+from tests.tests.test_helpers import get_random_name
+
+PATHS = {
+    'tests/css/style.css': 'static/tests/css/style.abc.css',
+    'tests/images/dummy-static-image.jpg': 'static/tests/images/dummy-static-image.def.jpg',
+    'tests/js/źródło.js': 'static/tests/js/źródło.ghi.js',
+}
+
+
+class CompiledManifestTests(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.gettempdir(), get_random_name())
+        write_compiled_manifest(self.path, PATHS, get_manifest_digest(b'{}'))
+        self.manifest = CompiledManifest(self.path)
+
+    def tearDown(self):
+        self.manifest.mmap.close()
+        os.remove(self.path)
+
+    def test_entries_are_found(self):
+        for key, value in PATHS.items():
+            self.assertEqual(self.manifest[key], value)
+        self.assertEqual(dict(self.manifest), PATHS)
+        self.assertEqual(len(self.manifest), len(PATHS))
+        self.assertEqual(self.manifest.json_digest, get_manifest_digest(b'{}'))
+
+    def test_missing_entry(self):
+        self.assertIsNone(self.manifest.get('tests/css/missing.css'))
+        self.assertNotIn('a', self.manifest)
+        self.assertNotIn('z', self.manifest)
+
+    def test_set_entries_are_kept_separately(self):
+        self.manifest['tests/new.css'] = 'static/tests/new.jkl.css'
+        self.manifest['tests/css/style.css'] = 'static/tests/css/style.mno.css'
+        self.assertEqual(self.manifest['tests/new.css'], 'static/tests/new.jkl.css')
+        self.assertEqual(self.manifest['tests/css/style.css'], 'static/tests/css/style.mno.css')
+        self.assertEqual(len(self.manifest), len(PATHS) + 1)
+        self.assertEqual(sorted(self.manifest), sorted(list(PATHS) + ['tests/new.css']))
+
+    def test_empty_manifest(self):
+        write_compiled_manifest(self.path, {}, get_manifest_digest(b'{}'))
+        manifest = CompiledManifest(self.path)
+        self.assertEqual(dict(manifest), {})
+        self.assertIsNone(manifest.get('tests/css/style.css'))
+        manifest.mmap.close()
+
+    def test_invalid_file_raises_error(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"paths": {}}')
+        with self.assertRaises(ValueError):
+            CompiledManifest(self.path)
@@ -0,0 +1,158 @@
+import hashlib
+import io
+import json
+import os
+
+import cloudinary.uploader
+from cloudinary.utils import file_io_size
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.pipeline import HashStage, UploadPipeline, UploadStage, ValidationStage
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from cloudinary_storage.validators import MaxFileSizeValidator, validate_image
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+IMAGE_PATH = os.path.join('tests', 'dummy-files', 'dummy-image.jpg')
+
+
+class RecordingStage(UploadStage):
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+
+    def finish(self):
+        self.finished = True
+
+
+class UploadPipelineTests(SimpleTestCase):
+    CONTENT = b'0123456789' * 10
+
+    def test_content_is_read_once_through_stages(self):
+        recording_stage = RecordingStage()
+        hash_stage = HashStage()
+        pipeline = UploadPipeline(ContentFile(self.CONTENT, name='file.txt'), [recording_stage, hash_stage],
+                                  chunk_size=30)
+        self.assertEqual(pipeline.read(45), self.CONTENT[:45])
+        self.assertEqual(len(recording_stage.chunks), 2)  # chunks are read only when needed
+        self.assertEqual(pipeline.read(), self.CONTENT[45:])
+        self.assertEqual(pipeline.read(), b'')
+        self.assertEqual(b''.join(recording_stage.chunks), self.CONTENT)
+        self.assertTrue(recording_stage.finished)
+        self.assertEqual(hash_stage.hexdigest(), hashlib.md5(self.CONTENT).hexdigest())
+
+    def test_size_can_be_read_by_seeking(self):
+        pipeline = UploadPipeline(ContentFile(self.CONTENT, name='file.txt'), [], chunk_size=30)
+        pipeline.read(10)
+        self.assertEqual(file_io_size(pipeline), 100)
+        self.assertEqual(pipeline.tell(), 10)
+        with self.assertRaises(io.UnsupportedOperation):
+            pipeline.seek(0)
+
+    def test_invalid_file_is_rejected_with_first_chunk(self):
+        recording_stage = RecordingStage()
+        stages = [ValidationStage([validate_image], 'image.jpg', 100, header_size=30), recording_stage]
+        pipeline = UploadPipeline(ContentFile(self.CONTENT, name='image.jpg'), stages, chunk_size=30)
+        with self.assertRaises(ValidationError):
+            pipeline.read()
+        self.assertEqual(recording_stage.chunks, [])
+
+    def test_file_smaller_than_header_is_validated_at_the_end(self):
+        with open(IMAGE_PATH, 'rb') as f:
+            content = f.read()
+        stage = ValidationStage([validate_image, MaxFileSizeValidator(len(content))], 'image.jpg', len(content),
+                                header_size=len(content) + 1)
+        pipeline = UploadPipeline(ContentFile(content, name='image.jpg'), [stage])
+        self.assertEqual(pipeline.read(), content)
+        self.assertTrue(stage.validated)
+
+
+class UploadPipelineFileTests(SimpleTestCase):
+    def test_pipeline_is_context_manager_closed_without_content(self):
+        content = ContentFile(b'content', name='file.txt')
+        with UploadPipeline(content, [RecordingStage()]) as pipeline:
+            self.assertTrue(pipeline.readable())
+        self.assertTrue(pipeline.closed)
+        self.assertFalse(content.closed)
+        with self.assertRaises(ValueError):
+            pipeline.read()
+
+
+class StubResponse(object):
+    def __init__(self, data):
+        self.status = 200
+        self.headers = {}
+        self.data = json.dumps(data).encode('utf-8')
+
+
+class StubHttp(object):
+    def __init__(self):
+        self.requests = []
+
+    def request(self, method, url, fields, headers, **kwargs):
+        chunk = dict(fields)['file'][1]
+        self.requests.append((headers['Content-Range'], chunk))
+        return StubResponse({'public_id': 'media/file', 'bytes': len(chunk)})
+
+
+class UploadLargePipelineTests(SimpleTestCase):
+    CONTENT = b'0123456789' * 10
+
+    def test_pipeline_is_uploaded_in_chunks_by_cloudinary_uploader(self):
+        http = StubHttp()
+        recording_stage = RecordingStage()
+        pipeline = UploadPipeline(ContentFile(self.CONTENT, name='file.txt'), [recording_stage], chunk_size=30)
+        with mock.patch('cloudinary.uploader._http', http):
+            response = cloudinary.uploader.upload_large(pipeline, chunk_size=40, resource_type='raw')
+        self.assertEqual(response['public_id'], 'media/file')
+        self.assertEqual(http.requests, [('bytes 0-39/100', self.CONTENT[:40]),
+                                         ('bytes 40-79/100', self.CONTENT[40:80]),
+                                         ('bytes 80-99/100', self.CONTENT[80:])])
+        self.assertEqual(b''.join(recording_stage.chunks), self.CONTENT)
+        self.assertTrue(pipeline.closed)
+
+    def test_invalid_file_is_not_sent(self):
+        http = StubHttp()
+        stages = [ValidationStage([validate_image], 'image.jpg', 100, header_size=30)]
+        pipeline = UploadPipeline(ContentFile(self.CONTENT, name='image.jpg'), stages, chunk_size=30)
+        with mock.patch('cloudinary.uploader._http', http):
+            with self.assertRaises(ValidationError):
+                cloudinary.uploader.upload_large(pipeline, chunk_size=40, resource_type='raw')
+        self.assertEqual(http.requests, [])
+        self.assertTrue(pipeline.closed)
+
+
+@mock.patch('cloudinary_storage.storage.cloudinary.uploader.upload',
+            side_effect=lambda file, **options: {'public_id': 'media/file', 'size': len(file.read())})
+@mock.patch('cloudinary_storage.storage.cloudinary.uploader.upload_large',
+            side_effect=lambda file, **options: {'public_id': 'media/image', 'size': len(file.read())})
+class MediaCloudinaryStorageUploadPipelineTests(SimpleTestCase):
+    def test_file_is_validated_while_uploaded_in_chunks(self, upload_large_mock, upload_mock):
+        storage = MediaCloudinaryStorage(upload_validators=[validate_image])
+        with open(IMAGE_PATH, 'rb') as f:
+            self.assertEqual(storage.save('image.jpg', f), 'media/image')
+        self.assertIsInstance(upload_large_mock.call_args[0][0], UploadPipeline)
+        self.assertFalse(upload_mock.called)
+
+    def test_invalid_file_is_not_uploaded(self, upload_large_mock, upload_mock):
+        storage = MediaCloudinaryStorage(upload_validators=[validate_image])
+        with self.assertRaises(ValidationError):
+            storage.save('image.jpg', ContentFile(b'this is not an image'))
+
+    def test_content_is_passed_directly_without_stages(self, upload_large_mock, upload_mock):
+        MediaCloudinaryStorage().save('file.txt', ContentFile(b'content'))
+        self.assertNotIsInstance(upload_mock.call_args[0][0], UploadPipeline)
+        self.assertFalse(upload_large_mock.called)
+
+    @mock.patch.object(app_settings, 'UPLOAD_LARGE_SIZE', 5)
+    def test_large_file_is_uploaded_in_chunks(self, upload_large_mock, upload_mock):
+        MediaCloudinaryStorage().save('file.txt', ContentFile(b'content'))
+        self.assertTrue(upload_large_mock.called)
+        self.assertFalse(upload_mock.called)
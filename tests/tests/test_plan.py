@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from cloudinary_storage.plan import UploadPlan
+from tests.tests.test_helpers import get_random_name
+
+
+class UploadPlanTests(SimpleTestCase):
+    def setUp(self):
+        self.plan = UploadPlan()
+        self.plan.add_upload('static/style.abc.css', 'raw', 100)
+        self.plan.add_upload('static/image.def', 'image', 2000)
+        self.plan.add_upload('static/image-2.ghi', 'image', 3000)
+        self.plan.add_skipped('static/script.jkl.js', 'jkl')
+
+    def test_summary_per_resource_type(self):
+        expected = {
+            'image': {'files': 2, 'bytes': 5000, 'upload_calls': 2},
+            'raw': {'files': 1, 'bytes': 100, 'upload_calls': 1},
+        }
+        self.assertEqual(self.plan.get_summary(), expected)
+
+    def test_formatted_summary(self):
+        self.assertIn('Upload plan: 3 files to upload, 5100 bytes, 3 upload calls, 1 files already uploaded.',
+                      self.plan.format_summary())
+
+    def test_planned_file_is_not_skipped(self):
+        self.plan.add_skipped('static/style.abc.css', 'abc')
+        self.assertEqual(self.plan.skipped, {'static/script.jkl.js': 'jkl'})
+
+    def test_saved_plan_is_loaded(self):
+        path = os.path.join(tempfile.gettempdir(), get_random_name())
+        self.plan.save(path)
+        try:
+            plan = UploadPlan.load(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(plan.uploads, self.plan.uploads)
+        self.assertEqual(plan.skipped, self.plan.skipped)
+
+    def test_load_raises_error_for_unsupported_version(self):
+        path = os.path.join(tempfile.gettempdir(), get_random_name())
+        with open(path, 'w') as f:
+            f.write('{"version": 0}')
+        try:
+            with self.assertRaises(ValueError):
+                UploadPlan.load(path)
+        finally:
+            os.remove(path)
@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase
+
+from cloudinary_storage.sorting import SortedRuns, StringHashSet, iter_difference
+
+
+class SortedRunsTests(SimpleTestCase):
+    ITEMS = ['media/c', 'media/a', 'media/b\nwith new line', 'media/a', 'media/e', 'media/d', 'media/c']
+
+    def test_items_are_sorted_and_deduplicated_in_memory(self):
+        with SortedRuns(self.ITEMS) as sorted_runs:
+            self.assertFalse(sorted_runs.files)
+            self.assertEqual(list(sorted_runs), sorted(set(self.ITEMS)))
+
+    def test_items_are_sorted_and_deduplicated_when_spilled_to_disk(self):
+        with SortedRuns(self.ITEMS, run_size=2) as sorted_runs:
+            self.assertEqual(len(sorted_runs.files), 4)
+            self.assertEqual(list(sorted_runs), sorted(set(self.ITEMS)))
+            self.assertEqual(list(sorted_runs), sorted(set(self.ITEMS)))  # can be iterated again
+
+    def test_close_removes_runs(self):
+        sorted_runs = SortedRuns(self.ITEMS, run_size=2)
+        files = sorted_runs.files
+        sorted_runs.close()
+        self.assertTrue(all(file.closed for file in files))
+        self.assertEqual(list(sorted_runs), [])
+
+
+class IterDifferenceTests(SimpleTestCase):
+    def test_excluded_items_are_skipped(self):
+        items = ['a', 'b', 'c', 'e', 'g']
+        excluded_items = ['b', 'd', 'e', 'f', 'h']
+        self.assertEqual(list(iter_difference(items, excluded_items)), ['a', 'c', 'g'])
+
+    def test_without_excluded_items(self):
+        self.assertEqual(list(iter_difference(['a', 'b'], [])), ['a', 'b'])
+        self.assertEqual(list(iter_difference([], ['a'])), [])
+
+
+class StringHashSetTests(SimpleTestCase):
+    def test_membership(self):
+        items = ['media/a', 'media/b', 'media/a', 'media/c']
+        string_set = StringHashSet(items, run_size=2)
+        self.assertEqual(len(string_set), 3)
+        for item in items:
+            self.assertIn(item, string_set)
+        self.assertNotIn('media/d', string_set)
+        self.assertNotIn('', StringHashSet([]))
@@ -1,5 +1,6 @@
 import errno
 import os.path
+import threading
 
 from requests.exceptions import HTTPError
 import cloudinary.uploader
@@ -10,6 +11,8 @@ from django.conf import settings
 from cloudinary_storage.storage import (MediaCloudinaryStorage, ManifestCloudinaryStorage, StaticCloudinaryStorage,
                                         StaticHashedCloudinaryStorage, RESOURCE_TYPES)
 from cloudinary_storage import app_settings
+from cloudinary_storage.helpers import TaskPool
+from cloudinary_storage.manifest import CompiledManifest
 from tests.tests.test_helpers import get_random_name, import_mock
 
 mock = import_mock()
@@ -251,6 +254,72 @@ class StaticHashedCloudinaryStorageTests(SimpleTestCase):
             storage.save_manifest()
         manifest_storage_mock.delete.assert_called_once_with('staticfiles.json')
 
+    @mock.patch.object(app_settings, 'STATICFILES_COMPILED_MANIFEST', True)
+    def test_compiled_manifest_is_saved_and_loaded(self):
+        storage = StaticHashedCloudinaryStorage()
+        storage.manifest_name = get_random_name()
+        storage.hashed_files = {'tests/css/style.css': 'static/tests/css/style.abc.css'}
+        storage.save_manifest()
+        try:
+            manifest = storage.load_manifest()
+            self.assertIsInstance(manifest, CompiledManifest)
+            self.assertEqual(dict(manifest), storage.hashed_files)
+            storage.hashed_files = manifest
+            self.assertEqual(storage.stored_name('tests/css/style.css'), 'static/tests/css/style.abc.css')
+            manifest.mmap.close()
+        finally:
+            storage.manifest_storage.delete(storage.manifest_name)
+            storage.manifest_storage.delete(storage.manifest_name + '.compiled')
+
+    @mock.patch.object(app_settings, 'STATICFILES_COMPILED_MANIFEST', True)
+    def test_json_manifest_is_loaded_when_compiled_one_is_outdated(self):
+        storage = StaticHashedCloudinaryStorage()
+        storage.manifest_name = get_random_name()
+        storage.hashed_files = {'tests/css/style.css': 'static/tests/css/style.abc.css'}
+        storage.save_manifest()
+        try:
+            # different hashes of the same length give manifest of the same size
+            with open(storage.manifest_storage.path(storage.manifest_name), 'r+') as f:
+                contents = f.read().replace('style.abc.css', 'style.def.css')
+                f.seek(0)
+                f.write(contents)
+            manifest = storage.load_manifest()
+            self.assertEqual(manifest, {'tests/css/style.css': 'static/tests/css/style.def.css'})
+            self.assertNotIsInstance(manifest, CompiledManifest)
+        finally:
+            storage.manifest_storage.delete(storage.manifest_name)
+            storage.manifest_storage.delete(storage.manifest_name + '.compiled')
+
+    @mock.patch.object(app_settings, 'STATICFILES_MANIFEST_GENERATIONS', 3)
+    def test_manifest_generations_are_kept(self):
+        storage = StaticHashedCloudinaryStorage()
+        storage.manifest_name = get_random_name()
+        try:
+            for i in range(4):
+                storage.hashed_files = {'tests/css/style.css': 'static/tests/css/style.{}.css'.format(i)}
+                storage.save_manifest()
+            storage.save_manifest()  # the same manifest doesn't take place of the oldest generation
+            manifests = list(storage.load_manifest_generations())
+            expected_manifests = [{'tests/css/style.css': 'static/tests/css/style.{}.css'.format(i)}
+                                  for i in (3, 2, 1)]
+            self.assertEqual(manifests, expected_manifests)
+        finally:
+            for generation in range(3):
+                storage.manifest_storage.delete(storage.manifest_storage.get_generation_name(storage.manifest_name,
+                                                                                             generation))
+
+    def test_older_manifest_generations_are_not_kept_by_default(self):
+        storage = StaticHashedCloudinaryStorage()
+        storage.manifest_name = get_random_name()
+        try:
+            for i in range(2):
+                storage.hashed_files = {'tests/css/style.css': 'static/tests/css/style.{}.css'.format(i)}
+                storage.save_manifest()
+            self.assertFalse(storage.manifest_storage.exists(storage.manifest_name + '.1'))
+            self.assertEqual(list(storage.load_manifest_generations()), [storage.hashed_files])
+        finally:
+            storage.manifest_storage.delete(storage.manifest_name)
+
     def test_add_unix_path_keys_to_paths(self):
         storage = StaticHashedCloudinaryStorage()
         paths = {
@@ -261,3 +330,83 @@ class StaticHashedCloudinaryStorageTests(SimpleTestCase):
         expected_paths['dir/2'] = 2
         storage.add_unix_path_keys_to_paths(paths)
         self.assertEqual(paths, expected_paths)
+
+
+class StaticCloudinaryStorageUploadPoolTests(SimpleTestCase):
+    def test_failed_uploads_are_returned_in_order_of_saving(self):
+        storage = StaticCloudinaryStorage()
+        storage.upload_pool = TaskPool(2)
+
+        def upload_if_changed(name, content, upload_journal, check_remote):
+            if name != 'b':
+                raise IOError(name)
+
+        try:
+            with mock.patch.object(storage, '_upload_if_changed', side_effect=upload_if_changed):
+                for name in ('a', 'b', 'c'):
+                    storage._save(name, ContentFile(b'content'))
+                failed_uploads = storage.wait_for_uploads()
+        finally:
+            storage.upload_pool.shutdown()
+        self.assertEqual([name for name, error in failed_uploads], ['a', 'c'])
+
+    def test_wait_for_uploads_without_upload_pool_returns_empty_list(self):
+        self.assertEqual(StaticCloudinaryStorage().wait_for_uploads(), [])
+
+    @mock.patch.object(MediaCloudinaryStorage, 'exists', return_value=True)
+    def test_exists_is_disabled_only_in_post_processing_thread(self, exists_mock):
+        storage = StaticHashedCloudinaryStorage()
+        storage._post_processing.active = True
+        results = []
+        thread = threading.Thread(target=lambda: results.append(storage.exists('name')))
+        thread.start()
+        thread.join()
+        self.assertFalse(storage.exists('name'))
+        self.assertEqual(results, [True])
+
+
+class StaticCloudinaryStorageRemoteEtagsTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = StaticCloudinaryStorage()
+        self.content = ContentFile(b'content')
+        self.hash = self.storage.file_hash('file.css', self.content)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_file_missing_in_remote_etags_doesnt_exist(self, head_mock):
+        self.storage.remote_etags = {}
+        self.assertFalse(self.storage._exists_with_etag('file.css', self.content))
+        self.assertFalse(head_mock.called)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_file_with_the_same_etag_exists(self, head_mock):
+        self.storage.remote_etags = {(RESOURCE_TYPES['RAW'], 'static/file.css'): self.hash + 'abc'}
+        self.assertTrue(self.storage._exists_with_etag('file.css', self.content))
+        self.assertFalse(head_mock.called)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_image_is_looked_up_without_extension(self, head_mock):
+        self.storage.remote_etags = {(RESOURCE_TYPES['IMAGE'], 'static/file'): 'different'}
+        self.assertFalse(self.storage._exists_with_etag('file.jpg', self.content))
+        self.assertFalse(head_mock.called)
+
+    @mock.patch('cloudinary_storage.storage.requests.head')
+    def test_head_request_is_sent_when_etag_is_unknown(self, head_mock):
+        head_mock.return_value.status_code = 200
+        head_mock.return_value.headers = {'ETAG': '"{}"'.format(self.hash)}
+        self.storage.remote_etags = {(RESOURCE_TYPES['RAW'], 'static/file.css'): None}
+        self.assertTrue(self.storage._exists_with_etag('file.css', self.content))
+        self.assertTrue(head_mock.called)
+
+    @mock.patch('cloudinary_storage.helpers.cloudinary.api.resources_by_tag')
+    def test_fetch_remote_etags(self, resources_by_tag_mock):
+        def resources_by_tag(tag, resource_type, max_results, next_cursor=None):
+            if resource_type != RESOURCE_TYPES['RAW']:
+                return {'resources': []}
+            if next_cursor is None:
+                return {'resources': [{'public_id': 'static/1.css', 'etag': 'a'}], 'next_cursor': 'cursor'}
+            return {'resources': [{'public_id': 'static/2.css'}]}
+
+        resources_by_tag_mock.side_effect = resources_by_tag
+        expected = {(RESOURCE_TYPES['RAW'], 'static/1.css'): 'a', (RESOURCE_TYPES['RAW'], 'static/2.css'): None}
+        self.assertEqual(self.storage.fetch_remote_etags(), expected)
+        self.assertEqual(resources_by_tag_mock.call_count, 4)
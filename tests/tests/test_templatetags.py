@@ -0,0 +1,143 @@
+import cloudinary
+from cloudinary import CloudinaryResource
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase, RequestFactory
+
+from cloudinary_storage import app_settings
+from cloudinary_storage.cache import LRUCache, freeze
+from cloudinary_storage.signals import manifest_saved
+from cloudinary_storage.templatetags.cloudinary_static import cloudinary_static
+from tests.models import TestImageModel
+from tests.tests.test_accounts import ACCOUNTS
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+
+def get_image_url(path):
+    return 'https://res.cloudinary.com/{}/image/upload/{}'.format(cloudinary.config().cloud_name, path)
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_items_are_evicted(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.cache_info(), (2, 1, 2, 2))
+
+    def test_nothing_is_cached_with_zero_maxsize(self):
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_freeze(self):
+        self.assertEqual(freeze({'b': [1, {'c': 2}], 'a': 1}), (('a', 1), ('b', (1, (('c', 2),)))))
+
+
+@mock.patch('cloudinary_storage.templatetags.cloudinary_static.staticfiles_storage')
+class CloudinaryStaticCacheTests(SimpleTestCase):
+    template = Template("{% load cloudinary_static %}{% cloudinary_static 'images/logo.png' width=50 %}")
+
+    def setUp(self):
+        cloudinary_static.cache_clear()
+
+    def render(self, secure=False):
+        request = RequestFactory().get('/', secure=secure)
+        return self.template.render(Context({'request': request}))
+
+    def test_rendered_tag_is_cached(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        html = self.render()
+        self.assertIn('static/images/logo.123.png', html)
+        self.assertIn('w_50', html)
+        self.assertEqual(self.render(), html)
+        storage_mock.stored_name.assert_called_once_with('images/logo.png')
+        self.assertEqual(cloudinary_static.cache_info()[:2], (1, 1))
+
+    def test_secure_and_insecure_tags_are_cached_separately(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        self.render()
+        self.render(secure=True)
+        self.assertEqual(storage_mock.stored_name.call_count, 2)
+        self.assertEqual(cloudinary_static.cache_info().currsize, 2)
+
+    def test_cache_is_cleared_when_manifest_is_saved(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        self.render()
+        storage_mock.stored_name.return_value = 'static/images/logo.456.png'
+        manifest_saved.send(sender=None, storage=storage_mock)
+        self.assertIn('static/images/logo.456.png', self.render())
+
+    def test_tag_with_unhashable_options_is_not_cached(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        template = Template("{% load cloudinary_static %}{% cloudinary_static 'images/logo.png' options %}")
+        context = Context({'options': {'width': 50, 'effects': {'sepia'}}})
+        template.render(context)
+        template.render(context)
+        self.assertEqual(storage_mock.stored_name.call_count, 2)
+        self.assertEqual(cloudinary_static.cache_info().currsize, 0)
+
+    def test_cache_size_is_read_when_cache_is_used(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        with mock.patch.object(app_settings, 'STATIC_TAG_CACHE_SIZE', 0):
+            self.render()
+            self.assertEqual(cloudinary_static.cache_info().maxsize, 0)
+            self.assertEqual(cloudinary_static.cache_info().currsize, 0)
+        cloudinary_static.cache_clear()
+        self.assertEqual(cloudinary_static.cache_info().maxsize, app_settings.STATIC_TAG_CACHE_SIZE)
+
+
+@mock.patch('cloudinary_storage.templatetags.cloudinary_static.staticfiles_storage')
+class CloudinaryResponsiveTests(SimpleTestCase):
+    def setUp(self):
+        cloudinary_static.cache_clear()
+
+    def render(self, tag, **context):
+        return Template('{% load cloudinary_static %}' + tag).render(Context(context))
+
+    def test_static_image_srcset(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        html = self.render("{% cloudinary_responsive 'images/logo.png' widths='320,640' sizes='50vw' alt='Logo' %}")
+        self.assertTrue(html.startswith(
+            '<img src="{}"'.format(get_image_url('c_scale,f_auto,w_640/v1/static/images/logo.123.png'))))
+        self.assertIn(
+            'srcset="{} 320w, '.format(get_image_url('c_scale,f_auto,w_320/v1/static/images/logo.123.png')), html)
+        self.assertIn('sizes="50vw" alt="Logo"', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_picture_with_formats(self, storage_mock):
+        storage_mock.stored_name.return_value = 'static/images/logo.123.png'
+        html = self.render("{% cloudinary_responsive 'images/logo.png' widths=widths formats='avif,webp' %}",
+                           widths=[100])
+        self.assertTrue(html.startswith('<picture><source type="image/avif" srcset="'))
+        self.assertIn('f_avif,w_100', html)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('<img src="{}'.format(get_image_url('c_scale,w_100/')), html)
+        self.assertTrue(html.endswith('</picture>'))
+
+    def test_empty_widths_raise_error(self, storage_mock):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render("{% cloudinary_responsive 'images/logo.png' widths='' %}")
+
+    def test_media_file_and_cached_urls(self, storage_mock):
+        image = TestImageModel(image='tests/image').image
+        tag = "{% cloudinary_responsive image widths='320' %}"
+        with mock.patch('cloudinary_storage.templatetags.cloudinary_static.CloudinaryResource',
+                        wraps=CloudinaryResource) as resource_mock:
+            html = self.render(tag, image=image)
+            self.assertEqual(self.render(tag, image=image), html)
+        resource_mock.assert_called_once_with(image.storage._prepend_prefix('tests/image'))
+        self.assertIn('c_scale,f_auto,w_320/v1/{}'.format(image.storage._prepend_prefix('tests/image')), html)
+        self.assertFalse(storage_mock.stored_name.called)
+
+    @mock.patch.object(app_settings, 'ACCOUNTS', ACCOUNTS)
+    def test_sharded_media_file_urls_point_to_its_cloud(self, storage_mock):
+        image = TestImageModel(image='shard-1:media/tests/image').image
+        html = self.render("{% cloudinary_responsive image widths='320' %}", image=image)
+        self.assertIn('https://res.cloudinary.com/shard-1/image/upload/c_scale,f_auto,w_320/v1/media/tests/image',
+                      html)
+        self.assertNotIn('shard-1:', html)
@@ -0,0 +1,88 @@
+import os
+import threading
+
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from cloudinary_storage.validators import (ImageDimensionsValidator, MaxFileSizeValidator, MimeTypeValidator,
+                                           get_magic, validate_image, validate_video)
+from tests.tests.test_helpers import import_mock
+
+mock = import_mock()
+
+IMAGE_PATH = os.path.join('tests', 'dummy-files', 'dummy-image.jpg')
+VIDEO_PATH = os.path.join('tests', 'dummy-files', 'dummy-video.mp4')
+
+
+def get_uploaded_file(path):
+    with open(path, 'rb') as f:
+        return SimpleUploadedFile(os.path.basename(path), f.read())
+
+
+class GetMagicTests(SimpleTestCase):
+    def test_magic_is_created_once_per_thread(self):
+        magic_objects = []
+        thread = threading.Thread(target=lambda: magic_objects.append(get_magic()))
+        thread.start()
+        thread.join()
+        self.assertIs(get_magic(), get_magic())
+        self.assertIsNot(magic_objects[0], get_magic())
+
+
+class MimeTypeValidatorsTests(SimpleTestCase):
+    def test_image_is_valid_image(self):
+        validate_image(get_uploaded_file(IMAGE_PATH))
+
+    def test_text_is_invalid_image(self):
+        with self.assertRaises(ValidationError):
+            validate_image(SimpleUploadedFile('image.jpg', b'this is not an image'))
+
+    def test_video_is_valid_video(self):
+        validate_video(get_uploaded_file(VIDEO_PATH))
+
+    def test_image_is_invalid_video(self):
+        with self.assertRaises(ValidationError):
+            validate_video(get_uploaded_file(IMAGE_PATH))
+
+    def test_mime_type_validator(self):
+        validator = MimeTypeValidator(['application/pdf', 'text/'])
+        validator(SimpleUploadedFile('file.txt', b'text'))
+        with self.assertRaises(ValidationError) as e:
+            validator(get_uploaded_file(IMAGE_PATH))
+        self.assertEqual(e.exception.params, {'mime_type': 'image/jpeg'})
+
+    def test_header_is_read_once_for_all_validators(self):
+        value = get_uploaded_file(IMAGE_PATH)
+        with mock.patch.object(value.file, 'read', wraps=value.file.read) as read_mock:
+            validate_image(value)
+            MimeTypeValidator(['image/jpeg'])(value)
+        read_mock.assert_called_once_with(2048)
+        self.assertEqual(value.file.tell(), 0)
+
+
+class MaxFileSizeValidatorTests(SimpleTestCase):
+    def test_file_size(self):
+        MaxFileSizeValidator(4)(SimpleUploadedFile('file.txt', b'text'))
+        with self.assertRaises(ValidationError):
+            MaxFileSizeValidator(3)(SimpleUploadedFile('file.txt', b'text'))
+
+
+class ImageDimensionsValidatorTests(SimpleTestCase):
+    def setUp(self):
+        self.width, self.height = get_image_dimensions(IMAGE_PATH)
+
+    def test_image_within_limits_is_valid(self):
+        ImageDimensionsValidator(self.width, self.height, self.width * self.height)(get_uploaded_file(IMAGE_PATH))
+
+    def test_too_big_image_is_invalid(self):
+        for options in ({'max_width': self.width - 1}, {'max_height': self.height - 1},
+                        {'max_pixels': self.width * self.height - 1}):
+            with self.assertRaises(ValidationError):
+                ImageDimensionsValidator(**options)(get_uploaded_file(IMAGE_PATH))
+
+    def test_not_image_is_invalid(self):
+        with self.assertRaises(ValidationError) as e:
+            ImageDimensionsValidator(max_width=100)(SimpleUploadedFile('image.jpg', b'this is not an image'))
+        self.assertEqual(e.exception.code, 'invalid_image')